@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Almacén binario de embeddings en disco
+
+Sustituye al antiguo embeddings_cache.json. Los vectores se guardan en un
+fichero binario float32 que se lee con memoria mapeada (np.memmap), de forma
+que varios workers de gunicorn comparten las mismas páginas del sistema en
+lugar de mantener cada uno una copia parseada. Junto a él se guarda un índice
+compacto con el hash de cada texto (16 bytes por fila). Ambos ficheros solo
+crecen por el final: añadir embeddings nuevos nunca reescribe los existentes.
+
+Cada llamada a agregar() escribe un segmento: primero los vectores y después
+sus hashes. Una fila solo se considera válida cuando está completa en los dos
+ficheros, así que si un proceso muere a mitad de escritura el final incompleto
+se ignora al leer y se descarta en la siguiente escritura. Con durable=True el
+segmento se sincroniza a disco (fsync) antes de volver.
+
+Las búsquedas por texto comprueban el tamaño del índice (un stat) y cargan
+las filas que otro proceso haya añadido, para no volver a calcularlas.
+
+Ficheros generados a partir de la ruta base:
+    <base>.f32        matriz de embeddings (filas x dimension), float32
+                      (<base>.f16 si el almacén se crea en float16)
+    <base>.idx        hash blake2b de 16 bytes del texto de cada fila
+    <base>.meta.json  dimensión y tipo de dato de la matriz
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import fcntl  # Bloqueo entre procesos (solo disponible en sistemas POSIX)
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+TAMANO_HASH = 16
+EXTENSIONES_DTYPE = {"float32": "f32", "float16": "f16"}  # Tipos de dato soportados
+
+
+def hash_texto(texto: str) -> bytes:
+    """
+    Calcula el hash estable de un texto usado como clave en el almacén
+
+    Args:
+        texto: Texto a identificar
+
+    Returns:
+        Digest blake2b de 16 bytes
+    """
+    return hashlib.blake2b(str(texto).encode('utf-8'), digest_size=TAMANO_HASH).digest()
+
+
+class AlmacenEmbeddings:
+    """Almacén de embeddings en disco, append-only y leído con memoria mapeada
+
+    Es seguro usarlo desde varios hilos: las escrituras se serializan con un
+    lock dentro del proceso y con flock entre procesos.
+    """
+
+    def __init__(self, ruta_base: str, dimension: Optional[int] = None, dtype: str = "float32"):
+        """Inicializa el almacén
+
+        Args:
+            ruta_base: Ruta de los ficheros del almacén sin extensión
+            dimension: Dimensión de los embeddings (se detecta al añadir el primero)
+            dtype: Tipo de dato de un almacén nuevo ("float32" o "float16"); un
+                almacén existente conserva el tipo con el que se creó
+        """
+        if dtype not in EXTENSIONES_DTYPE:
+            raise ValueError(f"Tipo de dato no soportado: {dtype}. Opciones: {', '.join(EXTENSIONES_DTYPE)}")
+        self.ruta_base = ruta_base
+        self.ruta_indice = f"{ruta_base}.idx"
+        self.ruta_meta = f"{ruta_base}.meta.json"
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+
+        self._indice: Dict[bytes, int] = {}
+        self._filas = 0
+        self._matriz = None
+        self._lock = threading.RLock()
+
+        self._cargar_meta()
+        self.ruta_matriz = f"{ruta_base}.{EXTENSIONES_DTYPE[self.dtype.name]}"
+        self._sincronizar()
+
+    def _cargar_meta(self):
+        """Carga la dimensión y el tipo de dato guardados"""
+        if os.path.exists(self.ruta_meta):
+            try:
+                with open(self.ruta_meta, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                self.dimension = int(meta["dimension"])
+                self.dtype = np.dtype(meta.get("dtype", "float32"))
+            except Exception as e:
+                logging.error(f"Error al cargar metadatos del almacén de embeddings: {e}")
+
+    def _guardar_meta(self):
+        """Guarda la dimensión y el tipo de dato de la matriz"""
+        directorio = os.path.dirname(self.ruta_meta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with open(self.ruta_meta, 'w', encoding='utf-8') as f:
+            json.dump({"dimension": self.dimension, "dtype": self.dtype.name}, f)
+
+    def _filas_en_disco(self) -> int:
+        """Número de filas completas presentes a la vez en la matriz y en el índice"""
+        if not self.dimension or not os.path.exists(self.ruta_indice) or not os.path.exists(self.ruta_matriz):
+            return 0
+        filas_indice = os.path.getsize(self.ruta_indice) // TAMANO_HASH
+        filas_matriz = os.path.getsize(self.ruta_matriz) // (self.dimension * self.dtype.itemsize)
+        return min(filas_indice, filas_matriz)
+
+    def _sincronizar(self):
+        """Incorpora las filas añadidas en disco (por este u otro proceso)"""
+        with self._lock:
+            filas = self._filas_en_disco()
+            if filas == self._filas:
+                return
+
+            with open(self.ruta_indice, 'rb') as f:
+                f.seek(self._filas * TAMANO_HASH)
+                datos = f.read((filas - self._filas) * TAMANO_HASH)
+
+            # Publicar primero el nuevo tamaño para que ninguna fila del índice
+            # apunte fuera de la matriz mapeada
+            anteriores = self._filas
+            self._filas = filas
+            self._matriz = None  # Volver a mapear con el nuevo tamaño
+            for i in range(filas - anteriores):
+                self._indice.setdefault(datos[i * TAMANO_HASH:(i + 1) * TAMANO_HASH], anteriores + i)
+
+    def _refrescar(self):
+        """Incorpora las filas de otros procesos si el índice en disco ha crecido"""
+        if not self.dimension:
+            # Otro proceso puede haber creado el almacén después de abrirlo este
+            self._cargar_meta()
+            if not self.dimension:
+                return
+            self.ruta_matriz = f"{self.ruta_base}.{EXTENSIONES_DTYPE[self.dtype.name]}"
+        try:
+            tamano = os.path.getsize(self.ruta_indice)
+        except OSError:
+            return
+        if tamano >= (self._filas + 1) * TAMANO_HASH:
+            self._sincronizar()
+
+    def __len__(self) -> int:
+        self._refrescar()
+        return self._filas
+
+    def __contains__(self, texto: str) -> bool:
+        self._refrescar()
+        return hash_texto(texto) in self._indice
+
+    @property
+    def matriz(self) -> np.ndarray:
+        """Matriz de embeddings (filas x dimension) mapeada en memoria de solo lectura"""
+        matriz = self._matriz
+        if matriz is None:
+            with self._lock:
+                if self._filas == 0:
+                    return np.zeros((0, self.dimension or 0), dtype=self.dtype)
+                if self._matriz is None:
+                    self._matriz = np.memmap(self.ruta_matriz, dtype=self.dtype, mode='r',
+                                             shape=(self._filas, self.dimension))
+                matriz = self._matriz
+        return matriz
+
+    def obtener(self, texto: str) -> Optional[np.ndarray]:
+        """
+        Obtiene el embedding de un texto si está almacenado
+
+        Args:
+            texto: Texto buscado
+
+        Returns:
+            Vector del embedding o None si no está en el almacén
+        """
+        self._refrescar()
+        fila = self._indice.get(hash_texto(texto))
+        if fila is None:
+            return None
+        return np.asarray(self.matriz[fila])
+
+    def obtener_filas(self, textos: Sequence[str]) -> np.ndarray:
+        """
+        Obtiene la fila del almacén de cada texto
+
+        Args:
+            textos: Textos buscados
+
+        Returns:
+            Array de enteros con la fila de cada texto (-1 si no está almacenado)
+        """
+        self._refrescar()
+        return np.fromiter((self._indice.get(hash_texto(t), -1) for t in textos),
+                           dtype=np.int64, count=len(textos))
+
+    def agregar(self, textos: Sequence[str], embeddings: np.ndarray, durable: bool = False) -> int:
+        """
+        Añade embeddings nuevos al final del almacén
+
+        Los textos que ya estaban almacenados se ignoran.
+
+        Args:
+            textos: Textos correspondientes a cada fila
+            embeddings: Matriz (len(textos) x dimension) de embeddings
+            durable: Si True, sincroniza el segmento a disco (fsync) antes de volver
+
+        Returns:
+            Número de filas añadidas
+        """
+        embeddings = np.asarray(embeddings)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
+        if len(textos) == 0:
+            return 0
+
+        if not self.dimension:
+            self.dimension = int(embeddings.shape[1])
+        if not os.path.exists(self.ruta_meta):
+            self._guardar_meta()
+
+        with self._lock, open(self.ruta_indice, 'ab') as f_indice, open(self.ruta_matriz, 'ab') as f_matriz:
+            if fcntl is not None:
+                fcntl.flock(f_indice, fcntl.LOCK_EX)
+            try:
+                # Otro proceso puede haber añadido filas mientras esperábamos el bloqueo
+                self._sincronizar()
+
+                nuevos = {}
+                for j, texto in enumerate(textos):
+                    clave = hash_texto(texto)
+                    if clave not in self._indice and clave not in nuevos:
+                        nuevos[clave] = j
+                if not nuevos:
+                    return 0
+
+                # Descartar un posible final incompleto de una escritura interrumpida
+                f_matriz.truncate(self._filas * self.dimension * self.dtype.itemsize)
+                f_indice.truncate(self._filas * TAMANO_HASH)
+
+                bloque = embeddings[list(nuevos.values())].astype(self.dtype, copy=False)
+                f_matriz.write(np.ascontiguousarray(bloque).tobytes())
+                f_matriz.flush()
+                if durable:
+                    os.fsync(f_matriz.fileno())
+                # Los hashes se escriben después: una fila solo es visible cuando
+                # sus vectores ya están en disco
+                f_indice.write(b"".join(nuevos.keys()))
+                f_indice.flush()
+                if durable:
+                    os.fsync(f_indice.fileno())
+
+                anteriores = self._filas
+                self._filas += len(nuevos)
+                self._matriz = None
+                for i, clave in enumerate(nuevos):
+                    self._indice[clave] = anteriores + i
+                return len(nuevos)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f_indice, fcntl.LOCK_UN)
+
+    def importar_json(self, ruta_json: str, normalizar: bool = False) -> int:
+        """
+        Importa un caché antiguo en formato JSON {texto: [floats]}
+
+        Args:
+            ruta_json: Ruta del fichero JSON
+            normalizar: Si True, normaliza los vectores a norma 1 antes de guardarlos
+
+        Returns:
+            Número de embeddings importados
+        """
+        if not os.path.exists(ruta_json):
+            return 0
+        try:
+            with open(ruta_json, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except Exception as e:
+            logging.error(f"Error al leer caché JSON de embeddings: {e}")
+            return 0
+
+        textos: List[str] = [t for t, v in cache.items() if v]
+        if not textos:
+            return 0
+        matriz = np.asarray([cache[t] for t in textos], dtype=np.float32)
+        if normalizar:
+            normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+            normas[normas == 0] = 1.0
+            matriz /= normas
+        importados = self.agregar(textos, matriz)
+        logging.info(f"Importados {importados} embeddings desde {ruta_json}")
+        return importados
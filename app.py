@@ -7,12 +7,15 @@ Aplicación web para el generador de textos estilo Instagram
 
 import os
 import json
+import time
 import random
 import logging
-import pandas as pd
+import threading
 from flask import Flask, render_template, request, jsonify
 from generador_textos import GeneradorTextos, CATEGORIAS
-from buscador_similares import BuscadorTextosSimilares
+from buscador_similares import BuscadorTextosSimilares, TIPOS_INDICE
+from corpus import MetadatosCorpus, firma_corpus
+from pool_generacion import PRECALENTAR_POOL, TAMANO_POOL
 
 # Configuración
 API_KEY = os.environ.get("OPENAI_API_KEY", "")
@@ -25,6 +28,15 @@ CSV_PATH = "texto_extraido_categorizado.csv"  # CSV con categorías
 CSV_PATH_ORIGINAL = "texto_extraido.csv"  # CSV original sin categorías
 OUTPUT_DIR = "textos_generados"
 CACHE_FILE = "cache_generador.json"
+EMBEDDINGS_CACHE_FILE = "embeddings_cache.json"
+MODELO_EMBEDDINGS = "paraphrase-multilingual-MiniLM-L12-v2"
+PRECARGAR_BUSCADOR = os.environ.get("PRECARGAR_BUSCADOR", "1") != "0"  # Calentar el buscador al arrancar
+RETRY_AFTER_BUSCADOR = 10  # Segundos sugeridos al cliente mientras el buscador se inicializa
+MAX_INTENTOS_BUSCADOR = 3  # Intentos de construir el buscador antes de darse por vencido
+ESPERA_REINTENTO_BUSCADOR = 30  # Segundos antes de reintentar tras un error (se duplica en cada fallo)
+MAX_TEXTOS_LOTE_BUSQUEDA = 1000  # Máximo de consultas por petición a /buscar_similares/lote
+INTERVALO_COMPROBACION_CORPUS = 30  # Segundos entre comprobaciones de cambios en el CSV del corpus
+SOLO_TEXTOS_CANONICOS = os.environ.get("SOLO_TEXTOS_CANONICOS", "0") == "1"  # Un texto por cluster de casi-duplicados
 
 # Asegurarse de que el directorio de salida existe
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -32,44 +44,101 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 # Inicializar Flask
 app = Flask(__name__)
 
-# Inicializar el generador de textos
+# Inicializar el generador de textos.
+# Los textos cargados en el generador publicado no se modifican: las recargas
+# construyen uno nuevo y lo sustituyen de forma atómica. _lock_generador
+# serializa a los escritores.
 generador = None
+_lock_generador = threading.Lock()
+_limite_generador = None  # Límite de textos de la última carga (se reutiliza al recargar)
+_lock_recarga_generador = threading.Lock()  # Evita lanzar varias recargas a la vez
+_ultima_comprobacion_corpus = 0.0
 
 def obtener_categorias_disponibles():
-    """Obtiene las categorías disponibles en el CSV categorizado"""
+    """Obtiene las categorías disponibles a partir de los metadatos del corpus cargado (sin leer disco)"""
     try:
-        # Intentar cargar el CSV categorizado
-        if os.path.exists(CSV_PATH):
-            # Verificar si tiene columna de categoría
-            df = pd.read_csv(CSV_PATH, nrows=5)
-            if 'categoria' in df.columns:
-                # Obtener todas las categorías únicas
-                df_completo = pd.read_csv(CSV_PATH)
-                categorias = df_completo['categoria'].dropna().unique().tolist()
-                if categorias:
-                    categorias.sort()
-                    return categorias
+        categorias = metadatos_corpus().categorias
+        if categorias:
+            return categorias
     except Exception as e:
         print(f"Error al obtener categorías: {e}")
     
-    # Si no se pueden obtener categorías del CSV, devolver las predefinidas
+    # Si no se pueden obtener categorías del corpus, devolver las predefinidas
     return list(CATEGORIAS.keys()) + ["otros"]
 
 def inicializar_generador(limit=None):
     """Inicializa el generador de textos con todos los textos disponibles"""
-    global generador
-    # Verificar si existe el CSV categorizado
-    csv_a_usar = CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL
+    global generador, _limite_generador
     
-    generador = GeneradorTextos(
-        api_key=API_KEY,
-        csv_path=csv_a_usar,
-        output_dir=OUTPUT_DIR,
-        cache_file=CACHE_FILE
-    )
-    generador.cargar_datos(limit=limit)  # None cargará todos los textos
+    with _lock_generador:
+        _limite_generador = limit
+        # Verificar si existe el CSV categorizado
+        csv_a_usar = CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL
+        
+        nuevo_generador = GeneradorTextos(
+            api_key=API_KEY,
+            csv_path=csv_a_usar,
+            output_dir=OUTPUT_DIR,
+            cache_file=CACHE_FILE
+        )
+        nuevo_generador.cargar_datos(limit=limit, solo_canonicos=SOLO_TEXTOS_CANONICOS)  # None cargará todos los textos
+        
+        # Publicar solo el generador ya cargado; las peticiones en curso siguen
+        # usando la instancia anterior hasta terminar
+        anterior = generador
+        if TAMANO_POOL > 0 and API_KEY:
+            # /generar saca textos del pool en lugar de esperar a la API
+            if anterior is not None and anterior.pool is not None:
+                # Al recargar se conserva el pool (sus textos están en la caché
+                # compartida) y solo se precalientan las categorías nuevas
+                categorias_previas = set(anterior.metadatos.categorias)
+                nuevo_generador.adoptar_pool(anterior)
+                if PRECALENTAR_POOL:
+                    nuevo_generador.pool.precalentar([c for c in nuevo_generador.metadatos.categorias
+                                                      if c not in categorias_previas])
+            else:
+                # El pool de cada categoría vacía se empieza a llenar ya
+                nuevo_generador.activar_pool(tamano=TAMANO_POOL)
+                if PRECALENTAR_POOL:
+                    nuevo_generador.pool.precalentar(nuevo_generador.metadatos.categorias)
+        generador = nuevo_generador
+        if anterior is not None:
+            anterior.detener_pool()
+    return nuevo_generador
+
+def generador_actual() -> GeneradorTextos:
+    """Devuelve la instancia publicada del generador (una sola lectura de la referencia global)"""
     return generador
 
+def _recargar_generador():
+    """Recarga el generador con el último límite usado (se ejecuta en un hilo)"""
+    try:
+        logging.info("El corpus ha cambiado en disco; recargando el generador...")
+        inicializar_generador(limit=_limite_generador)
+    except Exception as e:
+        logging.error(f"Error al recargar el generador: {e}")
+    finally:
+        _lock_recarga_generador.release()
+
+def metadatos_corpus() -> MetadatosCorpus:
+    """Devuelve los metadatos (categorías y recuentos) del corpus cargado
+    
+    Se calculan una sola vez al cargar el generador. Como mucho cada
+    INTERVALO_COMPROBACION_CORPUS segundos se compara la firma del CSV
+    (mtime y tamaño) con la de la carga; si ha cambiado, el generador se
+    recarga en segundo plano y mientras tanto se siguen sirviendo los
+    metadatos anteriores.
+    """
+    global _ultima_comprobacion_corpus
+    
+    gen = generador_actual()
+    ahora = time.monotonic()
+    if ahora - _ultima_comprobacion_corpus >= INTERVALO_COMPROBACION_CORPUS:
+        _ultima_comprobacion_corpus = ahora
+        if firma_corpus(gen.csv_path) != gen.metadatos.firma and _lock_recarga_generador.acquire(blocking=False):
+            threading.Thread(target=_recargar_generador, name="recarga-generador", daemon=True).start()
+    return gen.metadatos
+
 @app.route('/')
 def index():
     """Página principal"""
@@ -93,7 +162,7 @@ def generar():
     
     # Generar texto
     try:
-        texto = generador.generar_texto(
+        texto = generador_actual().generar_texto(
             categoria=categoria if categoria != "ninguna" else None,
             estilo=estilo if estilo else None,
             tema=tema if tema else None,
@@ -114,26 +183,30 @@ def generar_lote():
     temperatura = float(request.form.get('temperatura', 0.7))
     modelo = request.form.get('modelo', 'gpt-3.5-turbo')
     cantidad = int(request.form.get('cantidad', 5))
+    textos_por_llamada = int(request.form.get('textos_por_llamada', 1))  # Textos por llamada a la API (n)
     
     # Generar textos
     try:
-        textos = generador.generar_lote(
+        gen = generador_actual()
+        textos = gen.generar_lote(
             cantidad=cantidad,
             categoria=categoria if categoria != "ninguna" else None,
             estilo=estilo if estilo else None,
             tema=tema if tema else None,
             temperatura=temperatura,
-            modelo=modelo
+            modelo=modelo,
+            textos_por_llamada=textos_por_llamada
         )
         
         # Guardar textos en un archivo
         nombre_archivo = f"lote_{len(os.listdir(OUTPUT_DIR)) + 1}.txt"
-        generador.guardar_lote(textos, nombre_archivo)
+        gen.guardar_lote(textos, nombre_archivo)
         
         return jsonify({
             'success': True, 
             'textos': textos,
-            'archivo': os.path.join(OUTPUT_DIR, nombre_archivo)
+            'archivo': os.path.join(OUTPUT_DIR, nombre_archivo),
+            'metricas': gen.metricas_ultimo_lote
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -141,16 +214,8 @@ def generar_lote():
 @app.route('/estadisticas')
 def estadisticas():
     """Endpoint para obtener estadísticas de los textos"""
-    stats = {}
-    
-    # Contar textos por categoría
-    for categoria, textos in generador.textos_por_categoria.items():
-        stats[categoria] = len(textos)
-    
-    # Total de textos
-    stats['total'] = len(generador.textos)
-    
-    return jsonify(stats)
+    # Textos por categoría y total, calculados una sola vez al cargar el corpus
+    return jsonify(metadatos_corpus().estadisticas())
 
 @app.route('/generar_texto', methods=['POST'])
 def generar_texto():
@@ -159,7 +224,7 @@ def generar_texto():
         categoria = request.json.get('categoria', 'amor_relaciones')
         logging.info(f"Generando texto para categoría: {categoria}")
         
-        texto_generado = generador.generar_texto(categoria=categoria)
+        texto_generado = generador_actual().generar_texto(categoria=categoria)
         
         return jsonify({
             'texto': texto_generado,
@@ -171,86 +236,206 @@ def generar_texto():
             'error': str(e)
         }), 500
 
-# Variable global para almacenar el buscador de textos similares
+# Variable global para almacenar el buscador de textos similares.
+# Solo se asigna cuando el buscador está completamente listo.
 buscador_similares = None
 
-@app.route('/inicializar_buscador', methods=['GET'])
-def inicializar_buscador():
-    """Inicializa el buscador de textos similares en segundo plano"""
+# Estado del calentamiento en segundo plano del buscador
+_lock_buscador = threading.Lock()
+_hilo_buscador = None
+estado_buscador = {
+    'fase': 'pendiente',
+    'modelo_cargado': False,
+    'embeddings_cargados': False,
+    'indice_construido': False,
+    'textos_cargados': 0,
+    'error': None,
+    'intentos': 0,
+    'reintentar_despues_de': None,
+    'inicio': None,
+    'duracion_segundos': None
+}
+
+def _construir_buscador():
+    """Construye el buscador por fases y lo publica cuando está listo (se ejecuta en un hilo)"""
     global buscador_similares
     
     try:
-        if buscador_similares is None:
-            logging.info("Inicializando buscador de textos similares...")
-            
-            # Inicializar buscador con modelo gratuito
-            buscador_similares = BuscadorTextosSimilares(
-                csv_path=CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL,
-                model_name="paraphrase-multilingual-MiniLM-L12-v2",
-                cache_file="embeddings_cache.json"
-            )
-            
-            # Cargar datos y precalcular embeddings
-            buscador_similares.cargar_datos(precalcular_embeddings=True)
-            logging.info(f"Buscador inicializado con {len(buscador_similares.df)} textos")
-            
-            return jsonify({
-                'status': 'success',
-                'message': 'Buscador inicializado correctamente',
-                'textos_cargados': len(buscador_similares.df)
-            })
-        else:
-            return jsonify({
-                'status': 'success',
-                'message': 'Buscador ya inicializado',
-                'textos_cargados': len(buscador_similares.df)
-            })
+        estado_buscador.update(inicio=time.time(), error=None, reintentar_despues_de=None)
+        logging.info("Inicializando buscador de textos similares en segundo plano...")
+        buscador = BuscadorTextosSimilares(
+            csv_path=CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL,
+            model_name=MODELO_EMBEDDINGS,
+            cache_file=EMBEDDINGS_CACHE_FILE
+        )
+        estado_buscador.update(modelo_cargado=True, fase='cargando_embeddings')
+        
+        # Cargar datos, precalcular los embeddings que falten y construir la matriz
+        buscador.cargar_datos(precalcular_embeddings=True, solo_canonicos=SOLO_TEXTOS_CANONICOS)
+        estado_buscador.update(embeddings_cargados=True, fase='construyendo_indice',
+                               textos_cargados=len(buscador.df))
+        
+        buscador.obtener_indice()
+        estado_buscador.update(indice_construido=True)
+        
+        buscador_similares = buscador
+        estado_buscador.update(fase='listo', intentos=0, duracion_segundos=round(time.time() - estado_buscador['inicio'], 1))
+        logging.info(f"Buscador inicializado con {len(buscador.df)} textos "
+                     f"en {estado_buscador['duracion_segundos']}s")
     except Exception as e:
-        logging.error(f"Error al inicializar buscador: {str(e)}")
+        logging.error(f"Error al inicializar buscador (intento {estado_buscador['intentos']}): {str(e)}")
+        reintentar_despues_de = None
+        if estado_buscador['intentos'] < MAX_INTENTOS_BUSCADOR:
+            espera = ESPERA_REINTENTO_BUSCADOR * 2 ** (estado_buscador['intentos'] - 1)
+            reintentar_despues_de = time.time() + espera
+        estado_buscador.update(fase='error', error=str(e), reintentar_despues_de=reintentar_despues_de)
+
+def iniciar_buscador_en_segundo_plano() -> bool:
+    """
+    Lanza la construcción del buscador en un hilo si no está en marcha ni listo
+    
+    Tras un error solo se reintenta cuando ha pasado la espera (que se duplica
+    en cada fallo) y hasta MAX_INTENTOS_BUSCADOR veces.
+    
+    Returns:
+        True si se lanzó un hilo nuevo
+    """
+    global _hilo_buscador
+    
+    with _lock_buscador:
+        if buscador_similares is not None:
+            return False
+        if _hilo_buscador is not None and _hilo_buscador.is_alive():
+            return False
+        if estado_buscador['fase'] == 'error':
+            reintentar_despues_de = estado_buscador['reintentar_despues_de']
+            if reintentar_despues_de is None or time.time() < reintentar_despues_de:
+                return False
+        estado_buscador.update(fase='cargando_modelo', intentos=estado_buscador['intentos'] + 1)
+        _hilo_buscador = threading.Thread(target=_construir_buscador, name="calentamiento-buscador", daemon=True)
+        _hilo_buscador.start()
+        return True
+
+def _filtros_categoria(datos):
+    """
+    Lee los filtros de categoría de una petición JSON
+    
+    Returns:
+        Tupla (categorias, excluir_categorias); lanza ValueError si no son listas de textos
+    """
+    filtros = []
+    for campo in ('categorias', 'excluir_categorias'):
+        valor = datos.get(campo)
+        if isinstance(valor, str):
+            valor = [valor]
+        if valor is not None and (not isinstance(valor, list) or not all(isinstance(c, str) for c in valor)):
+            raise ValueError(f'"{campo}" debe ser una lista de categorías')
+        filtros.append(valor or None)
+    return tuple(filtros)
+
+def _respuesta_buscador_en_error():
+    """Respuesta 503 con el error de la última construcción del buscador"""
+    respuesta = jsonify({
+        'status': 'error',
+        'error': f"No se pudo inicializar el buscador de textos similares: {estado_buscador['error']}",
+        'estado': estado_buscador
+    })
+    respuesta.status_code = 503
+    reintentar_despues_de = estado_buscador['reintentar_despues_de']
+    if reintentar_despues_de is not None:
+        respuesta.headers['Retry-After'] = str(max(1, int(reintentar_despues_de - time.time())))
+    return respuesta
+
+def _respuesta_buscador_no_listo():
+    """Respuesta 503 rápida con indicación de reintento mientras el buscador no está listo"""
+    if estado_buscador['fase'] == 'error':
+        return _respuesta_buscador_en_error()
+    respuesta = jsonify({
+        'error': 'El buscador de textos similares se está inicializando. Inténtalo de nuevo en unos segundos.',
+        'estado': estado_buscador,
+        'reintentar_en': RETRY_AFTER_BUSCADOR
+    })
+    respuesta.status_code = 503
+    respuesta.headers['Retry-After'] = str(RETRY_AFTER_BUSCADOR)
+    return respuesta
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Indica si el buscador está listo y en qué fase de inicialización se encuentra"""
+    listo = buscador_similares is not None
+    return jsonify({'listo': listo, **estado_buscador}), (200 if listo else 503)
+
+@app.route('/inicializar_buscador', methods=['GET'])
+def inicializar_buscador():
+    """Inicializa el buscador de textos similares en segundo plano"""
+    if buscador_similares is not None:
         return jsonify({
-            'status': 'error',
-            'message': f"Error al inicializar buscador: {str(e)}"
-        }), 500
+            'status': 'success',
+            'message': 'Buscador ya inicializado',
+            'textos_cargados': len(buscador_similares.df)
+        })
+    
+    # Lanzar (o relanzar tras la espera de un error) la construcción sin bloquear la petición
+    iniciar_buscador_en_segundo_plano()
+    if estado_buscador['fase'] == 'error':
+        return _respuesta_buscador_en_error()
+    respuesta = jsonify({
+        'status': 'pending',
+        'message': 'Inicializando buscador en segundo plano',
+        'estado': estado_buscador,
+        'reintentar_en': RETRY_AFTER_BUSCADOR
+    })
+    respuesta.status_code = 202
+    respuesta.headers['Retry-After'] = str(RETRY_AFTER_BUSCADOR)
+    return respuesta
 
 @app.route('/buscar_similares', methods=['POST'])
 def buscar_similares():
     """Busca textos similares a uno dado"""
-    global buscador_similares
-    
     try:
         logging.info(f"Recibida solicitud de búsqueda de textos similares: {request.json}")
         texto_consulta = request.json.get('texto', '')
         top_n = int(request.json.get('top_n', 5))
+        # Compromiso recall/latencia: "ivf" es aproximado y nprobe regula cuántas listas explora
+        indice = request.json.get('indice', 'exacto')
+        nprobe = request.json.get('nprobe')
+        nprobe = int(nprobe) if nprobe is not None else None
         
         if not texto_consulta:
             logging.warning("El texto de consulta está vacío")
             return jsonify({
                 'error': 'El texto de consulta no puede estar vacío'
             }), 400
-            
-        logging.info(f"Buscando textos similares a: {texto_consulta}")
         
-        # Verificar si el buscador ya está inicializado
-        if buscador_similares is None:
-            logging.info("Inicializando buscador por primera vez...")
-            # Inicializar buscador con modelo gratuito
-            buscador_similares = BuscadorTextosSimilares(
-                csv_path=CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL,
-                model_name="paraphrase-multilingual-MiniLM-L12-v2",
-                cache_file="embeddings_cache.json"
-            )
+        if indice not in TIPOS_INDICE:
+            return jsonify({
+                'error': f"Índice no soportado: {indice}. Opciones: {', '.join(TIPOS_INDICE)}"
+            }), 400
+        
+        try:
+            categorias, excluir_categorias = _filtros_categoria(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
-            # Cargar datos sin precalcular todos los embeddings para esta primera búsqueda
-            # (solo se calcularán los necesarios)
-            buscador_similares.cargar_datos(precalcular_embeddings=False)
-            logging.info(f"Buscador inicializado con {len(buscador_similares.df)} textos")
+        # Si el buscador no está listo, responder enseguida en lugar de bloquear la petición
+        buscador = buscador_similares
+        if buscador is None:
+            iniciar_buscador_en_segundo_plano()
+            return _respuesta_buscador_no_listo()
+        
+        logging.info(f"Buscando textos similares a: {texto_consulta}")
         
         # Buscar similares
-        resultados = buscador_similares.buscar_textos_similares(texto_consulta, top_n=top_n)
+        resultados = buscador.buscar_textos_similares(
+            texto_consulta, top_n=top_n, indice=indice, nprobe=nprobe,
+            categorias=categorias, excluir_categorias=excluir_categorias)
         logging.info(f"Resultados encontrados: {len(resultados)}")
         logging.info(f"Primer resultado: {resultados[0] if resultados else 'Ninguno'}")
         
-        response_data = {'resultados': resultados}
+        response_data = {
+            'resultados': resultados,
+            'desglose_categorias': buscador.desglose_por_categoria(resultados)
+        }
         logging.info(f"Enviando respuesta con {len(resultados)} resultados")
         return jsonify(response_data)
     except Exception as e:
@@ -259,6 +444,67 @@ def buscar_similares():
             'error': str(e)
         }), 500
 
+@app.route('/buscar_similares/lote', methods=['POST'])
+def buscar_similares_lote():
+    """Busca textos similares para varios textos de consulta en una sola petición"""
+    try:
+        textos_consulta = request.json.get('textos', [])
+        top_n = int(request.json.get('top_n', 5))
+        indice = request.json.get('indice', 'exacto')
+        nprobe = request.json.get('nprobe')
+        nprobe = int(nprobe) if nprobe is not None else None
+        
+        if not isinstance(textos_consulta, list) or not textos_consulta:
+            return jsonify({
+                'error': 'Debes enviar una lista no vacía en "textos"'
+            }), 400
+        
+        if len(textos_consulta) > MAX_TEXTOS_LOTE_BUSQUEDA:
+            return jsonify({
+                'error': f'Como máximo se permiten {MAX_TEXTOS_LOTE_BUSQUEDA} textos por lote'
+            }), 400
+        
+        if any(not isinstance(texto, str) or not texto.strip() for texto in textos_consulta):
+            return jsonify({
+                'error': 'Los textos de consulta no pueden estar vacíos'
+            }), 400
+        
+        if indice not in TIPOS_INDICE:
+            return jsonify({
+                'error': f"Índice no soportado: {indice}. Opciones: {', '.join(TIPOS_INDICE)}"
+            }), 400
+        
+        try:
+            categorias, excluir_categorias = _filtros_categoria(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        buscador = buscador_similares
+        if buscador is None:
+            iniciar_buscador_en_segundo_plano()
+            return _respuesta_buscador_no_listo()
+        
+        logging.info(f"Buscando textos similares para un lote de {len(textos_consulta)} textos")
+        resultados = buscador.buscar_textos_similares_lote(
+            textos_consulta, top_n=top_n, indice=indice, nprobe=nprobe,
+            categorias=categorias, excluir_categorias=excluir_categorias)
+        
+        return jsonify({
+            'resultados': [
+                {
+                    'texto': texto,
+                    'resultados': similares,
+                    'desglose_categorias': buscador.desglose_por_categoria(similares)
+                }
+                for texto, similares in zip(textos_consulta, resultados)
+            ]
+        })
+    except Exception as e:
+        logging.error(f"Error al buscar textos similares en lote: {str(e)}")
+        return jsonify({
+            'error': str(e)
+        }), 500
+
 # Ruta para cargar más textos
 @app.route('/cargar-mas-textos', methods=['POST'])
 def cargar_mas_textos():
@@ -267,20 +513,13 @@ def cargar_mas_textos():
         datos = request.json
         cantidad = datos.get('cantidad', 5000)  # Por defecto, cargar 5000 más
         
-        # Reinicializar el generador con más textos
-        global generador
-        generador = GeneradorTextos(
-            api_key=API_KEY,
-            csv_path=CSV_PATH if os.path.exists(CSV_PATH) else CSV_PATH_ORIGINAL,
-            output_dir=OUTPUT_DIR,
-            cache_file=CACHE_FILE
-        )
-        generador.cargar_datos(limit=cantidad)
+        # Reinicializar el generador con más textos (se sustituye al terminar de cargar)
+        nuevo_generador = inicializar_generador(limit=cantidad)
         
         return jsonify({
             'success': True,
-            'mensaje': f'Se han cargado {len(generador.textos)} textos',
-            'total_textos': len(generador.textos)
+            'mensaje': f'Se han cargado {len(nuevo_generador.textos)} textos',
+            'total_textos': len(nuevo_generador.textos)
         })
     except Exception as e:
         return jsonify({
@@ -288,14 +527,15 @@ def cargar_mas_textos():
             'mensaje': f'Error al cargar más textos: {str(e)}'
         }), 500
 
-# Inicializar el generador al importar la aplicación
-generador = None
-
 # Inicializar el generador cuando se importa el módulo
 print("Inicializando generador de textos...")
 inicializar_generador()  # Sin límite para cargar todos los textos
 print(f"Generador inicializado con {len(generador.textos) if generador else 0} textos.")
 
+# Calentar el buscador en segundo plano para no bloquear la primera petición
+if PRECARGAR_BUSCADOR:
+    iniciar_buscador_en_segundo_plano()
+
 if __name__ == '__main__':
     import socket
     
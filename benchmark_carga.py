@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del arranque del generador de textos
+
+Compara el tiempo de GeneradorTextos.cargar_datos (lectura del corpus y
+agrupación por categorías, que se ejecuta al importar app.py en cada worker)
+con la implementación original fila a fila (chunks + iterrows y bucles en
+Python), y comprueba que ambas producen las mismas categorías.
+
+Uso:
+    python benchmark_carga.py
+    python benchmark_carga.py --csv texto_extraido_categorizado.csv --repeticiones 10
+    python benchmark_carga.py --sin-categorias   # Mide el modo de palabras clave
+
+En el modo de palabras clave la implementación original busca subcadenas y la
+actual palabras completas, así que algunos textos cambian de categoría.
+"""
+
+import os
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+import pandas as pd
+from typing import Callable, Dict, List, Tuple
+
+from generador_textos import CATEGORIAS, CSV_PATH, GeneradorTextos
+
+
+def cargar_datos_original(csv_path: str, chunk_size: int = 10000) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Implementación original de la carga: chunks + iterrows y clasificación texto a texto
+
+    Args:
+        csv_path: CSV con los textos
+        chunk_size: Tamaño de cada chunk
+
+    Returns:
+        Tupla (textos, textos_por_categoria)
+    """
+    textos = []
+    categorias_texto = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        if 'texto' not in chunk.columns:
+            chunk.columns = ["ruta", "carpeta", "texto"]
+        valid_chunk = chunk.dropna(subset=["texto"])
+        valid_chunk = valid_chunk[~valid_chunk["texto"].astype(str).str.contains(
+            "SIN_TEXTO|ERROR:|Lo siento", na=False)]
+        valid_chunk = valid_chunk[valid_chunk["texto"].astype(str).str.strip().str.len() > 0]
+        for _, row in valid_chunk.iterrows():
+            texto = str(row["texto"]).strip()
+            if "categoria" in row and pd.notna(row["categoria"]):
+                categorias_texto[texto] = row["categoria"]
+            textos.append(texto)
+
+    textos_por_categoria = {}
+    if categorias_texto:
+        for categoria in set(categorias_texto.values()):
+            textos_por_categoria[categoria] = []
+        textos_por_categoria["sin_categoria"] = []
+        for texto in textos:
+            if texto in categorias_texto:
+                textos_por_categoria[categorias_texto[texto]].append(texto)
+            else:
+                textos_por_categoria["sin_categoria"].append(texto)
+    else:
+        for categoria in CATEGORIAS:
+            textos_por_categoria[categoria] = []
+        textos_por_categoria["otros"] = []
+        for texto in textos:
+            texto_lower = texto.lower()
+            for categoria, palabras_clave in CATEGORIAS.items():
+                if any(palabra in texto_lower for palabra in palabras_clave):
+                    textos_por_categoria[categoria].append(texto)
+                    break
+            else:
+                textos_por_categoria["otros"].append(texto)
+    return textos, textos_por_categoria
+
+
+def cargar_datos_actual(csv_path: str) -> Tuple[List[str], Dict[str, List[str]]]:
+    """
+    Carga con la implementación actual de GeneradorTextos
+
+    Args:
+        csv_path: CSV con los textos
+
+    Returns:
+        Tupla (textos, textos_por_categoria) en el mismo formato que la original
+    """
+    generador = GeneradorTextos(api_key="benchmark", csv_path=csv_path,
+                                output_dir=tempfile.gettempdir(),
+                                cache_file=os.path.join(tempfile.gettempdir(), "benchmark_carga_cache.json"))
+    generador.cargar_datos()
+    textos_por_categoria = {categoria: generador.textos[indices].tolist()
+                            for categoria, indices in generador.indices_por_categoria.items()}
+    return generador.textos.tolist(), textos_por_categoria
+
+
+def medir(funcion: Callable, csv_path: str, repeticiones: int) -> List[float]:
+    """Ejecuta la carga varias veces y devuelve los tiempos en segundos"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(csv_path)
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de la carga de datos del generador")
+    parser.add_argument("--csv", type=str, default=CSV_PATH,
+                        help="CSV con los textos")
+    parser.add_argument("--repeticiones", type=int, default=5,
+                        help="Repeticiones de cada implementación")
+    parser.add_argument("--sin-categorias", action="store_true",
+                        help="Quitar la columna categoria para medir la clasificación por palabras clave")
+
+    args = parser.parse_args()
+
+    # Los logs de cada carga distorsionarían la medida
+    logging.disable(logging.INFO)
+
+    csv_path = args.csv
+    if args.sin_categorias:
+        df = pd.read_csv(args.csv).drop(columns=["categoria"], errors="ignore")
+        csv_path = os.path.join(tempfile.mkdtemp(), "sin_categorias.csv")
+        df.to_csv(csv_path, index=False)
+
+    textos_original, categorias_original = cargar_datos_original(csv_path)
+    textos_actual, categorias_actual = cargar_datos_actual(csv_path)
+    coinciden = textos_original == textos_actual and categorias_original == categorias_actual
+    print(f"Resultados idénticos: {'sí' if coinciden else 'NO'} ({len(textos_actual)} textos)")
+    if not coinciden and args.sin_categorias:
+        # Las palabras clave ahora respetan los límites de palabra ("love" ya no coincide en "glove")
+        distintos = sum((Counter(categorias_original.get(c, [])) - Counter(categorias_actual.get(c, []))).total()
+                        for c in categorias_original)
+        print(f"  {distintos} textos cambian de categoría por la coincidencia con límites de palabra")
+
+    resultados = {
+        "original (iterrows)": medir(cargar_datos_original, csv_path, args.repeticiones),
+        "actual (vectorizada)": medir(cargar_datos_actual, csv_path, args.repeticiones),
+    }
+    for nombre, tiempos in resultados.items():
+        print(f"{nombre:<22} mediana {statistics.median(tiempos) * 1000:8.1f} ms  "
+              f"mínimo {min(tiempos) * 1000:8.1f} ms")
+    mediana_original = statistics.median(resultados["original (iterrows)"])
+    mediana_actual = statistics.median(resultados["actual (vectorizada)"])
+    print(f"Aceleración: x{mediana_original / mediana_actual:.1f}")
+
+
+if __name__ == "__main__":
+    main()
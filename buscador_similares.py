@@ -9,14 +9,21 @@ embeddings vectoriales y similitud coseno, sin depender de APIs de pago.
 """
 
 import os
-import json
+import time
+import hashlib
 import logging
+import threading
 import argparse
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
+from almacen_embeddings import AlmacenEmbeddings
+from corpus import cargar_corpus
+from indices_similitud import (IndiceExacto, IndiceIVF, MatrizCuantizada, NPROBE_POR_DEFECTO,
+                               evaluar_recall, top_k)
 
 # Configuración de logging
 logging.basicConfig(
@@ -32,20 +39,98 @@ logging.basicConfig(
 CSV_PATH = "texto_extraido_categorizado.csv"
 EMBEDDINGS_CACHE_FILE = "embeddings_cache.json"
 MODELO_EMBEDDINGS = "paraphrase-multilingual-MiniLM-L12-v2"  # Modelo más económico para embeddings
+TIPOS_INDICE = ("exacto", "ivf")  # Backends de búsqueda disponibles
+TAMANO_SEGMENTO_EMBEDDINGS = 256  # Embeddings por escritura durable al precalcular
+BATCH_SIZE_EMBEDDINGS = 32  # Textos por pasada del modelo (ajustar según memoria disponible)
+
+# Caché en memoria de embeddings de consultas (nunca se guarda en disco)
+TAMANO_CACHE_CONSULTAS = int(os.environ.get("TAMANO_CACHE_CONSULTAS", 1024))  # Entradas máximas
+TTL_CACHE_CONSULTAS = float(os.environ.get("TTL_CACHE_CONSULTAS", 3600))  # Segundos (0 = sin caducidad)
+
+
+class CacheLRU:
+    """Caché LRU acotada en memoria con caducidad opcional, segura entre hilos"""
+    
+    def __init__(self, tamano_maximo: int = TAMANO_CACHE_CONSULTAS, ttl: float = TTL_CACHE_CONSULTAS,
+                 reloj: Callable[[], float] = time.monotonic):
+        """Inicializa la caché
+        
+        Args:
+            tamano_maximo: Número máximo de entradas (0 desactiva la caché)
+            ttl: Segundos de vida de cada entrada (0 o negativo = sin caducidad)
+            reloj: Función que devuelve el instante actual en segundos
+        """
+        self.tamano_maximo = tamano_maximo
+        self.ttl = ttl
+        self.reloj = reloj
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._datos)
+    
+    def obtener(self, clave: str):
+        """Devuelve el valor de una clave (o None) y la marca como usada recientemente"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, creado = entrada
+            if self.ttl > 0 and self.reloj() - creado > self.ttl:
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+    
+    def guardar(self, clave: str, valor):
+        """Guarda un valor, descartando las entradas menos usadas si se supera el tamaño"""
+        if self.tamano_maximo <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (valor, self.reloj())
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano_maximo:
+                self._datos.popitem(last=False)
+    
+    def limpiar(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._datos.clear()
+
 
 class BuscadorTextosSimilares:
     """Clase para buscar textos similares usando embeddings de sentence-transformers"""
     
-    def __init__(self, csv_path: str, model_name: str = MODELO_EMBEDDINGS, cache_file: str = EMBEDDINGS_CACHE_FILE):
+    def __init__(self, csv_path: str, model_name: str = MODELO_EMBEDDINGS, cache_file: str = EMBEDDINGS_CACHE_FILE,
+                 indice: str = "exacto", tamano_cache_consultas: int = TAMANO_CACHE_CONSULTAS,
+                 ttl_cache_consultas: float = TTL_CACHE_CONSULTAS, dtype_embeddings: str = "float32",
+                 cuantizar: bool = False, factor_rerank: int = 4):
         """Inicializa el buscador de textos similares
         
         Args:
             csv_path: Ruta al archivo CSV con los textos
             model_name: Nombre del modelo de sentence-transformers a utilizar
-            cache_file: Archivo para cachear embeddings
+            cache_file: Archivo para cachear embeddings. El almacén binario se crea
+                junto a él con el mismo nombre base (.f32/.idx/.meta.json); si
+                existe un caché JSON antiguo con este nombre se importa una vez.
+            indice: Índice de búsqueda por defecto ("exacto" o "ivf")
+            tamano_cache_consultas: Entradas máximas de la caché de consultas en memoria
+            ttl_cache_consultas: Segundos de vida de cada consulta cacheada
+            dtype_embeddings: Tipo de dato del almacén si se crea nuevo ("float32" o "float16")
+            cuantizar: Si True, mantiene la matriz del corpus en memoria como int8 con
+                una escala por vector (~4 veces menos RAM) y puntúa sobre ella
+            factor_rerank: Con cuantizar=True, se recuperan top_n * factor_rerank
+                candidatos y se reordenan con los vectores float exactos del
+                almacén (0 desactiva el reordenado)
         """
+        if indice not in TIPOS_INDICE:
+            raise ValueError(f"Índice no soportado: {indice}. Opciones: {', '.join(TIPOS_INDICE)}")
         self.csv_path = csv_path
         self.model_name = model_name
+        self.tipo_indice = indice
+        self.dtype_embeddings = dtype_embeddings
+        self.cuantizar = cuantizar
+        self.factor_rerank = factor_rerank
         
         # Usar la ruta de caché de Render si está disponible
         render_cache_dir = "/opt/render/project/src/cache"
@@ -58,113 +143,301 @@ class BuscadorTextosSimilares:
         
         self.model = SentenceTransformer(model_name)
         self.df = None
-        self.embeddings_cache = {}
+        self.almacen = None
+        
+        # Las consultas de usuarios van a una LRU en memoria, separada del corpus persistente
+        self.cache_consultas = CacheLRU(tamano_cache_consultas, ttl_cache_consultas)
+        
+        # Corpus vectorizado: matriz de embeddings normalizados (float32) con
+        # arrays paralelos de textos y categorías. Se construye bajo demanda.
+        self.matriz_embeddings = None
+        self.textos_corpus = None
+        self.categorias_corpus = None
+        self.huella_corpus = ""
+        self.filas_almacen = None  # Fila del almacén de cada texto del corpus
+        self.particiones_categoria = {}  # Categoría -> filas del corpus (ordenadas)
+        
+        # Índices de búsqueda construidos sobre la matriz, por tipo
+        self.indices = {}
+        
+        # Serializa la construcción de la matriz y de los índices (único escritor);
+        # una vez construidos, las búsquedas solo los leen y no necesitan el lock
+        self._lock = threading.RLock()
+        
         self.load_cache()
         
     def load_cache(self):
-        """Carga el caché de embeddings calculados previamente"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    self.embeddings_cache = json.load(f)
-            except Exception as e:
-                logging.error(f"Error al cargar caché de embeddings: {e}")
-    
-    def save_cache(self):
-        """Guarda el caché de embeddings"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.embeddings_cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Error al guardar caché de embeddings: {e}")
+        """Abre el almacén binario de embeddings, importando el caché JSON antiguo si existe"""
+        ruta_base = os.path.splitext(self.cache_file)[0]
+        self.almacen = AlmacenEmbeddings(ruta_base, dtype=self.dtype_embeddings)
+        
+        if len(self.almacen) == 0 and self.cache_file.endswith('.json') and os.path.exists(self.cache_file):
+            logging.info(f"Migrando caché de embeddings JSON {self.cache_file} al almacén binario...")
+            self.almacen.importar_json(self.cache_file, normalizar=True)
+        
+        logging.info(f"Almacén de embeddings abierto con {len(self.almacen)} vectores")
     
-    def cargar_datos(self, limit: int = None, precalcular_embeddings: bool = True):
-        """Carga los datos del CSV y opcionalmente precalcula todos los embeddings
+    def cargar_datos(self, limit: int = None, precalcular_embeddings: bool = True, solo_canonicos: bool = False):
+        """Carga los textos válidos del corpus y opcionalmente precalcula todos los embeddings
         
         Args:
             limit: Límite de textos a cargar
             precalcular_embeddings: Si True, precalcula los embeddings de todos los textos
+            solo_canonicos: Si True, carga solo las filas canónicas de cada cluster de
+                casi-duplicados (columna es_canonico generada por deduplicador.py)
         """
         logging.info(f"Cargando datos desde {self.csv_path}...")
         
         try:
-            self.df = pd.read_csv(self.csv_path)
-            if limit:
-                self.df = self.df.head(limit)
+            self.df = cargar_corpus(self.csv_path, columnas=['texto', 'categoria'],
+                                    solo_canonicos=solo_canonicos, limit=limit)
             logging.info(f"Datos cargados: {len(self.df)} textos")
             
+            # Invalidar la matriz del corpus anterior
+            self.matriz_embeddings = None
+            
             # Precalcular embeddings para mejorar rendimiento
             if precalcular_embeddings:
-                self.precalcular_embeddings()
+                self.construir_matriz()
                 
         except Exception as e:
             logging.error(f"Error al cargar CSV: {e}")
             raise
             
-    def precalcular_embeddings(self):
-        """Precalcula los embeddings de todos los textos en el dataframe"""
-        textos_sin_embedding = []
+    def precalcular_embeddings(self, tamano_segmento: int = TAMANO_SEGMENTO_EMBEDDINGS,
+                               batch_size: int = BATCH_SIZE_EMBEDDINGS, procesos: int = 1):
+        """Precalcula los embeddings de los textos del dataframe que aún no están en el almacén
+        
+        El cálculo es incremental y reanudable: los textos se identifican por el
+        hash de su contenido, de modo que solo se codifican los que faltan, y el
+        progreso se guarda en segmentos pequeños sincronizados a disco. Si el
+        proceso se interrumpe, la siguiente ejecución continúa desde el último
+        segmento completo.
+        
+        Args:
+            tamano_segmento: Embeddings por segmento escrito a disco
+            batch_size: Textos por pasada del modelo
+            procesos: Procesos de CPU para codificar en paralelo (1 = sin pool)
+        """
         total_textos = len(self.df)
         
-        # Identificar textos que no tienen embedding en caché
-        for texto in self.df['texto'].unique():
-            if texto not in self.embeddings_cache:
-                textos_sin_embedding.append(texto)
+        # Identificar textos que no tienen embedding en el almacén
+        textos_unicos = self.df['texto'].dropna().unique().tolist()
+        filas = self.almacen.obtener_filas(textos_unicos)
+        textos_sin_embedding = [t for t, fila in zip(textos_unicos, filas) if fila < 0]
         
         if not textos_sin_embedding:
             logging.info("Todos los embeddings ya están en caché")
             return
             
-        logging.info(f"Precalculando {len(textos_sin_embedding)} embeddings de {total_textos} textos...")
+        logging.info(f"Precalculando {len(textos_sin_embedding)} embeddings de {total_textos} textos "
+                     f"({len(textos_unicos) - len(textos_sin_embedding)} únicos ya en el almacén)...")
+        
+        pool = None
+        if procesos > 1:
+            logging.info(f"Iniciando pool de {procesos} procesos para codificar")
+            pool = self.model.start_multi_process_pool(target_devices=["cpu"] * procesos)
+        
+        try:
+            inicio = time.time()
+            for i in range(0, len(textos_sin_embedding), tamano_segmento):
+                segmento = textos_sin_embedding[i:i+tamano_segmento]
+                
+                # Calcular el segmento y guardarlo como escritura durable
+                embeddings = self._codificar(segmento, batch_size=batch_size, pool=pool)
+                self.almacen.agregar(segmento, embeddings, durable=True)
+                
+                # Mostrar progreso
+                procesados = i + len(segmento)
+                progress = int((procesados / len(textos_sin_embedding)) * 100)
+                velocidad = procesados / max(time.time() - inicio, 1e-9)
+                logging.info(f"Progreso: {progress}% ({procesados}/{len(textos_sin_embedding)}, "
+                             f"{velocidad:.1f} textos/s)")
+        finally:
+            if pool is not None:
+                self.model.stop_multi_process_pool(pool)
+        
+        logging.info("Embeddings precalculados y guardados en caché")
+    
+    def _codificar(self, textos: List[str], batch_size: int = BATCH_SIZE_EMBEDDINGS, pool=None) -> np.ndarray:
+        """
+        Calcula embeddings normalizados en el tipo de dato del almacén
+        
+        Los textos se ordenan por longitud antes de codificarlos para que cada
+        lote tenga longitudes parecidas (menos relleno), y el resultado se
+        devuelve en el orden original.
+        
+        Args:
+            textos: Textos a codificar
+            batch_size: Textos por pasada del modelo
+            pool: Pool multiproceso de sentence-transformers (opcional)
+            
+        Returns:
+            Matriz (len(textos) x dimension) en el tipo de dato del almacén
+        """
+        orden = np.argsort([len(t) for t in textos], kind='stable')
+        ordenados = [textos[k] for k in orden]
+        
+        if pool is not None:
+            embeddings = self.model.encode_multi_process(ordenados, pool, batch_size=batch_size)
+            normas = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            normas[normas == 0] = 1.0
+            embeddings = embeddings / normas
+        else:
+            embeddings = self.model.encode(ordenados, batch_size=batch_size, normalize_embeddings=True)
+        
+        resultado = np.empty_like(embeddings, dtype=self.almacen.dtype)
+        resultado[orden] = embeddings
+        return resultado
+    
+    def construir_matriz(self):
+        """Construye la matriz de embeddings normalizados del corpus
         
-        # Calcular embeddings en lotes para mayor eficiencia
-        batch_size = 32  # Ajustar según memoria disponible
-        for i in range(0, len(textos_sin_embedding), batch_size):
-            batch = textos_sin_embedding[i:i+batch_size]
+        Cada fila corresponde a un texto único (en orden de primera aparición en
+        el CSV) y está normalizada a norma 1, de forma que la similitud coseno
+        con una consulta se reduce a un producto matriz-vector.
+        """
+        with self._lock:
+            if self.df is None:
+                logging.error("No hay datos cargados. Llama a cargar_datos() primero.")
+                return
             
-            # Mostrar progreso
-            progress = min(100, int((i / len(textos_sin_embedding)) * 100))
-            logging.info(f"Progreso: {progress}% ({i}/{len(textos_sin_embedding)})")
+            # Asegurar que todos los textos tienen embedding en caché
+            self.precalcular_embeddings()
             
-            # Calcular embeddings en lote
-            embeddings = self.model.encode(batch).tolist()
+            textos_unicos = self.df.dropna(subset=['texto']).drop_duplicates(subset=['texto'])
+            textos = textos_unicos['texto'].tolist()
             
-            # Guardar en caché
-            for j, texto in enumerate(batch):
-                self.embeddings_cache[texto] = embeddings[j]
+            # Mismo criterio que el mapeo texto -> categoría original (última aparición)
+            if 'categoria' in self.df.columns:
+                texto_categoria_map = dict(zip(self.df['texto'], self.df['categoria']))
+            else:
+                texto_categoria_map = {}
+            categorias = [texto_categoria_map.get(texto, "sin_categoria") for texto in textos]
+            categorias = ["sin_categoria" if pd.isna(c) else c for c in categorias]
             
-            # Guardar caché periódicamente
-            if i % 100 == 0 and i > 0:
-                self.save_cache()
+            logging.info(f"Construyendo matriz de embeddings para {len(textos)} textos únicos...")
+            filas = self.almacen.obtener_filas(textos)
+            if self.cuantizar:
+                # Cuantizar por bloques directamente desde el almacén mapeado
+                matriz = MatrizCuantizada.desde_matriz(self.almacen.matriz, filas)
+            elif (len(filas) and self.almacen.dtype == np.float32
+                    and np.array_equal(filas, np.arange(filas[0], filas[0] + len(filas)))):
+                # El corpus ocupa un tramo contiguo del almacén: usar directamente la
+                # vista mapeada, compartida entre procesos a través de la caché de páginas
+                matriz = self.almacen.matriz[filas[0]:filas[0] + len(filas)]
+            elif len(filas):
+                # Copia en float32 (también para almacenes float16, que NumPy no multiplica con BLAS)
+                matriz = np.asarray(self.almacen.matriz[filas], dtype=np.float32)
+            else:
+                matriz = np.zeros((0, self.almacen.dimension or 0), dtype=np.float32)
+            
+            # Publicar la nueva matriz; los índices antiguos dejan de ser válidos
+            self.indices = {}
+            self.textos_corpus = np.asarray(textos, dtype=object)
+            self.categorias_corpus = np.asarray(categorias, dtype=object)
+            # Particiones por categoría para que las búsquedas filtradas solo puntúen su parte
+            codigos, nombres = pd.factorize(self.categorias_corpus)
+            self.particiones_categoria = {
+                nombre: np.flatnonzero(codigos == codigo) for codigo, nombre in enumerate(nombres)
+            }
+            self.huella_corpus = hashlib.blake2b(filas.tobytes(), digest_size=16).hexdigest()
+            self.filas_almacen = filas
+            self.matriz_embeddings = matriz
+            logging.info(f"Matriz de embeddings construida: {matriz.shape} "
+                         f"({'int8' if self.cuantizar else 'float'}, {matriz.nbytes / 1e6:.1f} MB)")
+    
+    def obtener_indice(self, tipo: Optional[str] = None):
+        """
+        Obtiene el índice de búsqueda del tipo indicado, construyéndolo si hace falta
         
-        # Guardar caché final
-        self.save_cache()
-        logging.info("Embeddings precalculados y guardados en caché")
+        El índice IVF se carga de disco (junto al almacén de embeddings) o se
+        construye y guarda la primera vez que se usa.
+        
+        Args:
+            tipo: Tipo de índice ("exacto" o "ivf"); por defecto el del buscador
+            
+        Returns:
+            Índice con método buscar(consulta, k, **parametros)
+        """
+        tipo = tipo or self.tipo_indice
+        if tipo not in TIPOS_INDICE:
+            raise ValueError(f"Índice no soportado: {tipo}. Opciones: {', '.join(TIPOS_INDICE)}")
+        
+        indice = self.indices.get(tipo)
+        if indice is not None:
+            return indice
+        
+        with self._lock:
+            if self.matriz_embeddings is None:
+                self.construir_matriz()
+            
+            if tipo not in self.indices:
+                if tipo == "ivf":
+                    ruta_indice = f"{self.almacen.ruta_base}.ivf.npz"
+                    self.indices[tipo] = IndiceIVF.cargar_o_construir(
+                        ruta_indice, self.matriz_embeddings, huella=self.huella_corpus)
+                else:
+                    self.indices[tipo] = IndiceExacto(self.matriz_embeddings)
+            return self.indices[tipo]
     
-    def get_embedding(self, text: str) -> List[float]:
-        """Obtiene el embedding de un texto usando sentence-transformers
+    def get_embedding(self, text: str) -> np.ndarray:
+        """Obtiene el embedding normalizado de un texto usando sentence-transformers
+        
+        Si el texto pertenece al corpus se lee del almacén persistente; si no, se
+        trata como una consulta y se cachea solo en la LRU en memoria.
         
         Args:
             text: Texto para obtener el embedding
             
         Returns:
-            Lista de valores float que representan el embedding
+            Vector float32 de norma 1 (vacío si no se pudo calcular)
         """
-        if text in self.embeddings_cache:
-            return self.embeddings_cache[text]
+        embeddings = self.obtener_embeddings([text])
+        if len(embeddings) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return embeddings[0]
+    
+    def obtener_embeddings(self, textos: List[str]) -> np.ndarray:
+        """Obtiene los embeddings normalizados de varios textos
         
-        try:
-            # Usar el modelo de sentence-transformers para generar embeddings
-            embedding = self.model.encode(text).tolist()
+        Los textos del corpus se leen del almacén y las consultas ya vistas de la
+        LRU en memoria; el resto se calcula en una sola pasada por lotes del modelo.
+        
+        Args:
+            textos: Textos para obtener los embeddings
             
-            # Guardar en caché
-            self.embeddings_cache[text] = embedding
-            self.save_cache()
+        Returns:
+            Matriz float32 (len(textos) x dimension), vacía si no se pudo calcular
+        """
+        embeddings = [None] * len(textos)
+        pendientes = {}
+        for i, texto in enumerate(textos):
+            embedding = self.almacen.obtener(texto)
+            if embedding is None:
+                embedding = self.cache_consultas.obtener(texto)
+            if embedding is None:
+                pendientes.setdefault(texto, []).append(i)
+            else:
+                embeddings[i] = embedding
+        
+        if pendientes:
+            try:
+                # Usar el modelo de sentence-transformers para generar embeddings
+                nuevos = self.model.encode(list(pendientes), normalize_embeddings=True).astype(np.float32)
+            except Exception as e:
+                logging.error(f"Error al obtener embedding: {str(e)}")
+                return np.zeros((0, 0), dtype=np.float32)
             
-            return embedding
-        except Exception as e:
-            logging.error(f"Error al obtener embedding: {str(e)}")
-            return []
+            for (texto, posiciones), embedding in zip(pendientes.items(), nuevos):
+                # Guardar solo en la caché de consultas (no se escribe en disco)
+                self.cache_consultas.guardar(texto, embedding)
+                for i in posiciones:
+                    embeddings[i] = embedding
+        
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.asarray(embeddings, dtype=np.float32)
     
     def calcular_similitud_coseno(self, vec1: List[float], vec2: List[float]) -> float:
         """
@@ -177,7 +450,7 @@ class BuscadorTextosSimilares:
         Returns:
             Similitud del coseno (0-1)
         """
-        if not vec1 or not vec2:
+        if len(vec1) == 0 or len(vec2) == 0:
             return 0.0
             
         vec1 = np.array(vec1)
@@ -193,13 +466,54 @@ class BuscadorTextosSimilares:
             
         return dot_product / (norm_a * norm_b)
     
-    def buscar_textos_similares(self, texto_consulta: str, top_n: int = 5) -> List[Dict]:
+    def filas_filtradas(self, categorias: Optional[List[str]] = None,
+                        excluir_categorias: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """
+        Calcula las filas del corpus que cumplen un filtro de categorías
+        
+        Args:
+            categorias: Categorías a incluir (por defecto todas)
+            excluir_categorias: Categorías a excluir
+            
+        Returns:
+            Array ordenado de filas, o None si no hay filtro
+        """
+        if not categorias and not excluir_categorias:
+            return None
+        
+        vacio = np.zeros(0, dtype=np.int64)
+        if categorias:
+            incluidas = [c for c in categorias if c not in set(excluir_categorias or [])]
+            partes = [self.particiones_categoria.get(c, vacio) for c in dict.fromkeys(incluidas)]
+        else:
+            excluidas = set(excluir_categorias)
+            partes = [filas for c, filas in self.particiones_categoria.items() if c not in excluidas]
+        if not partes:
+            return vacio
+        return np.sort(np.concatenate(partes))
+    
+    @staticmethod
+    def desglose_por_categoria(resultados: List[Dict]) -> Dict[str, int]:
+        """Cuenta cuántos resultados hay de cada categoría"""
+        desglose = {}
+        for resultado in resultados:
+            desglose[resultado["categoria"]] = desglose.get(resultado["categoria"], 0) + 1
+        return desglose
+    
+    def buscar_textos_similares(self, texto_consulta: str, top_n: int = 5,
+                                indice: Optional[str] = None, nprobe: Optional[int] = None,
+                                categorias: Optional[List[str]] = None,
+                                excluir_categorias: Optional[List[str]] = None) -> List[Dict]:
         """
         Busca los textos más similares a uno dado
         
         Args:
             texto_consulta: Texto para buscar similares
             top_n: Número de resultados a devolver
+            indice: Índice a usar ("exacto" o "ivf"); por defecto el del buscador
+            nprobe: Listas a explorar con el índice IVF (más = mejor recall, más latencia)
+            categorias: Buscar solo en estas categorías
+            excluir_categorias: No buscar en estas categorías
             
         Returns:
             Lista de diccionarios con textos similares y su porcentaje de similitud
@@ -211,57 +525,195 @@ class BuscadorTextosSimilares:
         # Obtener embedding del texto de consulta
         logging.info(f"Obteniendo embedding para texto de consulta: {texto_consulta[:50]}...")
         embedding_consulta = self.get_embedding(texto_consulta)
-        if not embedding_consulta:
+        if embedding_consulta.size == 0:
             logging.error("No se pudo obtener embedding para el texto de consulta")
             return []
         
-        # Calcular similitud con todos los textos de manera más eficiente
-        logging.info("Calculando similitudes con todos los textos...")
-        similitudes = []
+        # Obtener el índice (construye la matriz del corpus si todavía no existe)
+        indice_busqueda = self.obtener_indice(indice)
+        
+        total_textos = len(self.textos_corpus)
+        if total_textos == 0 or top_n <= 0:
+            return []
+        
+        filas_permitidas = self.filas_filtradas(categorias, excluir_categorias)
+        if filas_permitidas is not None:
+            total_textos = len(filas_permitidas)
+            if total_textos == 0:
+                return []
+        
+        # Consulta y corpus están normalizados: la similitud coseno es el producto escalar
+        consulta = np.asarray(embedding_consulta, dtype=np.float32)
+        logging.info(f"Calculando similitudes con {total_textos} textos (índice {indice_busqueda.tipo})...")
+        filas, similitudes = indice_busqueda.buscar(
+            consulta, self._candidatos_a_recuperar(top_n),
+            nprobe=nprobe if nprobe is not None else NPROBE_POR_DEFECTO, filas=filas_permitidas)
+        filas, similitudes = self._reordenar_exacto(consulta, filas, similitudes, top_n)
         
-        # Usar un conjunto único de textos para evitar cálculos duplicados
-        textos_unicos = self.df.drop_duplicates(subset=['texto'])
-        total_textos = len(textos_unicos)
+        logging.info(f"Devolviendo los {len(filas)} resultados más similares")
+        return self._formatear_resultados(filas, similitudes)
+    
+    def buscar_textos_similares_lote(self, textos_consulta: List[str], top_n: int = 5,
+                                     indice: Optional[str] = None, nprobe: Optional[int] = None,
+                                     categorias: Optional[List[str]] = None,
+                                     excluir_categorias: Optional[List[str]] = None) -> List[List[Dict]]:
+        """
+        Busca los textos más similares a cada uno de varios textos de consulta
         
-        # Crear un diccionario para mapear textos a categorías
-        texto_categoria_map = dict(zip(self.df['texto'], self.df['categoria']))
+        Calcula todos los embeddings en una sola pasada del modelo y puntúa las
+        consultas contra el corpus con productos matriz-matriz.
         
-        # Procesar en lotes más pequeños para mostrar progreso
-        batch_size = 500
-        for i in range(0, total_textos, batch_size):
-            end_idx = min(i + batch_size, total_textos)
-            batch = textos_unicos.iloc[i:end_idx]
+        Args:
+            textos_consulta: Textos para buscar similares
+            top_n: Número de resultados a devolver por consulta
+            indice: Índice a usar ("exacto" o "ivf"); por defecto el del buscador
+            nprobe: Listas a explorar con el índice IVF
+            categorias: Buscar solo en estas categorías
+            excluir_categorias: No buscar en estas categorías
             
-            # Mostrar progreso
-            logging.info(f"Procesando textos {i} a {end_idx} de {total_textos}")
+        Returns:
+            Lista con los resultados de cada consulta, en el mismo orden
+        """
+        if self.df is None:
+            logging.error("No hay datos cargados. Llama a cargar_datos() primero.")
+            return [[] for _ in textos_consulta]
+        if not textos_consulta:
+            return []
+        
+        logging.info(f"Obteniendo embeddings para {len(textos_consulta)} textos de consulta...")
+        consultas = self.obtener_embeddings(textos_consulta)
+        if consultas.size == 0:
+            logging.error("No se pudieron obtener embeddings para los textos de consulta")
+            return [[] for _ in textos_consulta]
+        
+        indice_busqueda = self.obtener_indice(indice)
+        if len(self.textos_corpus) == 0 or top_n <= 0:
+            return [[] for _ in textos_consulta]
+        
+        filas_permitidas = self.filas_filtradas(categorias, excluir_categorias)
+        if filas_permitidas is not None and len(filas_permitidas) == 0:
+            return [[] for _ in textos_consulta]
+        
+        logging.info(f"Calculando similitudes de {len(textos_consulta)} consultas con "
+                     f"{len(self.textos_corpus)} textos (índice {indice_busqueda.tipo})...")
+        busquedas = indice_busqueda.buscar_lote(
+            consultas, self._candidatos_a_recuperar(top_n),
+            nprobe=nprobe if nprobe is not None else NPROBE_POR_DEFECTO, filas=filas_permitidas)
+        return [self._formatear_resultados(*self._reordenar_exacto(consulta, filas, similitudes, top_n))
+                for consulta, (filas, similitudes) in zip(consultas, busquedas)]
+    
+    def _candidatos_a_recuperar(self, top_n: int) -> int:
+        """Número de candidatos a pedir al índice (más de top_n si se reordena tras cuantizar)"""
+        if self.cuantizar and self.factor_rerank > 0:
+            return top_n * self.factor_rerank
+        return top_n
+    
+    def _reordenar_exacto(self, consulta: np.ndarray, filas: np.ndarray, similitudes: np.ndarray,
+                          top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Reordena los candidatos de una búsqueda cuantizada con los vectores float exactos
+        
+        Solo lee del almacén mapeado las filas de los candidatos.
+        
+        Args:
+            consulta: Vector normalizado de la consulta
+            filas: Filas candidatas del corpus
+            similitudes: Similitudes aproximadas de los candidatos
+            top_n: Número de resultados finales
             
-            for _, row in batch.iterrows():
-                texto = row["texto"]
-                
-                # Obtener embedding del texto (ya debería estar en caché)
-                embedding_texto = self.get_embedding(texto)
-                
-                # Calcular similitud
-                similitud = self.calcular_similitud_coseno(embedding_consulta, embedding_texto)
-                
-                # Guardar resultado
-                similitudes.append({
-                    "texto": texto,
-                    "similitud": similitud,
-                    "similitud_porcentaje": round(similitud * 100, 2),
-                    "categoria": texto_categoria_map.get(texto, "sin_categoria")
-                })
-        
-        # Ordenar por similitud descendente
-        logging.info("Ordenando resultados por similitud...")
-        similitudes_ordenadas = sorted(similitudes, key=lambda x: x["similitud"], reverse=True)
-        
-        # Devolver los top_n resultados
-        logging.info(f"Devolviendo los {top_n} resultados más similares")
-        return similitudes_ordenadas[:top_n]
+        Returns:
+            Tupla (filas, similitudes) con los top_n resultados
+        """
+        if not self.cuantizar or self.factor_rerank <= 0 or len(filas) == 0:
+            return filas[:top_n], similitudes[:top_n]
+        
+        filas_almacen = self.filas_almacen[filas]
+        orden_lectura = np.argsort(filas_almacen)
+        vectores = np.empty((len(filas), self.almacen.dimension), dtype=np.float32)
+        vectores[orden_lectura] = self.almacen.matriz[filas_almacen[orden_lectura]]
+        exactas = vectores @ consulta
+        posiciones = top_k(exactas, top_n)
+        return filas[posiciones], exactas[posiciones]
+    
+    def _formatear_resultados(self, filas: np.ndarray, similitudes: np.ndarray) -> List[Dict]:
+        """Convierte filas del corpus y sus similitudes en la lista de resultados"""
+        resultados = []
+        for idx, similitud in zip(filas, similitudes):
+            similitud = float(similitud)
+            resultados.append({
+                "texto": self.textos_corpus[idx],
+                "similitud": similitud,
+                "similitud_porcentaje": round(similitud * 100, 2),
+                "categoria": self.categorias_corpus[idx]
+            })
+        return resultados
+    
+    def evaluar_recall(self, k: int = 10, n_consultas: int = 200,
+                       valores_nprobe=(1, 2, 4, 8, 16, 32), semilla: int = 0) -> List[Dict]:
+        """
+        Mide el recall@k del índice IVF frente a la búsqueda exacta
+        
+        Usa como consultas una muestra aleatoria de textos del propio corpus.
+        
+        Args:
+            k: Número de vecinos a comparar
+            n_consultas: Número de consultas de la muestra
+            valores_nprobe: Valores de nprobe a evaluar
+            semilla: Semilla aleatoria para la muestra
+            
+        Returns:
+            Lista de diccionarios con nprobe, recall y latencias
+        """
+        indice = self.obtener_indice("ivf")
+        rng = np.random.default_rng(semilla)
+        n = len(self.matriz_embeddings)
+        muestra = np.sort(rng.choice(n, min(n_consultas, n), replace=False))
+        consultas = np.asarray(self.matriz_embeddings[muestra], dtype=np.float32)
+        return evaluar_recall(self.matriz_embeddings, indice, consultas, k=k, valores_nprobe=valores_nprobe)
+    
+    def evaluar_cuantizacion(self, k: int = 5, n_consultas: int = 200, semilla: int = 0) -> Dict:
+        """
+        Compara los top-k de la búsqueda cuantizada con los de la búsqueda float exacta
+        
+        Args:
+            k: Número de resultados a comparar
+            n_consultas: Número de consultas (textos del propio corpus)
+            semilla: Semilla aleatoria para la muestra
+            
+        Returns:
+            Diccionario con la coincidencia media de los top-k y la memoria de ambas matrices
+        """
+        if not self.cuantizar:
+            raise ValueError("El buscador no está en modo cuantizado")
+        indice = self.obtener_indice("exacto")
+        matriz_float = np.asarray(self.almacen.matriz[self.filas_almacen], dtype=np.float32)
+        exacto = IndiceExacto(matriz_float)
+        
+        rng = np.random.default_rng(semilla)
+        n = len(matriz_float)
+        muestra = rng.choice(n, min(n_consultas, n), replace=False)
+        coincidencias = []
+        for consulta in matriz_float[muestra]:
+            esperados = set(exacto.buscar(consulta, k)[0].tolist())
+            filas, similitudes = indice.buscar(consulta, self._candidatos_a_recuperar(k))
+            filas, _ = self._reordenar_exacto(consulta, filas, similitudes, k)
+            coincidencias.append(len(esperados.intersection(filas.tolist())) / max(1, len(esperados)))
+        
+        informe = {
+            "coincidencia_top_k": round(float(np.mean(coincidencias)), 4),
+            "k": k,
+            "factor_rerank": self.factor_rerank,
+            "memoria_float_mb": round(matriz_float.nbytes / 1e6, 2),
+            "memoria_int8_mb": round(self.matriz_embeddings.nbytes / 1e6, 2)
+        }
+        logging.info(f"Cuantización int8: coincidencia top-{k} {informe['coincidencia_top_k']:.4f}, "
+                     f"{informe['memoria_float_mb']} MB -> {informe['memoria_int8_mb']} MB")
+        return informe
 
 
-def buscar_similares(texto_consulta: str, top_n: int = 5, limit: int = None) -> List[Dict]:
+def buscar_similares(texto_consulta: str, top_n: int = 5, limit: int = None,
+                     indice: str = "exacto", nprobe: Optional[int] = None, cuantizar: bool = False,
+                     solo_canonicos: bool = False) -> List[Dict]:
     """
     Función de conveniencia para buscar textos similares
     
@@ -269,20 +721,26 @@ def buscar_similares(texto_consulta: str, top_n: int = 5, limit: int = None) ->
         texto_consulta: Texto para buscar similares
         top_n: Número de resultados a devolver
         limit: Límite de textos a cargar del CSV
+        indice: Índice de búsqueda ("exacto" o "ivf")
+        nprobe: Listas a explorar con el índice IVF
+        cuantizar: Si True, busca sobre la matriz cuantizada a int8
+        solo_canonicos: Si True, busca solo entre los textos canónicos de cada cluster de casi-duplicados
         
     Returns:
         Lista de diccionarios con textos similares y su porcentaje de similitud
     """
     buscador = BuscadorTextosSimilares(
         csv_path=CSV_PATH,
-        cache_file=EMBEDDINGS_CACHE_FILE
+        cache_file=EMBEDDINGS_CACHE_FILE,
+        indice=indice,
+        cuantizar=cuantizar
     )
     
     # Cargar datos
-    buscador.cargar_datos(limit=limit)
+    buscador.cargar_datos(limit=limit, solo_canonicos=solo_canonicos)
     
     # Buscar similares
-    resultados = buscador.buscar_textos_similares(texto_consulta, top_n=top_n)
+    resultados = buscador.buscar_textos_similares(texto_consulta, top_n=top_n, nprobe=nprobe)
     
     # Mostrar resultados
     logging.info(f"Resultados para: '{texto_consulta}'")
@@ -296,10 +754,49 @@ if __name__ == "__main__":
     import argparse
     
     parser = argparse.ArgumentParser(description="Buscar textos similares en el CSV")
-    parser.add_argument("texto", type=str, help="Texto para buscar similares")
+    parser.add_argument("texto", type=str, nargs="?", default=None, help="Texto para buscar similares")
     parser.add_argument("--top", type=int, default=5, help="Número de resultados a mostrar")
     parser.add_argument("--limit", type=int, default=None, help="Límite de textos a cargar del CSV")
+    parser.add_argument("--indice", type=str, default="exacto", choices=TIPOS_INDICE,
+                        help="Índice de búsqueda a usar")
+    parser.add_argument("--nprobe", type=int, default=None,
+                        help="Listas a explorar con el índice IVF (recall vs latencia)")
+    parser.add_argument("--evaluar-recall", action="store_true",
+                        help="Medir el recall@k del índice IVF frente a la búsqueda exacta")
+    parser.add_argument("--construir-almacen", action="store_true",
+                        help="Precalcular offline todos los embeddings del CSV (antes de desplegar)")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos de CPU para codificar en paralelo al construir el almacén")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE_EMBEDDINGS,
+                        help="Textos por pasada del modelo al construir el almacén")
+    parser.add_argument("--segmento", type=int, default=TAMANO_SEGMENTO_EMBEDDINGS,
+                        help="Embeddings por segmento escrito a disco al construir el almacén")
+    parser.add_argument("--dtype", type=str, default="float32", choices=["float32", "float16"],
+                        help="Tipo de dato del almacén si se crea nuevo")
+    parser.add_argument("--cuantizar", action="store_true",
+                        help="Buscar sobre la matriz cuantizada a int8 (reordenando con vectores exactos)")
+    parser.add_argument("--solo-canonicos", action="store_true",
+                        help="Buscar solo entre los textos canónicos de cada cluster de casi-duplicados")
     
     args = parser.parse_args()
     
-    buscar_similares(args.texto, top_n=args.top, limit=args.limit)
+    if args.construir_almacen:
+        buscador = BuscadorTextosSimilares(csv_path=CSV_PATH, cache_file=EMBEDDINGS_CACHE_FILE,
+                                           dtype_embeddings=args.dtype)
+        buscador.cargar_datos(limit=args.limit, precalcular_embeddings=False)
+        buscador.precalcular_embeddings(tamano_segmento=args.segmento, batch_size=args.batch_size,
+                                        procesos=args.procesos)
+        if args.indice == "ivf":
+            buscador.obtener_indice("ivf")
+    elif args.evaluar_recall:
+        buscador = BuscadorTextosSimilares(csv_path=CSV_PATH, cache_file=EMBEDDINGS_CACHE_FILE,
+                                           cuantizar=args.cuantizar)
+        buscador.cargar_datos(limit=args.limit, solo_canonicos=args.solo_canonicos)
+        buscador.evaluar_recall(k=args.top)
+        if args.cuantizar:
+            buscador.evaluar_cuantizacion(k=args.top)
+    elif args.texto:
+        buscar_similares(args.texto, top_n=args.top, limit=args.limit, indice=args.indice, nprobe=args.nprobe,
+                         cuantizar=args.cuantizar, solo_canonicos=args.solo_canonicos)
+    else:
+        parser.error("Indica un texto a buscar, --evaluar-recall o --construir-almacen")
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caché de textos generados en SQLite
+
+Sustituye al antiguo JSON (textos_cache.json / cache_generador.json), que se
+reescribía entero tras cada texto generado. Cada texto nuevo es ahora un
+INSERT de coste constante en una base SQLite en modo WAL: las escrituras son
+atómicas, varios hilos y workers de gunicorn pueden leer mientras otro
+escribe, y un proceso que muere a mitad no deja el fichero corrupto.
+
+Los textos pueden estar ya servidos (historial) o generados de antemano y
+pendientes de servir (el pool de pool_generacion.py); consumir() saca un
+texto pendiente y lo marca como servido en una sola transacción, así que
+nunca se sirve dos veces. Un texto generado de nuevo que ya estaba en la
+clave (servido o en el pool) se guarda como servido, para no repetirlo.
+
+Cada cierto número de inserciones se compacta: se eliminan los textos
+repetidos de una misma clave (conservando la fila servida) y se vuelca el
+WAL a la base principal para que no crezca sin límite.
+
+Uso:
+    python cache_generacion.py textos_cache.sqlite3             # Resumen
+    python cache_generacion.py textos_cache.sqlite3 --compactar  # Compactar y VACUUM
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import List, Optional
+
+COMPACTAR_CADA = 500  # Inserciones entre compactaciones automáticas
+TIMEOUT_BLOQUEO = 30.0  # Segundos que una escritura espera si otro proceso tiene el bloqueo
+
+
+def ruta_sqlite(cache_file: str) -> str:
+    """Ruta de la base SQLite correspondiente a un fichero de caché (.json antiguo o .sqlite3)"""
+    return f"{os.path.splitext(cache_file)[0]}.sqlite3"
+
+
+class CacheGeneracion:
+    """Caché clave -> textos generados, persistido en SQLite (WAL)
+
+    Es seguro usarlo desde varios hilos (cada hilo abre su propia conexión)
+    y desde varios procesos que compartan el fichero.
+    """
+
+    def __init__(self, ruta: str, compactar_cada: int = COMPACTAR_CADA):
+        """Inicializa la caché
+
+        Args:
+            ruta: Ruta de la base SQLite
+            compactar_cada: Inserciones entre compactaciones automáticas (0 = nunca)
+        """
+        self.ruta = ruta
+        self.compactar_cada = compactar_cada
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inserciones = 0
+
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS textos (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    clave TEXT NOT NULL,
+                    texto TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    consumido INTEGER NOT NULL DEFAULT 0
+                )""")
+            columnas = [fila[1] for fila in conexion.execute("PRAGMA table_info(textos)")]
+            if "consumido" not in columnas:
+                # Base anterior al pool: todos sus textos ya se habían servido
+                conexion.execute("ALTER TABLE textos ADD COLUMN consumido INTEGER NOT NULL DEFAULT 0")
+                conexion.execute("UPDATE textos SET consumido = 1")
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_textos_clave ON textos (clave, consumido)")
+
+    def _conexion(self) -> sqlite3.Connection:
+        """Conexión del hilo actual (se abre la primera vez)"""
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=TIMEOUT_BLOQUEO)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def __len__(self) -> int:
+        return self._conexion().execute("SELECT COUNT(*) FROM textos").fetchone()[0]
+
+    def __contains__(self, clave: str) -> bool:
+        fila = self._conexion().execute("SELECT 1 FROM textos WHERE clave = ? LIMIT 1", (clave,)).fetchone()
+        return fila is not None
+
+    def numero_claves(self) -> int:
+        """Número de claves distintas en la caché"""
+        return self._conexion().execute("SELECT COUNT(DISTINCT clave) FROM textos").fetchone()[0]
+
+    def obtener(self, clave: str) -> List[str]:
+        """
+        Obtiene todos los textos guardados para una clave
+
+        Args:
+            clave: Clave de la caché
+
+        Returns:
+            Textos en orden de inserción (lista vacía si no hay ninguno)
+        """
+        filas = self._conexion().execute("SELECT texto FROM textos WHERE clave = ? ORDER BY id", (clave,))
+        return [texto for texto, in filas]
+
+    def disponibles(self, clave: str) -> int:
+        """Número de textos de una clave generados de antemano y aún sin servir"""
+        return self._conexion().execute(
+            "SELECT COUNT(*) FROM textos WHERE clave = ? AND consumido = 0", (clave,)).fetchone()[0]
+
+    def consumir(self, clave: str) -> Optional[str]:
+        """
+        Saca del pool el texto sin servir más antiguo de una clave
+
+        La lectura y la marca van en la misma transacción, así que dos hilos o
+        procesos nunca reciben el mismo texto.
+
+        Args:
+            clave: Clave de la caché
+
+        Returns:
+            Texto servido o None si no queda ninguno disponible
+        """
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            fila = conexion.execute("SELECT id, texto FROM textos WHERE clave = ? AND consumido = 0 "
+                                    "ORDER BY id LIMIT 1", (clave,)).fetchone()
+            if fila is None:
+                return None
+            conexion.execute("UPDATE textos SET consumido = 1 WHERE id = ?", (fila[0],))
+        return fila[1]
+
+    def agregar(self, clave: str, texto: str, consumido: bool = True):
+        """
+        Añade un texto generado a una clave
+
+        Args:
+            clave: Clave de la caché
+            texto: Texto generado
+            consumido: True si el texto ya se ha servido (historial); False si
+                queda disponible en el pool para servirse más adelante
+        """
+        self.agregar_varios(clave, [texto], consumido=consumido)
+
+    def agregar_varios(self, clave: str, textos: List[str], consumido: bool = True):
+        """
+        Añade varios textos de una clave en una sola transacción
+
+        Un texto que ya estaba en la clave se guarda siempre como servido: si
+        entrase en el pool se serviría por segunda vez.
+
+        Args:
+            clave: Clave de la caché
+            textos: Textos generados
+            consumido: True si ya se han servido; False si quedan disponibles en el pool
+        """
+        ahora = time.time()
+        with self._conexion() as conexion:
+            conexion.executemany("""
+                INSERT INTO textos (clave, texto, creado, consumido)
+                SELECT ?, ?, ?, ? OR EXISTS (SELECT 1 FROM textos WHERE clave = ? AND texto = ?)""",
+                                 [(clave, texto, ahora, int(consumido), clave, texto) for texto in textos])
+
+        with self._lock:
+            self._inserciones += len(textos)
+            toca_compactar = self.compactar_cada and self._inserciones >= self.compactar_cada
+            if toca_compactar:
+                self._inserciones = 0
+        if toca_compactar:
+            self.compactar()
+
+    def compactar(self, vacuum: bool = False) -> int:
+        """
+        Elimina textos repetidos de una misma clave y vuelca el WAL a la base
+
+        De cada texto repetido se conserva una fila servida si la hay (la más
+        antigua), de modo que un texto ya servido no vuelve al pool.
+
+        Args:
+            vacuum: Si True, además reescribe la base para liberar espacio (más lento)
+
+        Returns:
+            Número de filas eliminadas
+        """
+        conexion = self._conexion()
+        with conexion:
+            eliminadas = conexion.execute("""
+                DELETE FROM textos WHERE id NOT IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (
+                            PARTITION BY clave, texto ORDER BY consumido DESC, id) AS orden
+                        FROM textos
+                    ) WHERE orden = 1
+                )""").rowcount
+        conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if vacuum:
+            conexion.execute("VACUUM")
+        logging.info(f"Caché de generación compactada: {eliminadas} textos repetidos eliminados")
+        return eliminadas
+
+    def importar_json(self, ruta_json: str) -> int:
+        """
+        Importa una caché antigua en formato JSON {clave: [textos]}
+
+        Solo se importa si la caché está vacía; la comprobación y la inserción
+        van en la misma transacción, de modo que si varios workers arrancan a
+        la vez solo uno de ellos la importa. Los textos importados cuentan
+        como ya servidos (no entran en el pool).
+
+        Args:
+            ruta_json: Ruta del fichero JSON
+
+        Returns:
+            Número de textos importados
+        """
+        if not os.path.exists(ruta_json):
+            return 0
+        try:
+            with open(ruta_json, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except Exception as e:
+            logging.error(f"Error al leer caché JSON de generación: {e}")
+            return 0
+
+        ahora = time.time()
+        filas = [(clave, texto, ahora, 1) for clave, textos in cache.items() for texto in textos if texto]
+        conexion = self._conexion()
+        with conexion:
+            conexion.execute("BEGIN IMMEDIATE")
+            if conexion.execute("SELECT COUNT(*) FROM textos").fetchone()[0]:
+                return 0
+            conexion.executemany("INSERT INTO textos (clave, texto, creado, consumido) VALUES (?, ?, ?, ?)", filas)
+        importados = len(filas)
+        logging.info(f"Importados {importados} textos generados desde {ruta_json}")
+        return importados
+
+
+def abrir_cache(cache_file: str) -> CacheGeneracion:
+    """
+    Abre la caché de generación correspondiente a un fichero de caché
+
+    Si la base SQLite está vacía y existe el JSON antiguo, se importa.
+
+    Args:
+        cache_file: Ruta configurada de la caché (el .json antiguo o la base .sqlite3)
+
+    Returns:
+        Caché de generación abierta
+    """
+    cache = CacheGeneracion(ruta_sqlite(cache_file))
+    ruta_json = f"{os.path.splitext(cache_file)[0]}.json"
+    if len(cache) == 0 and os.path.exists(ruta_json):
+        logging.info(f"Migrando caché de generación JSON {ruta_json} a {cache.ruta}...")
+        cache.importar_json(ruta_json)
+    return cache
+
+
+def main():
+    """Función principal"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Inspeccionar o compactar la caché de textos generados")
+    parser.add_argument("ruta", type=str, help="Caché (.sqlite3, o el .json antiguo para migrarlo)")
+    parser.add_argument("--compactar", action="store_true",
+                        help="Eliminar repetidos y ejecutar VACUUM")
+
+    args = parser.parse_args()
+
+    cache = abrir_cache(args.ruta)
+    if args.compactar:
+        cache.compactar(vacuum=True)
+    print(f"{cache.ruta}: {len(cache)} textos en {cache.numero_claves()} claves")
+
+
+if __name__ == "__main__":
+    main()
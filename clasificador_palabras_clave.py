@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Clasificador de textos por palabras clave
+
+Clasificación barata y local usada por el generador cuando el CSV no tiene
+columna de categoría, y como preclasificador del clasificador con OpenAI para
+no llamar a la API con los textos que no dejan lugar a dudas.
+
+Todas las palabras clave se compilan en una única expresión regular con
+límites de palabra ("love" no coincide dentro de "glove"), de modo que cada
+texto se recorre una sola vez sea cual sea el número de categorías.
+
+Cada palabra clave pertenece a una sola categoría, para que un texto que la
+contiene pueda clasificarse sin ambigüedad. Las palabras de la plataforma
+("instagram", "social", "media") aparecen en casi cualquier texto del
+corpus: sirven para el respaldo del generador, pero no para ahorrarse la
+llamada a la API.
+"""
+
+import re
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Set
+
+# Categorías predefinidas para clasificar textos (por orden de prioridad). Una
+# palabra clave solo puede estar en una categoría: "love", "dream" y "sueño" se
+# quedan en la de mayor prioridad, que era la que ya ganaba.
+CATEGORIAS = {
+    "amor": ["love", "kiss", "heart", "amor", "beso", "corazón", "relationship", "pareja"],
+    "motivacional": ["success", "dream", "believe", "éxito", "sueño", "creer", "motivación", "motivation"],
+    "humor": ["joke", "funny", "laugh", "chiste", "gracioso", "reír", "humor"],
+    "vida": ["life", "live", "alive", "vida", "vivir", "existencia", "existence"],
+    "crítica_social": ["society", "social", "crítica", "criticism", "instagram", "media", "fake"],
+    "autoestima": ["self", "myself", "confidence", "autoestima", "confianza"],
+    "sueño": ["sleep", "bed", "dormir", "cama", "tired", "cansado"]
+}
+
+# Palabras de la plataforma: cuentan para clasificar(), pero no bastan para
+# clasificar un texto sin la API (clasificar_inequivoco y solo_inequivocos)
+PALABRAS_NO_CONCLUYENTES = {"instagram", "social", "media"}
+
+# Equivalencia con las categorías de clasificador_textos_ai.py. Las que no tienen
+# una equivalente clara (None) nunca se usan para evitar una llamada a la API.
+CATEGORIAS_AI = {
+    "amor": "amor_relaciones",
+    "motivacional": "motivacional_superacion",
+    "humor": "humor_entretenimiento",
+    "vida": None,
+    "crítica_social": "critica_social",
+    "autoestima": "autoestima_autoayuda",
+    "sueño": None
+}
+
+
+class ClasificadorPalabrasClave:
+    """Clasificador por palabras clave con una única expresión regular compilada"""
+
+    def __init__(self, categorias: Dict[str, List[str]] = CATEGORIAS,
+                 no_concluyentes: Set[str] = PALABRAS_NO_CONCLUYENTES):
+        """Inicializa el clasificador
+
+        Args:
+            categorias: Palabras clave de cada categoría; si un texto coincide con
+                varias, gana la que aparece antes
+            no_concluyentes: Palabras clave que no se tienen en cuenta al
+                clasificar solo los textos inequívocos
+        """
+        self.nombres = list(categorias)
+        self.no_concluyentes = {palabra.lower() for palabra in no_concluyentes}
+
+        # Cada palabra clave apunta a todas las categorías que la contienen
+        self.categorias_palabra: Dict[str, List[int]] = {}
+        for i, palabras_clave in enumerate(categorias.values()):
+            for palabra in palabras_clave:
+                codigos = self.categorias_palabra.setdefault(palabra.lower(), [])
+                if i not in codigos:
+                    codigos.append(i)
+
+        # Las palabras más largas primero para que la alternancia prefiera la coincidencia completa
+        palabras = sorted(self.categorias_palabra, key=len, reverse=True)
+        self.patron = re.compile(r"\b(?:" + "|".join(re.escape(p) for p in palabras) + r")\b", re.IGNORECASE)
+
+    def coincidencias(self, texto: str) -> List[str]:
+        """
+        Categorías cuyas palabras clave aparecen en el texto
+
+        Args:
+            texto: Texto a analizar
+
+        Returns:
+            Categorías coincidentes en orden de prioridad
+        """
+        codigos = self._codigos(self.patron.findall(str(texto)))
+        return [self.nombres[c] for c in sorted(codigos)]
+
+    def clasificar(self, texto: str) -> Optional[str]:
+        """
+        Clasifica un texto en la categoría coincidente de mayor prioridad
+
+        Args:
+            texto: Texto a clasificar
+
+        Returns:
+            Categoría asignada o None si no contiene ninguna palabra clave
+        """
+        coincidentes = self.coincidencias(texto)
+        return coincidentes[0] if coincidentes else None
+
+    def clasificar_inequivoco(self, texto: str) -> Optional[str]:
+        """
+        Clasifica un texto solo si sus palabras clave apuntan a una única categoría
+
+        Args:
+            texto: Texto a clasificar
+
+        Returns:
+            Categoría asignada o None si no hay coincidencias o son de varias categorías
+        """
+        codigos = self._codigos(self.patron.findall(str(texto)), solo_concluyentes=True)
+        return self.nombres[codigos.pop()] if len(codigos) == 1 else None
+
+    def clasificar_corpus(self, textos: Sequence[str], solo_inequivocos: bool = False) -> np.ndarray:
+        """
+        Clasifica todos los textos de una pasada
+
+        Args:
+            textos: Textos a clasificar
+            solo_inequivocos: Si True, los textos que coinciden con varias categorías
+                quedan sin clasificar
+
+        Returns:
+            Array con el índice (en self.nombres) de la categoría de cada texto, -1 si no tiene
+        """
+        encontradas = pd.Series(textos, dtype=object).astype(str).str.findall(self.patron)
+        asignadas = np.full(len(encontradas), -1)
+        for i, palabras in enumerate(encontradas):
+            if palabras:
+                codigos = self._codigos(palabras, solo_concluyentes=solo_inequivocos)
+                if codigos and (not solo_inequivocos or len(codigos) == 1):
+                    asignadas[i] = min(codigos)
+        return asignadas
+
+    def _codigos(self, palabras: List[str], solo_concluyentes: bool = False) -> set:
+        """Conjunto de categorías (índices) a las que pertenecen las palabras encontradas"""
+        codigos = set()
+        for palabra in palabras:
+            palabra = palabra.lower()
+            if not (solo_concluyentes and palabra in self.no_concluyentes):
+                codigos.update(self.categorias_palabra[palabra])
+        return codigos
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Clasificar textos por palabras clave")
+    parser.add_argument("textos", type=str, nargs="+", help="Textos a clasificar")
+    parser.add_argument("--inequivoco", action="store_true",
+                        help="Clasificar solo los textos que coinciden con una única categoría")
+
+    args = parser.parse_args()
+
+    clasificador = ClasificadorPalabrasClave()
+    for texto in args.textos:
+        if args.inequivoco:
+            categoria = clasificador.clasificar_inequivoco(texto)
+        else:
+            categoria = clasificador.clasificar(texto)
+        print(f"{categoria or 'sin categoría'}\t{texto}")
+
+
+if __name__ == "__main__":
+    main()
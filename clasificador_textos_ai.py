@@ -8,15 +8,25 @@ Este script analiza cada texto del CSV y le asigna una categoría usando GPT
 
 import os
 import sys
+import numpy as np
 import pandas as pd
 import time
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from tqdm import tqdm
 import json
 import logging
 from typing import List, Dict, Any, Optional, Union
 
+from almacen_embeddings import hash_texto
+from clasificador_palabras_clave import CATEGORIAS_AI, ClasificadorPalabrasClave
+from corpus import convertir_csv, filtrar_textos_validos, leer_csv, ruta_parquet
+from diario_resultados import DiarioResultados, ruta_diario
+from limitador_tasa import es_error_limite, estimar_tokens, limitador_para, retry_after
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -36,6 +46,21 @@ if not API_KEY:
 CSV_PATH = "texto_extraido.csv"
 OUTPUT_CSV = "texto_extraido_categorizado.csv"
 CACHE_FILE = "categorias_cache.json"
+CONCURRENCIA_CLASIFICACION = int(os.environ.get("CONCURRENCIA_CLASIFICACION", 8))  # Llamadas simultáneas en procesar_lote
+MAX_TOKENS_CLASIFICACION = 20  # Tokens máximos de la respuesta (solo el nombre de la categoría)
+TEXTOS_POR_PROMPT = 1  # Textos clasificados en cada llamada (1 = un texto por llamada)
+MAX_TOKENS_POR_TEXTO_GRUPO = 15  # Tokens de respuesta por texto en los prompts de varios textos
+ESTADO_BATCH_FILE = "clasificacion_batch.json"  # Trabajo de la Batch API en curso (para reanudar el sondeo)
+BATCH_JSONL = "clasificacion_batch.jsonl"  # Fichero de peticiones del trabajo por lotes
+MAX_PETICIONES_BATCH = 50000  # Límite de peticiones por trabajo de la Batch API
+INTERVALO_SONDEO_BATCH = 30  # Segundos entre consultas del estado del trabajo
+DESCUENTO_BATCH = 0.5  # La Batch API cuesta la mitad que las llamadas interactivas
+UMBRAL_CONFIANZA_LOCAL = 0.6  # Probabilidad mínima para aceptar la categoría del clasificador local
+FRACCION_VALIDACION = 0.2  # Fracción de textos etiquetados reservada para medir la precisión
+EPOCAS_LOCAL = 300  # Iteraciones del entrenamiento del clasificador local
+ORIGENES_API = ("api", "batch")  # Anotaciones del diario que también forman parte del caché de categorías
+COSTO_POR_1K_ENTRADA = 0.0005  # $ por 1K tokens de entrada (GPT-3.5-turbo)
+COSTO_POR_1K_SALIDA = 0.0015  # $ por 1K tokens de salida (GPT-3.5-turbo)
 
 # Categorías predefinidas (puedes modificar esta lista)
 CATEGORIAS = [
@@ -52,47 +77,183 @@ CATEGORIAS = [
     "otro"
 ]
 
+class ClasificadorLocal:
+    """Regresión logística multinomial (softmax) sobre embeddings de los textos
+
+    Se entrena con los textos que ya tienen categoría asignada por GPT y
+    clasifica el resto en local; la probabilidad de la clase ganadora sirve
+    de confianza para decidir qué textos se envían igualmente a la API.
+    """
+
+    def __init__(self, categorias: List[str] = CATEGORIAS, l2: float = 1e-3):
+        """Inicializa el clasificador (sin entrenar)
+
+        Args:
+            categorias: Categorías posibles
+            l2: Regularización L2 de los pesos
+        """
+        self.categorias = list(categorias)
+        self.l2 = l2
+        self.pesos = None
+        self.sesgo = None
+        self.media = None
+        self.escala = None
+
+    def _estandarizar(self, X: np.ndarray) -> np.ndarray:
+        return (X - self.media) / self.escala
+
+    def entrenar(self, X: np.ndarray, etiquetas: List[str], epocas: int = EPOCAS_LOCAL, tasa: float = 0.05):
+        """
+        Entrena el clasificador con descenso de gradiente (Adam) sobre el lote completo
+
+        Args:
+            X: Embeddings (n x dimension)
+            etiquetas: Categoría de cada texto
+            epocas: Iteraciones de entrenamiento
+            tasa: Tasa de aprendizaje
+        """
+        codigos = np.array([self.categorias.index(e) for e in etiquetas])
+        self.media = X.mean(axis=0)
+        self.escala = X.std(axis=0) + 1e-6
+        X = self._estandarizar(X)
+        n, dimension = X.shape
+        Y = np.eye(len(self.categorias), dtype=np.float32)[codigos]
+
+        self.pesos = np.zeros((dimension, len(self.categorias)), dtype=np.float32)
+        self.sesgo = np.zeros(len(self.categorias), dtype=np.float32)
+        parametros = [self.pesos, self.sesgo]
+        momentos = [np.zeros_like(p) for p in parametros]
+        varianzas = [np.zeros_like(p) for p in parametros]
+        beta1, beta2 = 0.9, 0.999
+        for t in range(1, epocas + 1):
+            error = (self._softmax(X @ self.pesos + self.sesgo) - Y) / n
+            gradientes = [X.T @ error + self.l2 * self.pesos, error.sum(axis=0)]
+            for p, g, m, v in zip(parametros, gradientes, momentos, varianzas):
+                m *= beta1
+                m += (1 - beta1) * g
+                v *= beta2
+                v += (1 - beta2) * g * g
+                p -= tasa * (m / (1 - beta1 ** t)) / (np.sqrt(v / (1 - beta2 ** t)) + 1e-8)
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exponenciales = np.exp(logits)
+        return exponenciales / exponenciales.sum(axis=1, keepdims=True)
+
+    def predecir(self, X: np.ndarray):
+        """
+        Clasifica varios textos
+
+        Args:
+            X: Embeddings (n x dimension)
+
+        Returns:
+            Tupla (categorías, confianza) con la categoría más probable de cada
+            texto y su probabilidad
+        """
+        probabilidades = self._softmax(self._estandarizar(X) @ self.pesos + self.sesgo)
+        codigos = probabilidades.argmax(axis=1)
+        return [self.categorias[c] for c in codigos], probabilidades.max(axis=1)
+
+
+def particion_validacion(etiquetados: pd.DataFrame, fraccion: float = FRACCION_VALIDACION,
+                         semilla: int = 0) -> np.ndarray:
+    """
+    Reparte los textos etiquetados entre entrenamiento y validación
+    
+    Los casi-duplicados (mismo cluster_id) van al mismo lado para no inflar la
+    precisión; cada texto sin cluster forma su propio grupo.
+    
+    Args:
+        etiquetados: Textos etiquetados (con columna cluster_id opcional)
+        fraccion: Fracción de grupos reservada para la validación
+        semilla: Semilla de la partición
+        
+    Returns:
+        Máscara booleana de las filas de validación
+    """
+    grupos = np.arange(len(etiquetados), dtype=np.int64)
+    if "cluster_id" in etiquetados.columns:
+        clusters = etiquetados["cluster_id"].to_numpy(dtype=float)
+        con_cluster = ~np.isnan(clusters)
+        # Los textos sin cluster usan identificadores negativos propios (-1, -2, ...)
+        grupos = np.where(con_cluster, np.nan_to_num(clusters), -(grupos + 1)).astype(np.int64)
+    unicos = np.unique(grupos)
+    rng = np.random.default_rng(semilla)
+    return np.isin(grupos, rng.choice(unicos, int(len(unicos) * fraccion), replace=False))
+
+
 class ClasificadorTextos:
     """Clase para clasificar textos de Instagram usando la API de OpenAI"""
     
-    def __init__(self, api_key: str, csv_path: str, output_csv: str, cache_file: str):
-        """Inicializa el clasificador de textos"""
+    def __init__(self, api_key: str, csv_path: str, output_csv: str, cache_file: str,
+                 base_url: Optional[str] = None):
+        """Inicializa el clasificador de textos
+        
+        Args:
+            api_key: Clave de la API de OpenAI
+            csv_path: CSV con los textos extraídos
+            output_csv: CSV de salida con la columna categoria
+            cache_file: Caché JSON texto -> categoría
+            base_url: URL base de una API compatible con OpenAI (por defecto, la de OpenAI;
+                ver servidor_openai_falso.py)
+        """
         self.api_key = api_key
         self.csv_path = csv_path
         self.output_csv = output_csv
         self.cache_file = cache_file
-        self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.diario = DiarioResultados(ruta_diario(output_csv))  # Categorías aún no materializadas en el CSV
         self.cache = self._cargar_cache()
         self.df = None
         self.textos_procesados = 0
+        self.textos_preclasificados = 0
         self.costo_estimado = 0.0
+        self.tokens_entrada = 0  # Tokens enviados a la API
+        self.tokens_salida = 0  # Tokens recibidos de la API
+        self.textos_api = 0  # Textos clasificados con la API (sin contar caché ni palabras clave)
+        self.textos_reintentados = 0  # Textos de un grupo que se han tenido que clasificar uno a uno
+        self.textos_locales = 0  # Textos clasificados con el clasificador local de embeddings
+        self.clasificador_local: Optional[ClasificadorLocal] = None
+        self._buscador = None  # Buscador de similares (modelo y almacén de embeddings), bajo demanda
+        self._lock = threading.Lock()  # Protege caché y contadores cuando se clasifica en paralelo
+        self._lock_guardado = threading.Lock()  # Un solo hilo escribe el caché en disco a la vez
         
     def _cargar_cache(self) -> Dict:
-        """Carga el caché de categorías asignadas previamente"""
+        """Carga el caché de categorías asignadas previamente, con las anotaciones de la API del diario"""
+        cache = {}
         if os.path.exists(self.cache_file):
             try:
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    cache = json.load(f)
             except Exception as e:
                 logging.error(f"Error al cargar caché: {e}")
-                return {}
-        return {}
+        for anotacion in self.diario.leer().values():
+            if anotacion["origen"] in ORIGENES_API:
+                cache[anotacion["texto"]] = anotacion["categoria"]
+        return cache
     
     def _guardar_cache(self):
         """Guarda el caché de categorías asignadas"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Error al guardar caché: {e}")
+        with self._lock_guardado:
+            with self._lock:
+                cache = dict(self.cache)
+            try:
+                # Escribir en un temporal y renombrar: una interrupción no deja el caché a medias
+                ruta_temporal = f"{self.cache_file}.tmp"
+                with open(ruta_temporal, 'w', encoding='utf-8') as f:
+                    json.dump(cache, f, ensure_ascii=False, indent=2)
+                os.replace(ruta_temporal, self.cache_file)
+            except Exception as e:
+                logging.error(f"Error al guardar caché: {e}")
     
-    def cargar_datos(self, limit: Optional[int] = None, chunk_size: int = 10000):
+    def cargar_datos(self, limit: Optional[int] = None):
         """
-        Carga los datos del CSV de manera eficiente usando chunks
+        Carga los datos del CSV y descarta los textos inválidos
         
         Args:
             limit: Límite opcional de filas a cargar
-            chunk_size: Tamaño de cada chunk para procesar el CSV
         """
         logging.info(f"Cargando datos desde {self.csv_path}...")
         
@@ -108,172 +269,725 @@ class ClasificadorTextos:
                 
                 # Actualizar contador de textos procesados para el cálculo de costos
                 self.textos_procesados = len(textos_procesados)
+                if "origen_categoria" not in self.df.columns:
+                    # CSV anterior a la columna: solo las categorías del caché vienen seguro de la API
+                    self.df["origen_categoria"] = np.where(
+                        self.df["categoria"].notna() & self.df["texto"].isin(list(self.cache)), "api", None)
+                # Columnas de objetos aunque estén vacías, para poder asignarles textos
+                self.df["categoria"] = self.df["categoria"].astype(object)
+                self.df["origen_categoria"] = self.df["origen_categoria"].astype(object)
+                self._aplicar_diario()
                 return
             except Exception as e:
                 logging.warning(f"Error al cargar CSV previo: {e}. Procesando desde cero.")
         
-        # Procesar el CSV en chunks para manejar archivos grandes
-        chunks = []
-        total_rows = 0
+        # Leer el CSV original y filtrar los textos válidos con el criterio común del corpus
+        df = filtrar_textos_validos(leer_csv(self.csv_path))
         
-        for chunk in tqdm(pd.read_csv(
-            self.csv_path, 
-            names=["ruta", "carpeta", "texto"],
-            header=None,
-            chunksize=chunk_size
-        ), desc="Procesando chunks"):
+        if len(df):
+            self.df = (df.head(limit) if limit else df).copy()
             
-            # Filtrar textos válidos
-            chunk = chunk[~chunk["texto"].isna()]
-            chunk = chunk[~chunk["texto"].str.contains("SIN_TEXTO|ERROR:|Lo siento", na=False)]
-            
-            chunks.append(chunk)
-            total_rows += len(chunk)
-            
-            # Si hay un límite y ya lo alcanzamos, salimos
-            if limit and total_rows >= limit:
-                break
-        
-        # Concatenar todos los chunks
-        if chunks:
-            self.df = pd.concat(chunks)
-            if limit:
-                self.df = self.df.head(limit)
-            
-            # Añadir columna para categorías
+            # Añadir columnas para las categorías y su procedencia (ver ORIGENES_API)
             self.df["categoria"] = None
+            self.df["origen_categoria"] = None
             
             logging.info(f"Datos cargados: {len(self.df)} textos válidos")
+            self._aplicar_diario()
         else:
             logging.error("No se encontraron textos válidos en el CSV")
-            self.df = pd.DataFrame(columns=["ruta", "carpeta", "texto", "categoria"])
+            self.df = pd.DataFrame(columns=["ruta", "carpeta", "texto", "categoria", "origen_categoria"])
     
-    def clasificar_texto(self, texto: str, modelo: str = "gpt-3.5-turbo") -> str:
+    def _aplicar_diario(self) -> int:
         """
-        Clasifica un texto usando la API de OpenAI
+        Recupera las categorías anotadas en el diario que aún no están en el CSV cargado
+        
+        Tras una interrupción, las categorías escritas en el diario después
+        de la última materialización no se pierden.
         
-        Args:
-            texto: Texto a clasificar
-            modelo: Modelo de OpenAI a usar
-            
         Returns:
-            Categoría asignada
+            Número de filas recuperadas
         """
-        # Verificar si ya está en caché
-        if texto in self.cache:
-            return self.cache[texto]
+        anotaciones = {a["texto"]: a for a in self.diario.leer().values()}
+        if not anotaciones:
+            return 0
+        pendientes = self.df[self.df["categoria"].isna()]
+        recuperadas = pendientes["texto"].map(anotaciones).dropna()
+        self._asignar(recuperadas.index, [a["categoria"] for a in recuperadas], [a["origen"] for a in recuperadas])
+        logging.info(f"Recuperadas del diario {len(recuperadas)} categorías sin materializar ({self.diario.ruta})")
+        return len(recuperadas)
+    
+    def _asignar(self, indices, categorias, origen):
+        """
+        Escribe en el DataFrame las categorías de unas filas y quién las asignó
         
-        # Construir prompt
-        categorias_str = ", ".join(CATEGORIAS)
-        prompt = f"""Clasifica el siguiente texto de Instagram en una de estas categorías: {categorias_str}.
+        Args:
+            indices: Índices de las filas
+            categorias: Categoría de cada fila (o una para todas)
+            origen: Origen de cada categoría (o uno para todas): "api", "batch",
+                "palabras_clave", "local" o "por_defecto"
+        """
+        self.df.loc[indices, "categoria"] = categorias
+        self.df.loc[indices, "origen_categoria"] = origen
+    
+    def _llamar_api(self, prompt: str, modelo: str, max_tokens: int) -> Optional[str]:
+        """
+        Llama a la API con reintentos y acumula tokens y costo
         
-Texto: "{texto}"
-
-Responde ÚNICAMENTE con el nombre de la categoría que mejor se ajuste al texto, sin explicaciones ni puntuación adicional."""
+        Es seguro llamarlo desde varios hilos: el ritmo de llamadas lo marca
+        el limitador de tasa compartido del modelo.
         
-        # Intentar clasificar el texto
+        Args:
+            prompt: Prompt de clasificación
+            modelo: Modelo de OpenAI a usar
+            max_tokens: Tokens máximos de la respuesta
+            
+        Returns:
+            Contenido de la respuesta o None si fallan todos los intentos
+        """
+        limitador = limitador_para(modelo)
         max_retries = 3
         for intento in range(max_retries):
             try:
+                limitador.adquirir(estimar_tokens(prompt) + max_tokens)
                 response = self.client.chat.completions.create(
                     model=modelo,
                     messages=[{"role": "user", "content": prompt}],
-                    max_tokens=20,
+                    max_tokens=max_tokens,
                     temperature=0.2
                 )
+                limitador.registrar_exito()
                 
-                # Calcular costo aproximado (para GPT-3.5-turbo)
-                tokens_entrada = len(prompt) / 4  # Aproximación
-                tokens_salida = 10  # Aproximación
-                costo_por_1k_entrada = 0.0005  # $0.0005 por 1K tokens de entrada
-                costo_por_1k_salida = 0.0015   # $0.0015 por 1K tokens de salida
-                costo = (tokens_entrada / 1000 * costo_por_1k_entrada) + (tokens_salida / 1000 * costo_por_1k_salida)
-                self.costo_estimado += costo
-                
-                categoria = response.choices[0].message.content.strip().lower()
-                
-                # Normalizar la categoría
-                categoria_normalizada = None
-                for cat in CATEGORIAS:
-                    if cat.lower() in categoria:
-                        categoria_normalizada = cat
-                        break
-                
-                if not categoria_normalizada:
-                    categoria_normalizada = "otro"
-                
-                # Guardar en caché
-                self.cache[texto] = categoria_normalizada
+                # Calcular costo con los tokens reales (aproximados si la respuesta no los indica)
+                usage = getattr(response, "usage", None)
+                tokens_entrada = getattr(usage, "prompt_tokens", None) or estimar_tokens(prompt)
+                tokens_salida = getattr(usage, "completion_tokens", None) or 10
+                costo = (tokens_entrada / 1000 * COSTO_POR_1K_ENTRADA) + (tokens_salida / 1000 * COSTO_POR_1K_SALIDA)
+                with self._lock:
+                    self.costo_estimado += costo
+                    self.tokens_entrada += tokens_entrada
+                    self.tokens_salida += tokens_salida
                 
-                # Guardar caché periódicamente
-                self.textos_procesados += 1
-                if self.textos_procesados % 10 == 0:
-                    self._guardar_cache()
-                
-                return categoria_normalizada
+                return response.choices[0].message.content
                 
             except Exception as e:
                 logging.error(f"Error en intento {intento+1}/{max_retries}: {e}")
-                if intento < max_retries - 1:
+                if es_error_limite(e):
+                    # El limitador pausa a todos los hilos y reduce la tasa; el
+                    # siguiente intento espera en adquirir()
+                    limitador.registrar_limite(retry_after(e))
+                elif intento < max_retries - 1:
                     time.sleep(5)  # Esperar antes de reintentar
         
-        return "otro"  # Categoría por defecto si falla
+        return None
+    
+    def _registrar(self, categorias: Dict[str, str], origen: str = "api"):
+        """Guarda en el caché categorías obtenidas de la API y las anota en el diario"""
+        with self._lock:
+            self.cache.update(categorias)
+            self.textos_api += len(categorias)
+            self.textos_procesados += len(categorias)
+        # Se escriben en disco en el siguiente punto de guardado (diario.sincronizar)
+        self.diario.agregar(categorias, origen)
+    
+    @staticmethod
+    def _prompt_texto(texto: str) -> str:
+        """Prompt de clasificación de un solo texto"""
+        categorias_str = ", ".join(CATEGORIAS)
+        return f"""Clasifica el siguiente texto de Instagram en una de estas categorías: {categorias_str}.
+        
+Texto: "{texto}"
+
+Responde ÚNICAMENTE con el nombre de la categoría que mejor se ajuste al texto, sin explicaciones ni puntuación adicional."""
+    
+    @staticmethod
+    def _normalizar_categoria(respuesta: str) -> str:
+        """Categoría de CATEGORIAS contenida en la respuesta a un prompt de un texto ("otro" si ninguna)"""
+        categoria = respuesta.strip().lower()
+        for cat in CATEGORIAS:
+            if cat.lower() in categoria:
+                return cat
+        return "otro"
+    
+    def clasificar_texto(self, texto: str, modelo: str = "gpt-3.5-turbo") -> str:
+        """
+        Clasifica un texto usando la API de OpenAI
+        
+        Args:
+            texto: Texto a clasificar
+            modelo: Modelo de OpenAI a usar
+            
+        Returns:
+            Categoría asignada
+        """
+        # Verificar si ya está en caché
+        if texto in self.cache:
+            return self.cache[texto]
+        
+        respuesta = self._llamar_api(self._prompt_texto(texto), modelo, MAX_TOKENS_CLASIFICACION)
+        if respuesta is None:
+            return "otro"  # Categoría por defecto si falla
+        categoria_normalizada = self._normalizar_categoria(respuesta)
+        
+        # Guardar en caché
+        self._registrar({texto: categoria_normalizada})
+        return categoria_normalizada
+    
+    @staticmethod
+    def _prompt_grupo(textos: List[str]) -> str:
+        """Prompt de clasificación de varios textos con identificadores numerados"""
+        categorias_str = ", ".join(CATEGORIAS)
+        textos_json = json.dumps({str(i): texto for i, texto in enumerate(textos, 1)}, ensure_ascii=False, indent=0)
+        return f"""Clasifica cada uno de los siguientes textos de Instagram en una de estas categorías: {categorias_str}.
+
+Textos (objeto JSON de identificador a texto):
+{textos_json}
+
+Responde ÚNICAMENTE con un objeto JSON que asigne a cada identificador el nombre de su categoría, por ejemplo {{"1": "{CATEGORIAS[0]}", "2": "{CATEGORIAS[-1]}"}}, sin explicaciones."""
+    
+    @staticmethod
+    def _interpretar_grupo(respuesta: Optional[str], n: int) -> List[Optional[str]]:
+        """
+        Extrae las categorías de la respuesta JSON de un prompt de varios textos
+        
+        Args:
+            respuesta: Contenido de la respuesta de la API
+            n: Número de textos del prompt
+            
+        Returns:
+            Categoría de cada texto, None si falta o no es una de CATEGORIAS
+        """
+        if not respuesta:
+            return [None] * n
+        # Tolerar texto o bloques de código alrededor del objeto JSON
+        inicio, fin = respuesta.find("{"), respuesta.rfind("}")
+        try:
+            resultado = json.loads(respuesta[inicio:fin + 1])
+        except ValueError:
+            return [None] * n
+        if not isinstance(resultado, dict):
+            return [None] * n
+        
+        categorias = []
+        for i in range(1, n + 1):
+            categoria = str(resultado.get(str(i), "")).strip().lower()
+            categorias.append(categoria if categoria in CATEGORIAS else None)
+        return categorias
+    
+    def clasificar_grupo(self, textos: List[str], modelo: str = "gpt-3.5-turbo") -> List[str]:
+        """
+        Clasifica varios textos con una sola llamada a la API
+        
+        La lista de categorías y las instrucciones se envían una vez para todo
+        el grupo. Los textos cuya categoría falta en la respuesta o no es
+        válida se clasifican después uno a uno con clasificar_texto.
+        
+        Args:
+            textos: Textos a clasificar
+            modelo: Modelo de OpenAI a usar
+            
+        Returns:
+            Categoría asignada a cada texto, en el mismo orden
+        """
+        # Solo van al prompt los textos distintos que no están en caché
+        nuevos = list(dict.fromkeys(t for t in textos if t not in self.cache))
+        if nuevos:
+            respuesta = self._llamar_api(self._prompt_grupo(nuevos), modelo,
+                                         MAX_TOKENS_POR_TEXTO_GRUPO * len(nuevos) + MAX_TOKENS_CLASIFICACION)
+            categorias = self._interpretar_grupo(respuesta, len(nuevos))
+            validas = {texto: categoria for texto, categoria in zip(nuevos, categorias) if categoria}
+            self._registrar(validas)
+            
+            fallidos = len(nuevos) - len(validas)
+            if fallidos:
+                logging.warning(f"{fallidos} de {len(nuevos)} textos sin categoría válida en la respuesta; "
+                                f"se clasifican uno a uno")
+                with self._lock:
+                    self.textos_reintentados += fallidos
+        
+        # Los que no se han podido interpretar los resuelve clasificar_texto con su propia llamada
+        return [self.clasificar_texto(texto, modelo) for texto in textos]
+    
+    def tokens_por_texto(self) -> float:
+        """Tokens (entrada + salida) consumidos por cada texto clasificado con la API"""
+        with self._lock:
+            return (self.tokens_entrada + self.tokens_salida) / self.textos_api if self.textos_api else 0.0
+    
+    def preclasificar(self) -> int:
+        """
+        Clasifica por palabras clave, sin llamar a la API, los textos pendientes inequívocos
+        
+        Solo se asignan los textos cuyas palabras clave apuntan a una única
+        categoría con equivalente en CATEGORIAS; el resto sigue pendiente.
+        
+        Returns:
+            Número de textos preclasificados
+        """
+        pendientes = self.df[self.df["categoria"].isna()]
+        if len(pendientes) == 0:
+            return 0
+        
+        clasificador = ClasificadorPalabrasClave()
+        codigos = clasificador.clasificar_corpus(pendientes["texto"], solo_inequivocos=True)
+        categorias = pd.Series([CATEGORIAS_AI[clasificador.nombres[c]] if c >= 0 else None for c in codigos],
+                               index=pendientes.index, dtype=object).dropna()
+        
+        self._asignar(categorias.index, categorias, "palabras_clave")
+        self.diario.agregar(dict(zip(pendientes.loc[categorias.index, "texto"], categorias)), "palabras_clave")
+        self.textos_preclasificados += len(categorias)
+        logging.info(f"Preclasificados por palabras clave: {len(categorias)} de {len(pendientes)} textos pendientes")
+        return len(categorias)
+    
+    def _embeddings(self, textos: List[str]) -> np.ndarray:
+        """
+        Embeddings de varios textos con el modelo y el almacén del buscador de similares
+        
+        Los textos del corpus que aún no están en el almacén se calculan y se
+        guardan en él, así que las siguientes ejecuciones no los recalculan.
+        
+        Args:
+            textos: Textos a codificar
+            
+        Returns:
+            Matriz float32 (len(textos) x dimension)
+        """
+        if self._buscador is None:
+            from buscador_similares import BuscadorTextosSimilares
+            
+            csv_corpus = self.output_csv if os.path.exists(self.output_csv) else self.csv_path
+            self._buscador = BuscadorTextosSimilares(csv_path=csv_corpus)
+            self._buscador.cargar_datos(precalcular_embeddings=False)
+            self._buscador.precalcular_embeddings()
+        return self._buscador.obtener_embeddings(textos)
+    
+    def entrenar_clasificador_local(self, fraccion_validacion: float = FRACCION_VALIDACION,
+                                    umbral: float = UMBRAL_CONFIANZA_LOCAL, semilla: int = 0) -> Dict[str, Any]:
+        """
+        Entrena el clasificador local con los textos categorizados por GPT y mide su precisión
+        
+        Solo se usan las categorías asignadas por la API (origen_categoria en
+        ORIGENES_API): las de palabras clave o del propio clasificador local
+        no sirven ni para entrenar ni para medir. Se reserva una parte de los
+        textos (ver particion_validacion) para comparar las predicciones con
+        las categorías de GPT; después se reentrena con todos ellos.
+        
+        Args:
+            fraccion_validacion: Fracción de textos etiquetados reservada para la evaluación
+            umbral: Confianza mínima con la que se mide la cobertura
+            semilla: Semilla de la partición
+            
+        Returns:
+            Informe con la precisión global, la cobertura y la precisión por
+            encima del umbral, y la precisión por categoría
+        """
+        etiquetados = self.df[self.df["categoria"].isin(CATEGORIAS)
+                              & self.df["origen_categoria"].isin(ORIGENES_API)].drop_duplicates(subset="texto")
+        if etiquetados["categoria"].nunique() < 2:
+            raise ValueError("Se necesitan textos categorizados por la API de al menos dos categorías para entrenar")
+        
+        textos = etiquetados["texto"].astype(str).tolist()
+        etiquetas = etiquetados["categoria"].tolist()
+        X = self._embeddings(textos)
+        
+        validacion = particion_validacion(etiquetados, fraccion_validacion, semilla)
+        
+        informe: Dict[str, Any] = {"entrenamiento": int((~validacion).sum()), "validacion": int(validacion.sum())}
+        if validacion.any():
+            modelo = ClasificadorLocal()
+            modelo.entrenar(X[~validacion], [e for e, v in zip(etiquetas, validacion) if not v])
+            predichas, confianza = modelo.predecir(X[validacion])
+            reales = np.array([e for e, v in zip(etiquetas, validacion) if v])
+            aciertos = np.array(predichas) == reales
+            seguras = confianza >= umbral
+            informe.update({
+                "precision": float(aciertos.mean()),
+                "umbral": umbral,
+                "cobertura_umbral": float(seguras.mean()),
+                "precision_umbral": float(aciertos[seguras].mean()) if seguras.any() else None,
+                "precision_por_categoria": {c: float(aciertos[reales == c].mean()) for c in np.unique(reales)}
+            })
+            logging.info(f"Clasificador local: precisión {informe['precision']:.1%} sobre "
+                         f"{informe['validacion']} textos reservados; con confianza >= {umbral} cubre "
+                         f"{informe['cobertura_umbral']:.1%} con precisión "
+                         f"{informe['precision_umbral'] or 0:.1%}")
+        
+        self.clasificador_local = ClasificadorLocal()
+        self.clasificador_local.entrenar(X, etiquetas)
+        return informe
+    
+    def clasificar_local(self, umbral: float = UMBRAL_CONFIANZA_LOCAL) -> int:
+        """
+        Clasifica en local los textos pendientes en los que el clasificador confía
+        
+        Los textos con confianza por debajo del umbral siguen pendientes para la
+        API. Entrena el clasificador si aún no lo está; si no hay textos
+        categorizados suficientes para entrenarlo, no clasifica ninguno.
+        
+        Args:
+            umbral: Probabilidad mínima de la categoría para aceptarla
+            
+        Returns:
+            Número de textos clasificados en local
+        """
+        pendientes = self.df[self.df["categoria"].isna()]
+        if len(pendientes) == 0:
+            return 0
+        if self.clasificador_local is None:
+            try:
+                self.entrenar_clasificador_local(umbral=umbral)
+            except ValueError as e:
+                logging.warning(f"No se puede usar el clasificador local ({e}); "
+                                f"los {len(pendientes)} textos pendientes se envían a la API")
+                return 0
+        
+        categorias, confianza = self.clasificador_local.predecir(self._embeddings(pendientes["texto"].astype(str).tolist()))
+        seguras = confianza >= umbral
+        asignadas = np.array(categorias, dtype=object)[seguras]
+        self._asignar(pendientes.index[seguras], asignadas, "local")
+        self.diario.agregar(dict(zip(pendientes["texto"][seguras], asignadas)), "local")
+        self.textos_locales += int(seguras.sum())
+        logging.info(f"Clasificados en local: {int(seguras.sum())} de {len(pendientes)} textos pendientes "
+                     f"(confianza >= {umbral}); {int((~seguras).sum())} se envían a la API")
+        return int(seguras.sum())
     
     def procesar_lote(self, 
-                     batch_size: int = 50,
+                     concurrencia: int = CONCURRENCIA_CLASIFICACION,
                      modelo: str = "gpt-3.5-turbo",
-                     guardar_cada: int = 50):
+                     guardar_cada: int = 50,
+                     preclasificar: bool = False,
+                     textos_por_prompt: int = TEXTOS_POR_PROMPT,
+                     local: bool = False,
+                     umbral_local: float = UMBRAL_CONFIANZA_LOCAL):
         """
-        Procesa un lote de textos para clasificarlos
+        Clasifica en paralelo los textos pendientes
+        
+        Las llamadas se reparten entre un pool de hilos acotado; el ritmo lo
+        marca el limitador de tasa compartido del modelo (peticiones y tokens
+        por minuto, con pausa y reducción de la tasa ante un 429) en lugar de
+        pausas fijas. Los resultados se escriben en el DataFrame en el orden
+        de las filas, de modo que cada punto de guardado cubre un prefijo
+        contiguo de los pendientes. Al reanudar, los textos ya presentes en
+        el caché de categorías no vuelven a la API.
+        
+        Con textos_por_prompt > 1 cada llamada clasifica un grupo de textos
+        (ver clasificar_grupo), de modo que las instrucciones y la lista de
+        categorías se pagan una vez por grupo y no una vez por texto.
         
         Args:
-            batch_size: Tamaño del lote a procesar cada vez
+            concurrencia: Máximo de llamadas simultáneas a la API
             modelo: Modelo de OpenAI a usar
             guardar_cada: Cada cuántos textos guardar el progreso
+            preclasificar: Si True, clasifica antes por palabras clave los textos
+                inequívocos y solo envía el resto a la API
+            textos_por_prompt: Textos clasificados en cada llamada a la API
+            local: Si True, clasifica antes con el clasificador local de embeddings
+                y solo envía a la API los textos con confianza menor que umbral_local
+            umbral_local: Confianza mínima para aceptar la categoría local
         """
         if self.df is None or len(self.df) == 0:
             logging.error("No hay datos cargados para procesar")
             return
         
+        if preclasificar:
+            self.preclasificar()
+        if local:
+            self.clasificar_local(umbral_local)
+        
         # Verificar si hay textos sin categoría
         textos_pendientes = self.df[self.df["categoria"].isna()]
         if len(textos_pendientes) == 0:
             logging.info("Todos los textos ya están categorizados")
+            if preclasificar or local:
+                # Guardar lo clasificado sin la API
+                self.materializar()
             return
         
-        logging.info(f"Procesando {len(textos_pendientes)} textos pendientes...")
+        logging.info(f"Procesando {len(textos_pendientes)} textos pendientes con {concurrencia} llamadas simultáneas...")
+        
+        def clasificar(textos: List[str]) -> List[str]:
+            if textos_por_prompt > 1:
+                return self.clasificar_grupo(textos, modelo)
+            return [self.clasificar_texto(textos[0], modelo)]
+        
+        inicio = time.perf_counter()
+        costo_inicial = self.costo_estimado
+        indices = textos_pendientes.index
+        textos = textos_pendientes["texto"].tolist()
+        tamano = max(1, textos_por_prompt)
+        # Ventana acotada de tareas en vuelo: no se encolan todos los textos a la vez
+        en_vuelo = deque()
+        procesados = 0
+        with ThreadPoolExecutor(max_workers=max(1, concurrencia)) as executor, \
+                tqdm(total=len(textos_pendientes), desc="Clasificando textos") as barra:
+            for i in range(0, len(textos), tamano):
+                en_vuelo.append((indices[i:i + tamano], executor.submit(clasificar, textos[i:i + tamano])))
+                if len(en_vuelo) < 2 * concurrencia:
+                    continue
+                procesados = self._volcar_resultado(en_vuelo, procesados, barra, inicio, costo_inicial, guardar_cada)
+            while en_vuelo:
+                procesados = self._volcar_resultado(en_vuelo, procesados, barra, inicio, costo_inicial, guardar_cada)
+        
+        # Guardar resultados finales
+        self.materializar()
+        
+        duracion = time.perf_counter() - inicio
+        logging.info(f"Clasificación completada. {procesados} textos procesados en {duracion:.1f}s "
+                     f"({procesados / duracion:.1f} textos/s).")
+        logging.info(f"Costo total estimado: ${self.costo_estimado:.4f}")
+        if self.textos_api:
+            mensaje = f"Tokens por texto clasificado con la API: {self.tokens_por_texto():.1f}"
+            if textos_por_prompt > 1:
+                # Referencia: lo que costaría el mismo texto en un prompt propio
+                individual = sum(estimar_tokens(self._prompt_texto(t)) for t in textos) / len(textos) + 5
+                mensaje += (f" (un texto por llamada: ~{individual:.1f} estimados; "
+                            f"{self.textos_reintentados} textos reintentados uno a uno)")
+            logging.info(mensaje)
+    
+    def _volcar_resultado(self, en_vuelo: deque, procesados: int, barra: tqdm,
+                          inicio: float, costo_inicial: float, guardar_cada: int) -> int:
+        """
+        Espera el resultado más antiguo en vuelo, lo escribe en el DataFrame y guarda si toca
+        
+        Returns:
+            Número de textos procesados tras escribirlo
+        """
+        indices, futuro = en_vuelo.popleft()
+        categorias = futuro.result()
+        # Los textos que no están en el caché son los que recibieron "otro" porque falló la API
+        with self._lock:
+            origenes = ["api" if t in self.cache else "por_defecto" for t in self.df.loc[indices, "texto"]]
+        self._asignar(indices, categorias, origenes)
+        anteriores = procesados
+        procesados += len(indices)
+        
+        duracion = max(time.perf_counter() - inicio, 1e-9)
+        costo = self.costo_estimado - costo_inicial
+        barra.update(len(indices))
+        barra.set_postfix({"textos/s": f"{procesados / duracion:.1f}", "costo": f"${costo:.4f}"})
+        
+        # Guardar progreso periódicamente: solo se añaden al diario las categorías nuevas
+        if procesados // guardar_cada != anteriores // guardar_cada:
+            self.diario.sincronizar()
+            logging.info(f"Progreso: {procesados}/{barra.total} textos procesados "
+                         f"({procesados / duracion:.1f} textos/s). Costo estimado: ${self.costo_estimado:.4f}")
+        return procesados
+    
+    def _asignar_desde_cache(self, origen: str = "api") -> int:
+        """Asigna a los textos pendientes la categoría que ya tengan en el caché (categorías de la API)"""
+        pendientes = self.df[self.df["categoria"].isna()]
+        categorias = pendientes["texto"].map(self.cache).dropna()
+        self._asignar(categorias.index, categorias, origen)
+        return len(categorias)
+    
+    def crear_lote_batch(self, ruta_jsonl: str = BATCH_JSONL, modelo: str = "gpt-3.5-turbo") -> int:
+        """
+        Escribe las peticiones de la Batch API para los textos pendientes
+        
+        Se genera una petición por texto distinto que no esté en el caché; su
+        custom_id es el hash del texto, así que los resultados se pueden
+        fusionar aunque el proceso se reinicie entre el envío y la fusión.
         
-        # Procesar textos en lotes
-        for i, (idx, row) in enumerate(tqdm(textos_pendientes.iterrows(), total=len(textos_pendientes))):
-            texto = row["texto"]
+        Args:
+            ruta_jsonl: Fichero JSONL de peticiones
+            modelo: Modelo de OpenAI a usar
             
-            # Clasificar texto
-            categoria = self.clasificar_texto(texto, modelo=modelo)
+        Returns:
+            Número de peticiones escritas
+        """
+        self._asignar_desde_cache()
+        textos = self.df.loc[self.df["categoria"].isna(), "texto"].astype(str).unique()
+        if len(textos) > MAX_PETICIONES_BATCH:
+            raise ValueError(f"{len(textos)} textos pendientes superan el límite de {MAX_PETICIONES_BATCH} "
+                             f"peticiones por trabajo; usa --limit para dividirlos")
+        
+        with open(ruta_jsonl, 'w', encoding='utf-8') as f:
+            for texto in textos:
+                peticion = {
+                    "custom_id": hash_texto(texto).hex(),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": modelo,
+                        "messages": [{"role": "user", "content": self._prompt_texto(texto)}],
+                        "max_tokens": MAX_TOKENS_CLASIFICACION,
+                        "temperature": 0.2
+                    }
+                }
+                f.write(json.dumps(peticion, ensure_ascii=False) + "\n")
+        logging.info(f"Escritas {len(textos)} peticiones de la Batch API en {ruta_jsonl}")
+        return len(textos)
+    
+    def enviar_lote_batch(self, ruta_jsonl: str = BATCH_JSONL, estado_file: str = ESTADO_BATCH_FILE) -> str:
+        """
+        Sube el fichero de peticiones y crea el trabajo de la Batch API
+        
+        El identificador del trabajo se guarda en estado_file para poder
+        reanudar el sondeo si el proceso se interrumpe.
+        
+        Args:
+            ruta_jsonl: Fichero JSONL de peticiones
+            estado_file: Fichero donde se guarda el trabajo en curso
             
-            # Actualizar DataFrame
-            self.df.at[idx, "categoria"] = categoria
+        Returns:
+            Identificador del trabajo
+        """
+        with open(ruta_jsonl, 'rb') as f:
+            fichero = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=fichero.id, endpoint="/v1/chat/completions",
+                                           completion_window="24h")
+        with open(estado_file, 'w', encoding='utf-8') as f:
+            json.dump({"batch_id": batch.id, "input_file_id": fichero.id, "ruta_jsonl": ruta_jsonl}, f)
+        logging.info(f"Trabajo de la Batch API creado: {batch.id} (fichero {fichero.id})")
+        return batch.id
+    
+    def esperar_lote_batch(self, batch_id: str, intervalo: float = INTERVALO_SONDEO_BATCH):
+        """
+        Consulta el trabajo hasta que termina
+        
+        Args:
+            batch_id: Identificador del trabajo
+            intervalo: Segundos entre consultas
             
-            # Guardar progreso periódicamente
-            if (i + 1) % guardar_cada == 0:
-                self.guardar_resultados()
-                logging.info(f"Progreso: {i + 1}/{len(textos_pendientes)} textos procesados. Costo estimado: ${self.costo_estimado:.4f}")
-                
-            # Pausa para evitar límites de tasa
-            if (i + 1) % batch_size == 0:
-                time.sleep(1)
+        Returns:
+            Trabajo terminado (completed, failed, expired o cancelled)
+        """
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            contadores = batch.request_counts
+            if contadores is not None:
+                logging.info(f"Trabajo {batch_id}: {batch.status}, {contadores.completed}/{contadores.total} "
+                             f"completadas, {contadores.failed} fallidas")
+            else:
+                logging.info(f"Trabajo {batch_id}: {batch.status}")
+            if batch.status in ("completed", "failed", "expired", "cancelled"):
+                return batch
+            time.sleep(intervalo)
+    
+    def fusionar_lote_batch(self, batch) -> Dict[str, int]:
+        """
+        Descarga los resultados de un trabajo y los fusiona con el caché y el CSV
         
-        # Guardar resultados finales
-        self._guardar_cache()
-        self.guardar_resultados()
+        Las peticiones fallidas (en el fichero de errores, con un código
+        distinto de 200 o con una respuesta vacía) dejan su texto pendiente
+        para un nuevo trabajo o para la clasificación interactiva. Un trabajo
+        expirado o cancelado también aporta sus resultados parciales.
         
-        logging.info(f"Clasificación completada. {len(textos_pendientes)} textos procesados.")
-        logging.info(f"Costo total estimado: ${self.costo_estimado:.4f}")
+        Args:
+            batch: Trabajo terminado (ver esperar_lote_batch)
+            
+        Returns:
+            Diccionario con las peticiones asignadas y fallidas
+        """
+        textos = self.df.loc[self.df["categoria"].isna(), "texto"].astype(str).unique()
+        texto_por_id = {hash_texto(texto).hex(): texto for texto in textos}
+        
+        lineas = []
+        for fichero_id in (batch.output_file_id, batch.error_file_id):
+            if fichero_id:
+                lineas.extend(self.client.files.content(fichero_id).text.splitlines())
+        
+        categorias = {}
+        fallidas = 0
+        tokens_entrada = tokens_salida = 0
+        for linea in lineas:
+            if not linea.strip():
+                continue
+            resultado = json.loads(linea)
+            texto = texto_por_id.get(resultado.get("custom_id"))
+            respuesta = resultado.get("response") or {}
+            if texto is None:
+                continue  # Texto ya clasificado por otra vía
+            if resultado.get("error") or respuesta.get("status_code") != 200:
+                fallidas += 1
+                continue
+            cuerpo = respuesta.get("body") or {}
+            try:
+                contenido = cuerpo["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                fallidas += 1
+                continue
+            categorias[texto] = self._normalizar_categoria(contenido or "")
+            uso = cuerpo.get("usage") or {}
+            tokens_entrada += uso.get("prompt_tokens", 0)
+            tokens_salida += uso.get("completion_tokens", 0)
+        
+        costo = DESCUENTO_BATCH * ((tokens_entrada / 1000 * COSTO_POR_1K_ENTRADA)
+                                   + (tokens_salida / 1000 * COSTO_POR_1K_SALIDA))
+        with self._lock:
+            self.costo_estimado += costo
+            self.tokens_entrada += tokens_entrada
+            self.tokens_salida += tokens_salida
+        self._registrar(categorias, origen="batch")
+        asignados = self._asignar_desde_cache(origen="batch")
+        
+        self.materializar()
+        pendientes = int(self.df["categoria"].isna().sum())
+        logging.info(f"Trabajo {batch.id} fusionado: {len(categorias)} textos clasificados ({asignados} filas), "
+                     f"{fallidas} peticiones fallidas, {pendientes} filas pendientes. "
+                     f"Costo estimado: ${costo:.4f}")
+        return {"asignados": len(categorias), "fallidas": fallidas}
+    
+    def procesar_batch(self, modelo: str = "gpt-3.5-turbo", intervalo: float = INTERVALO_SONDEO_BATCH,
+                       estado_file: str = ESTADO_BATCH_FILE, ruta_jsonl: str = BATCH_JSONL) -> Dict[str, int]:
+        """
+        Clasifica los textos pendientes con la Batch API: envío, sondeo y fusión
+        
+        Si estado_file indica un trabajo ya enviado (el proceso se interrumpió
+        mientras esperaba), se reanuda su sondeo en lugar de enviar otro.
+        
+        Args:
+            modelo: Modelo de OpenAI a usar
+            intervalo: Segundos entre consultas del estado del trabajo
+            estado_file: Fichero con el trabajo en curso
+            ruta_jsonl: Fichero JSONL de peticiones
+            
+        Returns:
+            Diccionario con las peticiones asignadas y fallidas
+        """
+        if self.df is None or len(self.df) == 0:
+            logging.error("No hay datos cargados para procesar")
+            return {"asignados": 0, "fallidas": 0}
+        
+        if os.path.exists(estado_file):
+            with open(estado_file, 'r', encoding='utf-8') as f:
+                batch_id = json.load(f)["batch_id"]
+            logging.info(f"Reanudando el trabajo de la Batch API {batch_id}")
+        else:
+            if self.crear_lote_batch(ruta_jsonl, modelo) == 0:
+                logging.info("Todos los textos ya están categorizados")
+                self.materializar()
+                return {"asignados": 0, "fallidas": 0}
+            batch_id = self.enviar_lote_batch(ruta_jsonl, estado_file)
+        
+        batch = self.esperar_lote_batch(batch_id, intervalo)
+        resumen = self.fusionar_lote_batch(batch)
+        os.remove(estado_file)
+        return resumen
     
     def guardar_resultados(self):
-        """Guarda los resultados en un CSV"""
+        """Guarda los resultados en un CSV (y en el Parquet del corpus si ya existe)"""
         if self.df is not None:
-            self.df.to_csv(self.output_csv, index=False)
+            # Escribir en un temporal y renombrar para no dejar el CSV a medias
+            ruta_temporal = f"{self.output_csv}.tmp"
+            self.df.to_csv(ruta_temporal, index=False)
+            os.replace(ruta_temporal, self.output_csv)
             logging.info(f"Resultados guardados en {self.output_csv}")
+            
+            # Mantener al día el corpus en Parquet si ya se había generado
+            if os.path.exists(ruta_parquet(self.output_csv)):
+                convertir_csv(self.output_csv)
+    
+    def materializar(self):
+        """
+        Vuelca el diario al CSV de resultados y al caché de categorías, y lo vacía
+        
+        El CSV y el caché se escriben de forma atómica antes de vaciar el
+        diario; si el proceso se interrumpe entre medias, las anotaciones se
+        vuelven a aplicar en la siguiente carga sin efecto alguno.
+        """
+        self.diario.sincronizar()
+        self.guardar_resultados()
+        self._guardar_cache()
+        self.diario.vaciar()
     
     def generar_estadisticas(self):
         """Genera estadísticas de las categorías"""
@@ -298,8 +1012,10 @@ def main():
     
     parser.add_argument("--limit", type=int, default=None,
                         help="Límite de textos a procesar (None para todos)")
-    parser.add_argument("--batch", type=int, default=50,
-                        help="Tamaño del lote para procesar")
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA_CLASIFICACION,
+                        help="Llamadas simultáneas a la API")
+    parser.add_argument("--batch", type=int, default=None,
+                        help="Obsoleto: alias de --concurrencia (se eliminará en la próxima versión)")
     parser.add_argument("--modelo", type=str, default="gpt-3.5-turbo",
                         choices=["gpt-3.5-turbo", "gpt-4"],
                         help="Modelo de OpenAI a usar")
@@ -307,20 +1023,51 @@ def main():
                         help="Cada cuántos textos guardar el progreso")
     parser.add_argument("--reanudar", action="store_true",
                         help="Reanudar el proceso desde donde se quedó")
+    parser.add_argument("--por-prompt", type=int, default=TEXTOS_POR_PROMPT,
+                        help="Textos clasificados en cada llamada a la API (respuesta en JSON)")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="Clasificar con la Batch API (envío, sondeo y fusión; más lento y a mitad de precio)")
+    parser.add_argument("--intervalo-sondeo", type=float, default=INTERVALO_SONDEO_BATCH,
+                        help="Segundos entre consultas del estado del trabajo de la Batch API")
+    parser.add_argument("--base-url", type=str, default=None,
+                        help="URL base de una API compatible con OpenAI (p. ej. servidor_openai_falso.py)")
+    parser.add_argument("--local", action="store_true",
+                        help="Clasificar en local (embeddings) los textos con confianza suficiente y enviar el resto a la API")
+    parser.add_argument("--umbral-confianza", type=float, default=UMBRAL_CONFIANZA_LOCAL,
+                        help="Confianza mínima del clasificador local para no llamar a la API")
+    parser.add_argument("--evaluar-local", action="store_true",
+                        help="Solo medir la precisión del clasificador local frente a las categorías existentes")
+    parser.add_argument("--materializar", action="store_true",
+                        help="Solo volcar al CSV las categorías del diario de resultados")
+    parser.add_argument("--preclasificar", action="store_true",
+                        help="Clasificar por palabras clave los textos inequívocos sin llamar a la API")
     
     args = parser.parse_args()
+    if args.batch is not None:
+        logging.warning("--batch está obsoleto y se eliminará en la próxima versión; usa --concurrencia")
+        args.concurrencia = args.batch
     
     # Inicializar clasificador
     clasificador = ClasificadorTextos(
         api_key=API_KEY,
         csv_path=CSV_PATH,
         output_csv=OUTPUT_CSV,
-        cache_file=CACHE_FILE
+        cache_file=CACHE_FILE,
+        base_url=args.base_url
     )
     
     # Cargar datos
     clasificador.cargar_datos(limit=args.limit)
     
+    if args.materializar:
+        clasificador.materializar()
+        return
+    
+    if args.evaluar_local:
+        informe = clasificador.entrenar_clasificador_local(umbral=args.umbral_confianza)
+        print(json.dumps(informe, ensure_ascii=False, indent=2))
+        return
+    
     # Si se especifica reanudar, mostrar resumen y confirmar
     if args.reanudar and clasificador.df is not None:
         textos_pendientes = clasificador.df[clasificador.df["categoria"].isna()]
@@ -329,7 +1076,7 @@ def main():
             return
             
         logging.info(f"Se reanudará la clasificación de {len(textos_pendientes)} textos pendientes.")
-        logging.info(f"Usando modelo: {args.modelo}, tamaño de lote: {args.batch}, guardando cada: {args.guardar_cada} textos")
+        logging.info(f"Usando modelo: {args.modelo}, concurrencia: {args.concurrencia}, guardando cada: {args.guardar_cada} textos")
         
         # Preguntar confirmación
         try:
@@ -342,11 +1089,22 @@ def main():
             return
     
     # Procesar textos
-    clasificador.procesar_lote(
-        batch_size=args.batch,
-        modelo=args.modelo,
-        guardar_cada=args.guardar_cada
-    )
+    if args.batch_api:
+        if args.preclasificar and clasificador.df is not None:
+            clasificador.preclasificar()
+        if args.local and clasificador.df is not None:
+            clasificador.clasificar_local(args.umbral_confianza)
+        clasificador.procesar_batch(modelo=args.modelo, intervalo=args.intervalo_sondeo)
+    else:
+        clasificador.procesar_lote(
+            concurrencia=args.concurrencia,
+            modelo=args.modelo,
+            guardar_cada=args.guardar_cada,
+            preclasificar=args.preclasificar,
+            textos_por_prompt=args.por_prompt,
+            local=args.local,
+            umbral_local=args.umbral_confianza
+        )
     
     # Generar estadísticas
     clasificador.generar_estadisticas()
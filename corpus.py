@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Corpus limpio de textos en formato columnar
+
+Todos los componentes (generador, buscador, clasificador y la aplicación web)
+leen los textos a través de este módulo, que aplica en un único sitio el filtro
+de textos inválidos (SIN_TEXTO, errores del OCR, respuestas vacías).
+
+La conversión se hace una sola vez:
+
+    python corpus.py                      # texto_extraido_categorizado.csv -> .parquet
+    python corpus.py --csv texto_extraido.csv
+
+El Parquet resultante tiene columnas tipadas (categoria como categórica, hash
+del contenido, cluster de casi-duplicados) y se lee con proyección de
+columnas y memoria mapeada. Si pyarrow no está instalado o el Parquet es más
+antiguo que el CSV, se lee el CSV y se limpia al vuelo.
+"""
+
+import os
+import logging
+import argparse
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from almacen_embeddings import hash_texto
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él se lee siempre el CSV
+    pq = None
+
+# Configuración
+CSV_PATH = "texto_extraido_categorizado.csv"
+PATRON_TEXTO_INVALIDO = "SIN_TEXTO|ERROR:|Lo siento"  # Textos que el OCR no pudo extraer
+COLUMNAS_CSV_ANTIGUO = ["ruta", "carpeta", "texto"]  # Formato sin encabezados de extraer_texto.py
+
+
+def ruta_parquet(csv_path: str) -> str:
+    """Ruta del Parquet correspondiente a un CSV (mismo nombre, extensión .parquet)"""
+    return f"{os.path.splitext(csv_path)[0]}.parquet"
+
+
+def leer_csv(csv_path: str) -> pd.DataFrame:
+    """
+    Lee un CSV de textos con o sin fila de encabezados
+
+    Args:
+        csv_path: Ruta del CSV
+
+    Returns:
+        DataFrame con al menos la columna "texto"
+    """
+    df = pd.read_csv(csv_path)
+    if 'texto' not in df.columns:
+        # Formato antiguo sin encabezados
+        df = pd.read_csv(csv_path, names=COLUMNAS_CSV_ANTIGUO, header=None)
+    return df
+
+
+def filtrar_textos_validos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Descarta las filas sin texto útil (vacías o con marcas de error del OCR)
+
+    Args:
+        df: DataFrame con la columna "texto"
+
+    Returns:
+        DataFrame filtrado (mismo índice que el original)
+    """
+    textos = df["texto"].astype(str)
+    validos = (df["texto"].notna()
+               & ~textos.str.contains(PATRON_TEXTO_INVALIDO, na=False)
+               & (textos.str.strip().str.len() > 0))
+    return df[validos]
+
+
+def limpiar_corpus(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filtra los textos válidos y tipa las columnas del corpus
+
+    Args:
+        df: DataFrame leído del CSV
+
+    Returns:
+        DataFrame limpio con texto, categoria (categórica), hash_texto
+        (16 bytes), y cluster_id / es_canonico si existen
+    """
+    df = filtrar_textos_validos(df).reset_index(drop=True)
+    df["texto"] = df["texto"].astype(str)
+    if "categoria" in df.columns:
+        df["categoria"] = df["categoria"].astype("category")
+    df["hash_texto"] = [hash_texto(t) for t in df["texto"]]
+    if "cluster_id" in df.columns:
+        df["cluster_id"] = df["cluster_id"].astype("Int64")
+    if "es_canonico" in df.columns:
+        df["es_canonico"] = df["es_canonico"].fillna(False).astype(bool)
+    return df
+
+
+def convertir_csv(csv_path: str = CSV_PATH, salida: Optional[str] = None) -> str:
+    """
+    Convierte un CSV de textos en el corpus limpio en Parquet
+
+    Args:
+        csv_path: CSV de entrada
+        salida: Ruta del Parquet (por defecto, junto al CSV)
+
+    Returns:
+        Ruta del Parquet generado
+    """
+    if pq is None:
+        raise ImportError("Se necesita pyarrow para generar el corpus en Parquet (pip install pyarrow)")
+
+    salida = salida or ruta_parquet(csv_path)
+    df = limpiar_corpus(leer_csv(csv_path))
+
+    # Escribir en un temporal y renombrar para que ningún lector vea un fichero a medias
+    ruta_temporal = f"{salida}.tmp"
+    df.to_parquet(ruta_temporal, engine="pyarrow", index=False)
+    os.replace(ruta_temporal, salida)
+    logging.info(f"Corpus guardado en {salida}: {len(df)} textos válidos, columnas {list(df.columns)}")
+    return salida
+
+
+def _parquet_actualizado(csv_path: str) -> Optional[str]:
+    """Devuelve la ruta del Parquet si existe, se puede leer y no es más antiguo que el CSV"""
+    ruta = ruta_parquet(csv_path)
+    if pq is None or not os.path.exists(ruta):
+        return None
+    if os.path.exists(csv_path) and os.path.getmtime(ruta) < os.path.getmtime(csv_path):
+        logging.warning(f"{ruta} es más antiguo que {csv_path}; se lee el CSV (ejecuta corpus.py para regenerarlo)")
+        return None
+    return ruta
+
+
+def cargar_corpus(csv_path: str = CSV_PATH, columnas: Optional[List[str]] = None,
+                  solo_canonicos: bool = False, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Carga el corpus limpio, desde el Parquet si está disponible o desde el CSV
+
+    Args:
+        csv_path: CSV de origen del corpus
+        columnas: Columnas a cargar (por defecto todas); las que no existan se omiten
+        solo_canonicos: Si True, solo las filas canónicas de cada cluster de casi-duplicados
+        limit: Límite de textos a cargar
+
+    Returns:
+        DataFrame con los textos válidos en el orden del CSV
+    """
+    ruta = _parquet_actualizado(csv_path)
+    if ruta is not None:
+        disponibles = pq.read_schema(ruta).names
+        leer = disponibles if columnas is None else [c for c in columnas if c in disponibles]
+        if solo_canonicos and "es_canonico" in disponibles and "es_canonico" not in leer:
+            leer = leer + ["es_canonico"]
+        df = pq.read_table(ruta, columns=leer, memory_map=True).to_pandas()
+    else:
+        df = limpiar_corpus(leer_csv(csv_path))
+
+    if solo_canonicos:
+        if "es_canonico" in df.columns:
+            df = df[df["es_canonico"]].reset_index(drop=True)
+        else:
+            logging.warning("El corpus no tiene columna es_canonico; ejecuta deduplicador.py. Se cargan todas las filas")
+    if columnas is not None:
+        df = df[[c for c in columnas if c in df.columns]]
+    if limit:
+        df = df.head(limit)
+    return df
+
+
+def firma_corpus(csv_path: str = CSV_PATH) -> Tuple:
+    """
+    Firma barata de las fuentes del corpus para detectar cambios
+
+    Args:
+        csv_path: CSV de origen del corpus
+
+    Returns:
+        Tupla con (mtime en ns, tamaño) del CSV y de su Parquet (None si no existen)
+    """
+    firma = []
+    for ruta in (csv_path, ruta_parquet(csv_path)):
+        try:
+            estado = os.stat(ruta)
+            firma.append((estado.st_mtime_ns, estado.st_size))
+        except OSError:
+            firma.append(None)
+    return tuple(firma)
+
+
+class MetadatosCorpus:
+    """Categorías y recuentos de un corpus cargado, calculados una sola vez
+
+    Se construye al cargar los textos y no se modifica después; guarda la
+    firma de las fuentes para saber cuándo ha quedado obsoleto.
+    """
+
+    def __init__(self, textos_por_categoria: Dict[str, Sequence[str]], firma: Tuple):
+        """Inicializa los metadatos
+
+        Args:
+            textos_por_categoria: Textos (o índices de textos) de cada categoría
+            firma: Firma de las fuentes en el momento de la carga (ver firma_corpus)
+        """
+        self.conteos = {categoria: len(textos) for categoria, textos in textos_por_categoria.items()}
+        self.total = sum(self.conteos.values())
+        self.categorias = sorted(c for c in self.conteos if c != "sin_categoria")
+        self.firma = firma
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Número de textos por categoría y total"""
+        return {**self.conteos, 'total': self.total}
+
+
+def main():
+    """Función principal"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Convertir el CSV de textos al corpus limpio en Parquet")
+    parser.add_argument("--csv", type=str, default=CSV_PATH,
+                        help="CSV de textos a convertir")
+    parser.add_argument("--salida", type=str, default=None,
+                        help="Ruta del Parquet (por defecto, junto al CSV)")
+
+    args = parser.parse_args()
+
+    convertir_csv(args.csv, args.salida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Detección de casi-duplicados en el corpus de textos extraídos
+
+El OCR de las publicaciones produce muchos textos casi idénticos (slides de
+carrusel repetidos, reposts, la misma frase con otros saltos de línea). Este
+script agrupa esos textos en clusters y elige un representante canónico por
+cluster, añadiendo al CSV las columnas:
+
+    cluster_id   identificador del cluster de casi-duplicados
+    es_canonico  True en una sola fila por cluster (la del texto canónico)
+
+El proceso es subcuadrático:
+1. SimHash de 64 bits sobre n-gramas de caracteres del texto normalizado, con
+   LSH por bandas: solo se comparan los textos que coinciden en alguna banda.
+2. Vecinos más cercanos de cada texto con el índice IVF del buscador de
+   similares, confirmados con un umbral de similitud coseno.
+
+El generador y el buscador pueden cargar después solo las filas canónicas.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Set, Tuple
+
+from corpus import convertir_csv, filtrar_textos_validos, leer_csv, ruta_parquet
+
+# Configuración de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler("deduplicador_log.txt"),
+        logging.StreamHandler()
+    ]
+)
+
+# Configuración
+CSV_PATH = "texto_extraido_categorizado.csv"
+TAMANO_SHINGLE = 4  # Caracteres por n-grama del SimHash
+BANDAS_SIMHASH = 4  # Bandas de 16 bits: detecta con seguridad distancias de Hamming <= 3
+MAX_HAMMING = 3  # Distancia de Hamming máxima entre SimHash para considerar casi-duplicados
+MAX_TAMANO_CUBETA = 500  # Cubetas LSH mayores se ignoran (textos muy genéricos)
+UMBRAL_COSENO = 0.95  # Similitud coseno mínima entre embeddings para considerar casi-duplicados
+VECINOS_EMBEDDINGS = 10  # Vecinos por texto consultados en el índice de embeddings
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza un texto para compararlo: minúsculas, sin puntuación y espacios colapsados"""
+    texto = re.sub(r"[^\w\s]", " ", str(texto).lower())
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def simhash(texto: str, tamano_shingle: int = TAMANO_SHINGLE) -> int:
+    """
+    Calcula el SimHash de 64 bits de un texto a partir de sus n-gramas de caracteres
+
+    Args:
+        texto: Texto (ya normalizado)
+        tamano_shingle: Caracteres por n-grama
+
+    Returns:
+        SimHash como entero sin signo de 64 bits
+    """
+    if len(texto) <= tamano_shingle:
+        shingles = {texto}
+    else:
+        shingles = {texto[i:i + tamano_shingle] for i in range(len(texto) - tamano_shingle + 1)}
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little') for s in shingles),
+        dtype=np.uint64, count=len(shingles))
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votos = (2 * bits.astype(np.int64) - 1).sum(axis=0)
+    return int(np.packbits((votos > 0)[::-1]).view('>u8')[0])
+
+
+class UnionFind:
+    """Estructura union-find para agrupar índices en clusters"""
+
+    def __init__(self, n: int):
+        self.padre = list(range(n))
+
+    def buscar(self, i: int) -> int:
+        raiz = i
+        while self.padre[raiz] != raiz:
+            raiz = self.padre[raiz]
+        while self.padre[i] != raiz:
+            self.padre[i], i = raiz, self.padre[i]
+        return raiz
+
+    def unir(self, a: int, b: int):
+        raiz_a, raiz_b = self.buscar(a), self.buscar(b)
+        if raiz_a != raiz_b:
+            self.padre[max(raiz_a, raiz_b)] = min(raiz_a, raiz_b)
+
+
+def pares_simhash(hashes: List[int], bandas: int = BANDAS_SIMHASH, max_hamming: int = MAX_HAMMING,
+                  max_cubeta: int = MAX_TAMANO_CUBETA) -> Set[Tuple[int, int]]:
+    """
+    Encuentra pares de textos con SimHash cercanos usando LSH por bandas
+
+    Args:
+        hashes: SimHash de cada texto
+        bandas: Número de bandas en que se divide el hash de 64 bits
+        max_hamming: Distancia de Hamming máxima
+        max_cubeta: Tamaño máximo de cubeta a explorar
+
+    Returns:
+        Conjunto de pares (i, j) con i < j
+    """
+    bits_banda = 64 // bandas
+    mascara = (1 << bits_banda) - 1
+    pares = set()
+    for banda in range(bandas):
+        cubetas: Dict[int, List[int]] = {}
+        for i, h in enumerate(hashes):
+            cubetas.setdefault((h >> (banda * bits_banda)) & mascara, []).append(i)
+        for miembros in cubetas.values():
+            if len(miembros) < 2 or len(miembros) > max_cubeta:
+                continue
+            for x in range(len(miembros)):
+                for y in range(x + 1, len(miembros)):
+                    i, j = miembros[x], miembros[y]
+                    if (i, j) not in pares and bin(hashes[i] ^ hashes[j]).count("1") <= max_hamming:
+                        pares.add((i, j))
+    return pares
+
+
+def pares_embeddings(csv_path: str, textos: List[str], umbral: float = UMBRAL_COSENO,
+                     vecinos: int = VECINOS_EMBEDDINGS, indice: str = "ivf") -> Set[Tuple[int, int]]:
+    """
+    Encuentra pares de textos con embeddings casi idénticos usando el buscador de similares
+
+    Args:
+        csv_path: CSV con el que se inicializa el buscador
+        textos: Textos únicos a comparar
+        umbral: Similitud coseno mínima
+        vecinos: Vecinos consultados por texto
+        indice: Índice del buscador a usar ("ivf" o "exacto")
+
+    Returns:
+        Conjunto de pares (i, j) con i < j sobre las posiciones de `textos`
+    """
+    from buscador_similares import BuscadorTextosSimilares
+
+    buscador = BuscadorTextosSimilares(csv_path=csv_path)
+    buscador.cargar_datos(precalcular_embeddings=True)
+    indice_busqueda = buscador.obtener_indice(indice)
+
+    posicion = {texto: i for i, texto in enumerate(textos)}
+    fila_a_posicion = np.array([posicion.get(t, -1) for t in buscador.textos_corpus], dtype=np.int64)
+    matriz = buscador.matriz_embeddings
+
+    pares = set()
+    bloque = 1024
+    for inicio in range(0, len(matriz), bloque):
+        consultas = np.asarray(matriz[inicio:inicio + bloque], dtype=np.float32)
+        for desplazamiento, (filas, similitudes) in enumerate(indice_busqueda.buscar_lote(consultas, vecinos + 1)):
+            i = fila_a_posicion[inicio + desplazamiento]
+            for fila, similitud in zip(filas, similitudes):
+                j = fila_a_posicion[fila]
+                if i >= 0 and j >= 0 and i != j and similitud >= umbral:
+                    pares.add((min(i, j), max(i, j)))
+    return pares
+
+
+def agrupar_casi_duplicados(df: pd.DataFrame, usar_embeddings: bool = True, csv_path: str = CSV_PATH,
+                            umbral_coseno: float = UMBRAL_COSENO, max_hamming: int = MAX_HAMMING,
+                            indice: str = "ivf") -> pd.DataFrame:
+    """
+    Asigna a cada fila un cluster de casi-duplicados y marca las filas canónicas
+
+    El representante canónico de cada cluster es el texto con más contenido
+    una vez normalizado (el OCR más completo); en caso de empate, el que
+    aparece antes en el CSV. Dentro del texto
+    canónico, solo su primera fila se marca como canónica.
+
+    Args:
+        df: DataFrame con la columna "texto" (las filas con textos inválidos quedan sin cluster)
+        usar_embeddings: Si True, añade los pares detectados con embeddings
+        csv_path: CSV con el que se inicializa el buscador de similares
+        umbral_coseno: Similitud coseno mínima entre embeddings
+        max_hamming: Distancia de Hamming máxima entre SimHash
+        indice: Índice del buscador para los vecinos ("ivf" o "exacto")
+
+    Returns:
+        Copia del DataFrame con las columnas cluster_id y es_canonico
+    """
+    df = df.copy()
+    validos = pd.Series(df.index.isin(filtrar_textos_validos(df).index), index=df.index)
+    codigos, textos = pd.factorize(df.loc[validos, "texto"])
+    textos = list(textos)
+    logging.info(f"Agrupando {len(textos)} textos únicos de {len(df)} filas...")
+
+    union = UnionFind(len(textos))
+
+    # 1. Textos iguales salvo mayúsculas, puntuación y saltos de línea
+    normalizados = [normalizar_texto(t) for t in textos]
+    primero_normalizado: Dict[str, int] = {}
+    for i, normalizado in enumerate(normalizados):
+        union.unir(i, primero_normalizado.setdefault(normalizado, i))
+
+    # 2. SimHash + LSH por bandas
+    hashes = [simhash(n) for n in normalizados]
+    pares = pares_simhash(hashes, max_hamming=max_hamming)
+    logging.info(f"Pares candidatos por SimHash: {len(pares)}")
+
+    # 3. Vecinos por embeddings
+    if usar_embeddings:
+        pares_emb = pares_embeddings(csv_path, textos, umbral=umbral_coseno, indice=indice)
+        logging.info(f"Pares por embeddings (coseno >= {umbral_coseno}): {len(pares_emb)}")
+        pares |= pares_emb
+
+    for i, j in pares:
+        union.unir(i, j)
+
+    # Numerar clusters y elegir el representante canónico de cada uno
+    raices = np.array([union.buscar(i) for i in range(len(textos))], dtype=np.int64)
+    _, cluster_por_texto = np.unique(raices, return_inverse=True)
+    longitudes = np.array([len(n) for n in normalizados])
+    orden = np.lexsort((np.arange(len(textos)), -longitudes, cluster_por_texto))
+    es_inicio = np.ones(len(orden), dtype=bool)
+    es_inicio[1:] = cluster_por_texto[orden][1:] != cluster_por_texto[orden][:-1]
+    texto_canonico = np.zeros(len(textos), dtype=bool)
+    texto_canonico[orden[es_inicio]] = True
+
+    df["cluster_id"] = pd.array([pd.NA] * len(df), dtype="Int64")
+    df.loc[validos, "cluster_id"] = cluster_por_texto[codigos]
+    canonico = np.zeros(len(df), dtype=bool)
+    canonico[np.flatnonzero(validos.to_numpy())] = texto_canonico[codigos]
+    # Solo la primera fila de cada texto canónico
+    df["es_canonico"] = canonico & ~df["texto"].duplicated()
+
+    n_clusters = len(np.unique(cluster_por_texto))
+    logging.info(f"Clusters: {n_clusters} ({len(textos) - n_clusters} textos únicos agrupados como "
+                 f"casi-duplicados); filas canónicas: {int(df['es_canonico'].sum())} de {len(df)}")
+    return df
+
+
+def deduplicar_csv(csv_path: str = CSV_PATH, salida: Optional[str] = None, **kwargs) -> pd.DataFrame:
+    """
+    Añade las columnas cluster_id y es_canonico a un CSV
+
+    Args:
+        csv_path: CSV de entrada (con columna "texto")
+        salida: CSV de salida (por defecto se sobrescribe la entrada)
+        **kwargs: Parámetros de agrupar_casi_duplicados
+
+    Returns:
+        DataFrame resultante
+    """
+    salida = salida or csv_path
+    df = leer_csv(csv_path)
+    df = df.drop(columns=[c for c in ("cluster_id", "es_canonico") if c in df.columns])
+    df = agrupar_casi_duplicados(df, csv_path=csv_path, **kwargs)
+
+    # Escribir en un temporal y renombrar para no dejar el CSV a medias
+    ruta_temporal = f"{salida}.tmp"
+    df.to_csv(ruta_temporal, index=False)
+    os.replace(ruta_temporal, salida)
+    logging.info(f"Resultados guardados en {salida}")
+    
+    # Mantener al día el corpus en Parquet si ya se había generado
+    if os.path.exists(ruta_parquet(salida)):
+        convertir_csv(salida)
+    return df
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Detectar y agrupar textos casi duplicados")
+
+    parser.add_argument("--csv", type=str, default=CSV_PATH,
+                        help="CSV con los textos")
+    parser.add_argument("--salida", type=str, default=None,
+                        help="CSV de salida (por defecto se sobrescribe el de entrada)")
+    parser.add_argument("--umbral-coseno", type=float, default=UMBRAL_COSENO,
+                        help="Similitud coseno mínima entre embeddings")
+    parser.add_argument("--hamming", type=int, default=MAX_HAMMING,
+                        help="Distancia de Hamming máxima entre SimHash")
+    parser.add_argument("--indice", type=str, default="ivf", choices=["ivf", "exacto"],
+                        help="Índice del buscador para los vecinos por embeddings")
+    parser.add_argument("--sin-embeddings", action="store_true",
+                        help="Usar solo SimHash (sin cargar el modelo de embeddings)")
+
+    args = parser.parse_args()
+
+    deduplicar_csv(
+        csv_path=args.csv,
+        salida=args.salida,
+        usar_embeddings=not args.sin_embeddings,
+        umbral_coseno=args.umbral_coseno,
+        max_hamming=args.hamming,
+        indice=args.indice
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Diario de resultados de la clasificación, de solo anexado
+
+Los puntos de guardado del clasificador reescribían el CSV completo y el
+caché JSON: un coste proporcional al corpus en cada guardado, y una
+interrupción a mitad de la escritura podía truncar el CSV de salida. Ahora
+cada punto de guardado añade al final de un fichero JSONL solo las
+categorías nuevas, en una única escritura seguida de fsync, con el hash del
+texto como clave. El CSV y el caché se materializan una vez al final (o bajo
+demanda) a partir del diario.
+
+Una interrupción pierde como mucho las categorías posteriores al último
+punto de guardado; una línea final incompleta se descarta al leer.
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, List
+
+from almacen_embeddings import hash_texto
+
+
+def ruta_diario(output_csv: str) -> str:
+    """Ruta del diario correspondiente a un CSV de resultados"""
+    return f"{os.path.splitext(output_csv)[0]}.diario.jsonl"
+
+
+class DiarioResultados:
+    """Diario JSONL de categorías asignadas (hash del texto -> categoría), seguro entre hilos"""
+
+    def __init__(self, ruta: str):
+        """Inicializa el diario
+
+        Args:
+            ruta: Ruta del fichero JSONL
+        """
+        self.ruta = ruta
+        self._pendientes: List[str] = []  # Líneas aún no escritas en disco
+        self._lock = threading.Lock()
+
+    def agregar(self, categorias: Dict[str, str], origen: str):
+        """
+        Anota categorías asignadas; se escriben en disco en el siguiente sincronizar()
+
+        Args:
+            categorias: Texto -> categoría
+            origen: Quién asignó la categoría ("api", "batch", "palabras_clave", "local")
+        """
+        lineas = [json.dumps({"hash": hash_texto(texto).hex(), "texto": texto,
+                              "categoria": categoria, "origen": origen}, ensure_ascii=False) + "\n"
+                  for texto, categoria in categorias.items()]
+        with self._lock:
+            self._pendientes.extend(lineas)
+
+    def sincronizar(self) -> int:
+        """
+        Añade al fichero las anotaciones pendientes en una sola escritura y hace fsync
+
+        Returns:
+            Número de anotaciones escritas
+        """
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            lineas, self._pendientes = self._pendientes, []
+            datos = "".join(lineas).encode("utf-8")
+
+            descriptor = os.open(self.ruta, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # Si una escritura anterior quedó a medias, empezar en una línea nueva
+                tamano = os.fstat(descriptor).st_size
+                if tamano and os.pread(descriptor, 1, tamano - 1) != b"\n":
+                    datos = b"\n" + datos
+                escritos = 0
+                while escritos < len(datos):
+                    escritos += os.write(descriptor, datos[escritos:])
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+        return len(lineas)
+
+    def leer(self) -> Dict[str, Dict[str, str]]:
+        """
+        Lee las anotaciones escritas en disco
+
+        Returns:
+            Hash del texto -> anotación (texto, categoria, origen); si un texto
+            aparece varias veces, gana la última
+        """
+        anotaciones = {}
+        if not os.path.exists(self.ruta):
+            return anotaciones
+        with open(self.ruta, 'r', encoding='utf-8') as f:
+            for numero, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    anotacion = json.loads(linea)
+                except ValueError:
+                    logging.warning(f"Línea {numero} de {self.ruta} incompleta; se descarta")
+                    continue
+                anotaciones[anotacion["hash"]] = anotacion
+        return anotaciones
+
+    def vaciar(self):
+        """Vacía el fichero una vez materializado su contenido (las anotaciones sin sincronizar se conservan)"""
+        with self._lock:
+            if os.path.exists(self.ruta):
+                os.truncate(self.ruta, 0)
@@ -7,16 +7,24 @@ Utiliza la API de OpenAI para generar textos similares a los ejemplos
 """
 
 import os
+import numpy as np
 import pandas as pd
 import random
 import time
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import OpenAI
 from tqdm import tqdm
-import json
 from typing import List, Dict, Any, Optional, Union
 import logging
 
+from cache_generacion import abrir_cache
+from clasificador_palabras_clave import CATEGORIAS, ClasificadorPalabrasClave
+from corpus import MetadatosCorpus, cargar_corpus, firma_corpus
+from limitador_tasa import es_error_limite, estimar_tokens, limitador_para, retry_after
+from pool_generacion import NIVEL_MINIMO_POOL, TAMANO_POOL, TEXTOS_POR_LLAMADA_POOL, PoolGeneracion
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -36,17 +44,51 @@ if not API_KEY:
 CSV_PATH = "texto_extraido_categorizado.csv"  # Usar el CSV con categorías
 OUTPUT_DIR = "textos_generados"
 CACHE_FILE = "textos_cache.json"
+NUM_EJEMPLOS = 20  # Ejemplos del corpus incluidos en cada prompt
+MAX_TOKENS_GENERACION = 80  # Tokens máximos de cada texto generado
+CONCURRENCIA_GENERACION = int(os.environ.get("CONCURRENCIA_GENERACION", 8))  # Llamadas simultáneas en generar_lote
+
+class MetricasGeneracion:
+    """Acumula tokens y latencia de las llamadas de generación (seguro entre hilos)"""
+    
+    def __init__(self):
+        self.llamadas = 0
+        self.textos = 0
+        self.tokens_entrada = 0
+        self.tokens_salida = 0
+        self.latencia_total = 0.0
+        self._lock = threading.Lock()
+    
+    def registrar(self, usage, latencia: float, textos: int):
+        """
+        Registra una llamada a la API
+        
+        Args:
+            usage: Objeto usage de la respuesta (prompt_tokens, completion_tokens)
+            latencia: Segundos que tardó la llamada
+            textos: Textos producidos por la llamada
+        """
+        with self._lock:
+            self.llamadas += 1
+            self.textos += textos
+            self.tokens_entrada += getattr(usage, "prompt_tokens", 0) or 0
+            self.tokens_salida += getattr(usage, "completion_tokens", 0) or 0
+            self.latencia_total += latencia
+    
+    def resumen(self) -> Dict[str, Any]:
+        """Totales y valores por texto producido (los textos servidos desde la caché no cuentan)"""
+        por_texto = max(self.textos, 1)
+        return {
+            'llamadas': self.llamadas,
+            'textos': self.textos,
+            'tokens_entrada': self.tokens_entrada,
+            'tokens_salida': self.tokens_salida,
+            'latencia_total_segundos': round(self.latencia_total, 3),
+            'tokens_entrada_por_texto': round(self.tokens_entrada / por_texto, 1),
+            'tokens_salida_por_texto': round(self.tokens_salida / por_texto, 1),
+            'latencia_por_texto_segundos': round(self.latencia_total / por_texto, 3)
+        }
 
-# Categorías predefinidas para clasificar textos
-CATEGORIAS = {
-    "amor": ["love", "kiss", "heart", "amor", "beso", "corazón", "relationship", "pareja"],
-    "motivacional": ["success", "dream", "believe", "éxito", "sueño", "creer", "motivación", "motivation"],
-    "humor": ["joke", "funny", "laugh", "chiste", "gracioso", "reír", "humor"],
-    "vida": ["life", "live", "alive", "vida", "vivir", "existencia", "existence"],
-    "crítica_social": ["society", "social", "crítica", "criticism", "instagram", "media", "fake"],
-    "autoestima": ["self", "love", "myself", "confidence", "autoestima", "confianza"],
-    "sueño": ["sleep", "dream", "bed", "dormir", "sueño", "cama", "tired", "cansado"]
-}
 
 class GeneradorTextos:
     """Clase para generar textos estilo Instagram basados en ejemplos"""
@@ -58,188 +100,170 @@ class GeneradorTextos:
         self.output_dir = output_dir
         self.cache_file = cache_file
         self.client = OpenAI(api_key=api_key)
-        self.textos = []
-        self.textos_por_categoria = {}
-        self.cache = self._cargar_cache()
+        self.textos = np.empty(0, dtype=object)  # Textos del corpus
+        self.categorias = None  # Categoría del CSV de cada texto (None si el CSV no tiene categorías)
+        self.indices_por_categoria: Dict[str, np.ndarray] = {}  # Índices en self.textos por categoría
+        self.metadatos: Optional[MetadatosCorpus] = None  # Categorías y recuentos del corpus cargado
+        self.metricas_ultimo_lote: Dict[str, Any] = {}  # Tokens y latencia del último generar_lote
+        self.cache = abrir_cache(cache_file)  # Textos generados por clave (SQLite, migra el JSON antiguo)
+        self.pool: Optional[PoolGeneracion] = None  # Textos generados de antemano (ver activar_pool)
         
         # Crear directorio de salida si no existe
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
     
-    def _cargar_cache(self) -> Dict:
-        """Carga el caché de textos generados previamente"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logging.error(f"Error al cargar caché: {e}")
-                return {}
-        return {}
-    
-    def _guardar_cache(self):
-        """Guarda el caché de textos generados"""
-        try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Error al guardar caché: {e}")
-    
-    def cargar_datos(self, limit: Optional[int] = None, chunk_size: int = 10000):
+    def cargar_datos(self, limit: Optional[int] = None, solo_canonicos: bool = False):
         """
-        Carga los datos del CSV de manera eficiente usando chunks
+        Carga los textos válidos del corpus (Parquet si está disponible, si no el CSV)
         
         Args:
-            limit: Límite opcional de filas a cargar
-            chunk_size: Tamaño de cada chunk para procesar el CSV
+            limit: Límite opcional de textos a cargar
+            solo_canonicos: Si True, carga solo las filas canónicas de cada cluster de
+                casi-duplicados (columna es_canonico generada por deduplicador.py)
         """
         logging.info(f"Cargando datos desde {self.csv_path}...")
         
-        # Inicializar listas
-        self.textos = []
-        self.categorias_texto = {}  # Diccionario para mapear texto -> categoría
-        
         try:
-            # Procesar el CSV en chunks para manejar archivos grandes
-            chunks = pd.read_csv(
-                self.csv_path, 
-                chunksize=chunk_size
-            )
+            # Firma de las fuentes antes de leerlas: un cambio durante la carga también se detecta
+            firma = firma_corpus(self.csv_path)
+            df = cargar_corpus(self.csv_path, columnas=["texto", "categoria"],
+                               solo_canonicos=solo_canonicos, limit=limit)
             
-            total_rows = 0
-            valid_rows = 0
+            # Un único array con todos los textos; las categorías se guardan como índices sobre él
+            textos = df["texto"].astype(str).str.strip()
+            self.textos = textos.to_numpy(dtype=object)
             
-            for chunk in tqdm(chunks, desc="Procesando chunks"):
-                # Determinar nombres de columnas
-                if 'texto' not in chunk.columns:
-                    # Formato antiguo sin encabezados
-                    chunk.columns = ["ruta", "carpeta", "texto"]
-                
-                # Filtrar textos válidos
-                valid_chunk = chunk.dropna(subset=["texto"])
-                valid_chunk = valid_chunk[~valid_chunk["texto"].astype(str).str.contains(
-                    "SIN_TEXTO|ERROR:|Lo siento", na=False)]
-                valid_chunk = valid_chunk[valid_chunk["texto"].astype(str).str.strip().str.len() > 0]
-                
-                # Extraer textos y categorías
-                for _, row in valid_chunk.iterrows():
-                    texto = str(row["texto"]).strip()
-                    # Guardar la categoría si existe en el CSV
-                    if "categoria" in row and pd.notna(row["categoria"]):
-                        self.categorias_texto[texto] = row["categoria"]
-                    
-                    self.textos.append(texto)
-                
-                total_rows += len(chunk)
-                valid_rows += len(valid_chunk)
-                
-                # Si hay un límite y ya lo alcanzamos, salimos
-                if limit and valid_rows >= limit:
-                    self.textos = self.textos[:limit]
-                    break
+            if "categoria" in df.columns:
+                # Un mismo texto puede repetirse en el CSV: se usa la última categoría asignada
+                con_categoria = pd.DataFrame({"texto": textos, "categoria": df["categoria"].astype(object)})
+                con_categoria = con_categoria.dropna(subset=["categoria"])
+                ultima_categoria = con_categoria.drop_duplicates("texto", keep="last").set_index("texto")["categoria"]
+                self.categorias = textos.map(ultima_categoria).to_numpy(dtype=object)
+                textos_con_categoria = len(ultima_categoria)
+            else:
+                self.categorias = None
+                textos_con_categoria = 0
             
-            logging.info(f"Datos cargados: {len(self.textos)} textos válidos de {total_rows} filas totales")
-            logging.info(f"Textos con categoría asignada: {len(self.categorias_texto)}")
+            logging.info(f"Datos cargados: {len(self.textos)} textos válidos")
+            logging.info(f"Textos con categoría asignada: {textos_con_categoria}")
             
             # Clasificar textos por categoría
             self._clasificar_textos()
+            self.metadatos = MetadatosCorpus(self.indices_por_categoria, firma)
             
         except Exception as e:
             logging.error(f"Error al cargar datos: {e}")
             raise
     
     def _clasificar_textos(self):
-        """Clasifica los textos en categorías basadas en categorías asignadas o palabras clave"""
+        """Agrupa los textos por categoría (la del CSV o, si no hay, por palabras clave)
+        
+        Cada categoría guarda un array con los índices de sus textos en self.textos.
+        """
         logging.info("Clasificando textos por categorías...")
         
         # Inicializar diccionario de categorías
-        self.textos_por_categoria = {}
+        self.indices_por_categoria = {}
         
         # Primero, usar las categorías del CSV si están disponibles
-        if self.categorias_texto:
-            # Identificar todas las categorías únicas
-            categorias_unicas = set(self.categorias_texto.values())
-            
-            # Inicializar listas para cada categoría
-            for categoria in categorias_unicas:
-                self.textos_por_categoria[categoria] = []
+        if self.categorias is not None and pd.notna(self.categorias).any():
+            # Los textos sin categoría quedan con código -1
+            codigos, nombres = pd.factorize(self.categorias)
+            for codigo, nombre in enumerate(nombres):
+                self.indices_por_categoria[nombre] = np.flatnonzero(codigos == codigo)
             
             # Categoría para textos sin categoría asignada
-            self.textos_por_categoria["sin_categoria"] = []
-            
-            # Clasificar cada texto según la categoría del CSV
-            for texto in self.textos:
-                if texto in self.categorias_texto:
-                    categoria = self.categorias_texto[texto]
-                    self.textos_por_categoria[categoria].append(texto)
-                else:
-                    self.textos_por_categoria["sin_categoria"].append(texto)
+            self.indices_por_categoria["sin_categoria"] = np.flatnonzero(codigos < 0)
         
         # Si no hay categorías en el CSV, usar el método de palabras clave
         else:
-            for categoria in CATEGORIAS:
-                self.textos_por_categoria[categoria] = []
+            # Cada texto va a la primera categoría (en el orden de CATEGORIAS) con alguna palabra clave
+            asignadas = ClasificadorPalabrasClave(CATEGORIAS).clasificar_corpus(self.textos)
             
-            # Categoría para textos que no encajan en ninguna otra
-            self.textos_por_categoria["otros"] = []
+            for i, categoria in enumerate(CATEGORIAS):
+                self.indices_por_categoria[categoria] = np.flatnonzero(asignadas == i)
             
-            # Clasificar cada texto
-            for texto in self.textos:
-                texto_lower = texto.lower()
-                categorizado = False
-                
-                for categoria, palabras_clave in CATEGORIAS.items():
-                    if any(palabra in texto_lower for palabra in palabras_clave):
-                        self.textos_por_categoria[categoria].append(texto)
-                        categorizado = True
-                        break
-                
-                if not categorizado:
-                    self.textos_por_categoria["otros"].append(texto)
+            # Categoría para textos que no encajan en ninguna otra
+            self.indices_por_categoria["otros"] = np.flatnonzero(asignadas < 0)
         
         # Mostrar estadísticas
-        for categoria, textos in self.textos_por_categoria.items():
-            logging.info(f"Categoría '{categoria}': {len(textos)} textos")
+        for categoria, indices in self.indices_por_categoria.items():
+            logging.info(f"Categoría '{categoria}': {len(indices)} textos")
     
-    def generar_texto(self, 
-                      categoria: Optional[str] = None, 
-                      estilo: Optional[str] = None, 
-                      tema: Optional[str] = None, 
-                      num_ejemplos: int = 20,
-                      temperatura: float = 0.7,
-                      modelo: str = "gpt-3.5-turbo") -> str:
+    @staticmethod
+    def _clave_cache(categoria: Optional[str], estilo: Optional[str], tema: Optional[str], modelo: str) -> str:
+        """Clave de la caché y del pool de generación para unos parámetros"""
+        return f"{categoria}_{estilo}_{tema}_{modelo}"
+    
+    def activar_pool(self, tamano: int = TAMANO_POOL, nivel_minimo: int = NIVEL_MINIMO_POOL,
+                     textos_por_llamada: int = TEXTOS_POR_LLAMADA_POOL) -> PoolGeneracion:
         """
-        Genera un texto basado en ejemplos
+        Activa el pool de textos generados de antemano (ver pool_generacion.py)
+        
+        Args:
+            tamano: Textos sin servir que se mantienen por clave
+            nivel_minimo: Número de textos disponibles por debajo del cual se repone
+            textos_por_llamada: Textos pedidos en cada llamada de reposición
+            
+        Returns:
+            Pool activado
+        """
+        self.detener_pool()
+        self.pool = PoolGeneracion(self, tamano=tamano, nivel_minimo=nivel_minimo,
+                                   textos_por_llamada=textos_por_llamada)
+        return self.pool
+    
+    def adoptar_pool(self, otro: "GeneradorTextos"):
+        """
+        Pasa a usar el pool de otro generador (al recargar el corpus), sin
+        reiniciar sus hilos ni volver a precalentarlo
+        
+        Args:
+            otro: Generador cuyo pool se adopta; se queda sin pool
+        """
+        pool, otro.pool = otro.pool, None
+        if pool is not None:
+            self.detener_pool()
+            pool.generador = self
+            self.pool = pool
+    
+    def detener_pool(self):
+        """Detiene la reposición del pool (los textos ya generados siguen en la caché)"""
+        if self.pool is not None:
+            self.pool.detener()
+            self.pool = None
+    
+    def _construir_prompt(self,
+                          categoria: Optional[str] = None,
+                          estilo: Optional[str] = None,
+                          tema: Optional[str] = None,
+                          num_ejemplos: int = NUM_EJEMPLOS) -> str:
+        """
+        Construye el prompt de generación con ejemplos aleatorios del corpus
         
         Args:
             categoria: Categoría de textos a usar como ejemplos
             estilo: Estilo deseado para el texto
             tema: Tema específico para el texto
             num_ejemplos: Número de ejemplos a incluir
-            temperatura: Temperatura para la generación (0.0-1.0)
-            modelo: Modelo de OpenAI a usar
             
         Returns:
-            Texto generado
+            Prompt para la API
         """
-        # Crear clave de caché
-        cache_key = f"{categoria}_{estilo}_{tema}_{num_ejemplos}_{temperatura}_{modelo}"
-        
-        # Verificar si ya está en caché
-        if cache_key in self.cache:
-            return random.choice(self.cache[cache_key])
-        
-        # Seleccionar ejemplos según la categoría
-        if categoria and categoria in self.textos_por_categoria:
-            pool_textos = self.textos_por_categoria[categoria]
-            if len(pool_textos) < num_ejemplos:
+        # Seleccionar ejemplos según la categoría (índices sobre self.textos)
+        pool_indices = None
+        if categoria and categoria in self.indices_por_categoria:
+            pool_indices = self.indices_por_categoria[categoria]
+            if len(pool_indices) < num_ejemplos:
                 logging.warning(f"No hay suficientes textos en la categoría '{categoria}'. Usando textos generales.")
-                pool_textos = self.textos
-        else:
-            pool_textos = self.textos
+                pool_indices = None
         
         # Seleccionar ejemplos aleatorios
-        ejemplos = random.sample(pool_textos, min(num_ejemplos, len(pool_textos)))
+        if pool_indices is None:
+            seleccion = random.sample(range(len(self.textos)), min(num_ejemplos, len(self.textos)))
+        else:
+            seleccion = pool_indices[random.sample(range(len(pool_indices)), min(num_ejemplos, len(pool_indices)))]
+        ejemplos = self.textos[seleccion]
         ejemplos_texto = "\n".join([f"- {e}" for e in ejemplos])
         
         # Construir prompt
@@ -255,39 +279,108 @@ El texto debe ser breve, impactante y con el mismo tono que los ejemplos."""
         if tema:
             prompt += f"\nTema: {tema}"
         
-        # Intentar generar el texto
+        return prompt
+    
+    def _completar(self,
+                   prompt: str,
+                   temperatura: float = 0.7,
+                   modelo: str = "gpt-3.5-turbo",
+                   n: int = 1,
+                   metricas: Optional[MetricasGeneracion] = None) -> List[str]:
+        """
+        Llama a la API con reintentos y devuelve los textos generados
+        
+        Args:
+            prompt: Prompt de generación
+            temperatura: Temperatura para la generación
+            modelo: Modelo de OpenAI a usar
+            n: Textos a generar en la misma llamada (el prompt se paga una sola vez)
+            metricas: Acumulador de tokens y latencia (opcional)
+            
+        Returns:
+            Lista de textos generados (vacía si fallan todos los intentos)
+        """
+        # El limitador compartido reparte la tasa entre hilos
+        limitador = limitador_para(modelo)
+        tokens_estimados = estimar_tokens(prompt) + MAX_TOKENS_GENERACION * n
         max_retries = 5  # Aumentamos a 5 reintentos
         for intento in range(max_retries):
             try:
+                limitador.adquirir(tokens_estimados)
+                inicio = time.perf_counter()
                 # Reducimos max_tokens para acelerar la respuesta
                 response = self.client.chat.completions.create(
                     model=modelo,
                     messages=[{"role": "user", "content": prompt}],
-                    max_tokens=80,  # Reducimos de 100 a 80
+                    max_tokens=MAX_TOKENS_GENERACION,
                     temperature=temperatura,
+                    n=n,
                     timeout=30  # Timeout explícito de 30 segundos
                 )
+                latencia = time.perf_counter() - inicio
+                limitador.registrar_exito()
                 
-                texto_generado = response.choices[0].message.content.strip()
-                
-                # Guardar en caché
-                if cache_key not in self.cache:
-                    self.cache[cache_key] = []
-                
-                self.cache[cache_key].append(texto_generado)
-                self._guardar_cache()
-                
-                return texto_generado
+                textos = [choice.message.content.strip() for choice in response.choices]
+                if metricas is not None:
+                    metricas.registrar(getattr(response, "usage", None), latencia, len(textos))
+                return textos
                 
             except Exception as e:
                 logging.error(f"Error en intento {intento+1}/{max_retries}: {e}")
-                if intento < max_retries - 1:
+                if es_error_limite(e):
+                    # El limitador pausa a todos los hilos y reduce la tasa; el
+                    # siguiente intento espera en adquirir()
+                    limitador.registrar_limite(retry_after(e))
+                elif intento < max_retries - 1:
                     # Tiempo de espera exponencial entre reintentos
                     wait_time = 2 ** intento  # 1, 2, 4, 8, 16 segundos
                     logging.info(f"Esperando {wait_time} segundos antes de reintentar...")
                     time.sleep(wait_time)
         
-        return "Error: No se pudo generar el texto después de varios intentos."
+        return []
+    
+    def generar_texto(self, 
+                      categoria: Optional[str] = None, 
+                      estilo: Optional[str] = None, 
+                      tema: Optional[str] = None, 
+                      num_ejemplos: int = NUM_EJEMPLOS,
+                      temperatura: float = 0.7,
+                      modelo: str = "gpt-3.5-turbo",
+                      metricas: Optional[MetricasGeneracion] = None) -> str:
+        """
+        Genera un texto basado en ejemplos
+        
+        Con el pool activado se sirve un texto generado de antemano y nunca
+        servido antes; si no hay ninguno (o sin pool) se llama a la API. Los
+        textos servidos quedan en la caché como historial, pero no se
+        vuelven a servir.
+        
+        Args:
+            categoria: Categoría de textos a usar como ejemplos
+            estilo: Estilo deseado para el texto
+            tema: Tema específico para el texto
+            num_ejemplos: Número de ejemplos a incluir
+            temperatura: Temperatura para la generación (0.0-1.0)
+            modelo: Modelo de OpenAI a usar
+            metricas: Acumulador de tokens y latencia (opcional)
+            
+        Returns:
+            Texto generado
+        """
+        pool = self.pool
+        if pool is not None:
+            texto = pool.obtener(categoria, estilo, tema, temperatura=temperatura, modelo=modelo)
+            if texto is not None:
+                return texto
+        
+        prompt = self._construir_prompt(categoria, estilo, tema, num_ejemplos)
+        textos = self._completar(prompt, temperatura=temperatura, modelo=modelo, metricas=metricas)
+        if not textos:
+            return "Error: No se pudo generar el texto después de varios intentos."
+        
+        # Guardar en el historial de la caché (una inserción, sin reescribir el resto)
+        self.cache.agregar(self._clave_cache(categoria, estilo, tema, modelo), textos[0])
+        return textos[0]
     
     def generar_lote(self, 
                     cantidad: int, 
@@ -295,9 +388,20 @@ El texto debe ser breve, impactante y con el mismo tono que los ejemplos."""
                     estilo: Optional[str] = None,
                     tema: Optional[str] = None,
                     temperatura: float = 0.7,
-                    modelo: str = "gpt-3.5-turbo") -> List[str]:
+                    modelo: str = "gpt-3.5-turbo",
+                    concurrencia: int = CONCURRENCIA_GENERACION,
+                    textos_por_llamada: int = 1) -> List[str]:
         """
-        Genera un lote de textos
+        Genera un lote de textos en paralelo
+        
+        Las llamadas se reparten entre un pool de hilos; el ritmo lo marca el
+        limitador de tasa compartido en lugar de pausas fijas. Con
+        textos_por_llamada > 1 cada llamada pide varias respuestas (parámetro
+        `n` de la API) sobre el mismo prompt, de modo que los tokens de los
+        ejemplos se pagan una vez por llamada y no una vez por texto; en este
+        modo no se sacan textos del pool (sí se guardan en el historial).
+        
+        Los tokens y la latencia del lote quedan en self.metricas_ultimo_lote.
         
         Args:
             cantidad: Número de textos a generar
@@ -306,38 +410,27 @@ El texto debe ser breve, impactante y con el mismo tono que los ejemplos."""
             tema: Tema específico para el texto
             temperatura: Temperatura para la generación
             modelo: Modelo de OpenAI a usar
+            concurrencia: Máximo de llamadas simultáneas a la API
+            textos_por_llamada: Textos pedidos en cada llamada a la API
             
         Returns:
-            Lista de textos generados
+            Lista de textos generados, en el orden pedido (los fallidos con un mensaje de error)
         """
-        textos_generados = []
+        metricas = MetricasGeneracion()
         
-        for i in tqdm(range(cantidad), desc="Generando textos"):
+        def generar_elemento(i: int) -> List[str]:
             # Implementamos reintentos a nivel de lote
             max_retries_lote = 3
             for intento in range(max_retries_lote):
                 try:
-                    texto = self.generar_texto(
+                    return [self.generar_texto(
                         categoria=categoria,
                         estilo=estilo,
                         tema=tema,
                         temperatura=temperatura,
-                        modelo=modelo
-                    )
-                    
-                    # Si llegamos aquí, la generación fue exitosa
-                    textos_generados.append(texto)
-                    
-                    # Pausa para evitar límites de tasa, variable según el modelo
-                    if i < cantidad - 1:
-                        if "gpt-4" in modelo.lower():
-                            time.sleep(1.0)  # Mayor pausa para GPT-4
-                        else:
-                            time.sleep(0.5)  # Pausa estándar para otros modelos
-                    
-                    # Si tuvimos éxito, salimos del bucle de reintentos
-                    break
-                    
+                        modelo=modelo,
+                        metricas=metricas
+                    )]
                 except Exception as e:
                     logging.error(f"Error en lote {i+1}, intento {intento+1}/{max_retries_lote}: {e}")
                     if intento < max_retries_lote - 1:
@@ -345,14 +438,32 @@ El texto debe ser breve, impactante y con el mismo tono que los ejemplos."""
                         wait_time = 3 ** intento  # 1, 3, 9 segundos
                         logging.info(f"Esperando {wait_time} segundos antes de reintentar...")
                         time.sleep(wait_time)
-                    else:
-                        # Si agotamos los reintentos, añadimos un mensaje de error
-                        textos_generados.append(f"Error: No se pudo generar el texto {i+1} después de {max_retries_lote} intentos.")
-            
-            # Guardamos el progreso cada 5 textos para no perder todo en caso de error
-            if (i + 1) % 5 == 0 or i == cantidad - 1:
-                self._guardar_cache()
+            # Si agotamos los reintentos, devolvemos un mensaje de error en su posición
+            return [f"Error: No se pudo generar el texto {i+1} después de {max_retries_lote} intentos."]
+        
+        def generar_grupo(j: int) -> List[str]:
+            # Varios textos con una sola llamada sobre el mismo prompt
+            inicio = j * textos_por_llamada
+            n = min(textos_por_llamada, cantidad - inicio)
+            prompt = self._construir_prompt(categoria, estilo, tema)
+            textos = self._completar(prompt, temperatura=temperatura, modelo=modelo, n=n, metricas=metricas)
+            self.cache.agregar_varios(self._clave_cache(categoria, estilo, tema, modelo), textos)
+            return textos + [f"Error: No se pudo generar el texto {inicio + k + 1}." for k in range(len(textos), n)]
+        
+        if textos_por_llamada > 1:
+            tarea, n_tareas = generar_grupo, -(-cantidad // textos_por_llamada)
+        else:
+            tarea, n_tareas = generar_elemento, cantidad
+        
+        resultados: List[List[str]] = [[] for _ in range(n_tareas)]
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrencia, n_tareas))) as executor:
+            futuros = {executor.submit(tarea, i): i for i in range(n_tareas)}
+            for futuro in tqdm(as_completed(futuros), total=n_tareas, desc="Generando textos"):
+                resultados[futuros[futuro]] = futuro.result()
+        textos_generados = [texto for grupo in resultados for texto in grupo]
         
+        self.metricas_ultimo_lote = metricas.resumen()
+        logging.info(f"Métricas del lote: {self.metricas_ultimo_lote}")
         return textos_generados
     
     def guardar_lote(self, textos: List[str], nombre_archivo: str):
@@ -394,10 +505,14 @@ def main():
     parser.add_argument("--modelo", type=str, default="gpt-3.5-turbo",
                         choices=["gpt-3.5-turbo", "gpt-4"],
                         help="Modelo de OpenAI a usar")
+    parser.add_argument("--por-llamada", type=int, default=1,
+                        help="Textos pedidos en cada llamada a la API (parámetro n)")
     parser.add_argument("--salida", type=str, default="textos_generados.txt",
                         help="Nombre del archivo de salida")
     parser.add_argument("--limit", type=int, default=None,
                         help="Límite de textos a cargar del CSV")
+    parser.add_argument("--solo-canonicos", action="store_true",
+                        help="Usar solo un texto por cluster de casi-duplicados (ver deduplicador.py)")
     
     args = parser.parse_args()
     
@@ -410,7 +525,7 @@ def main():
     )
     
     # Cargar datos
-    generador.cargar_datos(limit=args.limit)
+    generador.cargar_datos(limit=args.limit, solo_canonicos=args.solo_canonicos)
     
     # Generar textos
     textos_generados = generador.generar_lote(
@@ -419,7 +534,8 @@ def main():
         estilo=args.estilo,
         tema=args.tema,
         temperatura=args.temperatura,
-        modelo=args.modelo
+        modelo=args.modelo,
+        textos_por_llamada=args.por_llamada
     )
     
     # Guardar textos
@@ -431,6 +547,7 @@ def main():
         print(f"\n{i}. {texto}")
     
     print(f"\nSe generaron {len(textos_generados)} textos en total.")
+    print(f"Métricas: {generador.metricas_ultimo_lote}")
     print(f"Todos los textos están guardados en: {os.path.join(OUTPUT_DIR, args.salida)}")
 
 
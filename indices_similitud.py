@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Índices de búsqueda por similitud para el buscador de textos similares
+
+Todos los índices trabajan sobre una matriz de embeddings normalizados (la
+similitud coseno es el producto escalar) y exponen la misma interfaz:
+
+    indice.buscar(consulta, k, filas=None, **parametros) -> (filas, similitudes)
+    indice.buscar_lote(consultas, k, filas=None, **parametros) -> [(filas, similitudes), ...]
+
+El argumento opcional `filas` (ordenado de menor a mayor) restringe la búsqueda
+a un subconjunto del corpus, p. ej. las filas de ciertas categorías.
+
+- IndiceExacto: producto matriz-vector contra todo el corpus.
+- IndiceIVF: índice de ficheros invertidos (IVF) sobre centroides de k-means
+  esférico. Solo puntúa las listas de los `nprobe` centroides más cercanos a
+  la consulta, por lo que `nprobe` regula el compromiso recall/latencia.
+  Funciona solo con NumPy (CPU) y se guarda en disco junto al almacén de
+  embeddings para no reconstruirlo en cada arranque.
+
+La matriz puede ser un array float32 o una MatrizCuantizada (int8 con una
+escala por vector), que ocupa 4 veces menos memoria y se puntúa directamente
+sin descuantizarla entera.
+"""
+
+import os
+import time
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+NPROBE_POR_DEFECTO = 8
+BLOQUE_CONSULTAS = 256  # Consultas por producto matriz-matriz en las búsquedas por lotes
+
+
+class MatrizCuantizada:
+    """Matriz de embeddings cuantizada a int8 con una escala float32 por fila
+
+    Cada fila se guarda como round(x / escala) con escala = max(|x|) / 127. El
+    producto escalar con una consulta float32 se calcula por bloques de filas,
+    así que nunca se materializa la matriz completa en float32.
+    """
+
+    def __init__(self, valores: np.ndarray, escalas: np.ndarray, bloque: int = 8192):
+        """Inicializa la matriz a partir de sus valores ya cuantizados
+
+        Args:
+            valores: Matriz int8 (filas x dimension)
+            escalas: Escala float32 de cada fila
+            bloque: Filas que se descuantizan a la vez al puntuar
+        """
+        self.valores = valores
+        self.escalas = escalas
+        self.bloque = bloque
+
+    @classmethod
+    def desde_matriz(cls, matriz: np.ndarray, filas: Optional[np.ndarray] = None,
+                     bloque: int = 8192) -> "MatrizCuantizada":
+        """
+        Cuantiza una matriz float (o un subconjunto de sus filas) por bloques
+
+        Args:
+            matriz: Matriz de embeddings (puede estar mapeada en memoria)
+            filas: Filas a cuantizar, en orden (por defecto todas)
+            bloque: Filas procesadas a la vez
+
+        Returns:
+            Matriz cuantizada
+        """
+        n = len(matriz) if filas is None else len(filas)
+        valores = np.empty((n, matriz.shape[1]), dtype=np.int8)
+        escalas = np.empty(n, dtype=np.float32)
+        for i in range(0, n, bloque):
+            seleccion = slice(i, i + bloque) if filas is None else filas[i:i + bloque]
+            datos = np.asarray(matriz[seleccion], dtype=np.float32)
+            maximos = np.abs(datos).max(axis=1)
+            maximos[maximos == 0] = 1.0
+            escalas[i:i + bloque] = maximos / 127.0
+            valores[i:i + bloque] = np.rint(datos / escalas[i:i + bloque, None]).astype(np.int8)
+        return cls(valores, escalas, bloque)
+
+    def __len__(self) -> int:
+        return len(self.valores)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.valores.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.valores.nbytes + self.escalas.nbytes
+
+    def __getitem__(self, seleccion) -> np.ndarray:
+        """Devuelve las filas seleccionadas descuantizadas a float32"""
+        return self.valores[seleccion].astype(np.float32) * self.escalas[seleccion, None]
+
+    def puntuar(self, consultas: np.ndarray, filas: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Calcula el producto escalar de las consultas con las filas de la matriz
+
+        Args:
+            consultas: Vector (dimension) o matriz (n_consultas x dimension) float32
+            filas: Filas a puntuar (por defecto todas)
+
+        Returns:
+            Similitudes con forma (n_filas) o (n_consultas x n_filas)
+        """
+        consultas = np.asarray(consultas, dtype=np.float32)
+        valores = self.valores if filas is None else self.valores[filas]
+        escalas = self.escalas if filas is None else self.escalas[filas]
+        salida = np.empty(consultas.shape[:-1] + (len(valores),), dtype=np.float32)
+        for i in range(0, len(valores), self.bloque):
+            salida[..., i:i + self.bloque] = (
+                (consultas @ valores[i:i + self.bloque].astype(np.float32).T) * escalas[i:i + self.bloque])
+        return salida
+
+
+def puntuar(matriz, consultas: np.ndarray, filas: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Producto escalar de una o varias consultas con (un subconjunto de) la matriz
+
+    Args:
+        matriz: Array float o MatrizCuantizada
+        consultas: Vector (dimension) o matriz (n_consultas x dimension)
+        filas: Filas a puntuar (por defecto todas)
+
+    Returns:
+        Similitudes con forma (n_filas) o (n_consultas x n_filas)
+    """
+    if isinstance(matriz, MatrizCuantizada):
+        return matriz.puntuar(consultas, filas)
+    seleccion = matriz if filas is None else np.asarray(matriz[filas])
+    if np.ndim(consultas) == 1:
+        return seleccion @ consultas
+    return np.asarray(consultas) @ seleccion.T
+
+
+def top_k(similitudes: np.ndarray, k: int) -> np.ndarray:
+    """
+    Devuelve las posiciones de las k mayores similitudes, en orden descendente
+
+    Usa argpartition para no ordenar todo el vector. Los empates se resuelven
+    por posición, igual que un ordenamiento estable.
+
+    Args:
+        similitudes: Vector de similitudes
+        k: Número de posiciones a devolver
+
+    Returns:
+        Array de posiciones ordenadas por similitud descendente
+    """
+    n = len(similitudes)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        candidatos = np.argpartition(-similitudes, k - 1)[:k]
+        # Incluir todos los empatados con el umbral para conservar el desempate
+        umbral = similitudes[candidatos].min()
+        candidatos = np.flatnonzero(similitudes >= umbral)
+    else:
+        candidatos = np.arange(n)
+    orden = np.lexsort((candidatos, -similitudes[candidatos]))
+    return candidatos[orden][:k]
+
+
+class IndiceExacto:
+    """Búsqueda exacta por fuerza bruta sobre la matriz completa"""
+
+    tipo = "exacto"
+
+    def __init__(self, matriz: np.ndarray):
+        self.matriz = matriz
+
+    def buscar(self, consulta: np.ndarray, k: int, filas: Optional[np.ndarray] = None,
+               **parametros) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca las k filas más similares a la consulta
+
+        Args:
+            consulta: Vector normalizado de la consulta
+            k: Número de resultados
+            filas: Filas a las que restringir la búsqueda (por defecto todas)
+
+        Returns:
+            Tupla (filas, similitudes) ordenada por similitud descendente
+        """
+        similitudes = puntuar(self.matriz, consulta, filas)
+        posiciones = top_k(similitudes, k)
+        if filas is None:
+            return posiciones, similitudes[posiciones]
+        return filas[posiciones], similitudes[posiciones]
+
+    def buscar_lote(self, consultas: np.ndarray, k: int, filas: Optional[np.ndarray] = None,
+                    **parametros) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Busca las k filas más similares a cada consulta de un lote
+
+        Puntúa bloques de consultas con un único producto matriz-matriz.
+
+        Args:
+            consultas: Matriz de consultas normalizadas (n_consultas x dimension)
+            k: Número de resultados por consulta
+            filas: Filas a las que restringir la búsqueda (por defecto todas)
+
+        Returns:
+            Lista de tuplas (filas, similitudes), una por consulta
+        """
+        resultados = []
+        for i in range(0, len(consultas), BLOQUE_CONSULTAS):
+            similitudes = puntuar(self.matriz, consultas[i:i + BLOQUE_CONSULTAS], filas)
+            for fila_similitudes in similitudes:
+                posiciones = top_k(fila_similitudes, k)
+                encontradas = posiciones if filas is None else filas[posiciones]
+                resultados.append((encontradas, fila_similitudes[posiciones]))
+        return resultados
+
+
+class IndiceIVF:
+    """Índice aproximado de ficheros invertidos (IVF) sobre k-means esférico"""
+
+    tipo = "ivf"
+
+    def __init__(self, matriz: np.ndarray, centroides: np.ndarray, orden: np.ndarray,
+                 offsets: np.ndarray, huella: str = ""):
+        """Inicializa el índice a partir de sus estructuras ya calculadas
+
+        Args:
+            matriz: Matriz de embeddings normalizados indexada
+            centroides: Centroides normalizados (n_listas x dimension)
+            orden: Filas de la matriz agrupadas por lista
+            offsets: Inicio de cada lista dentro de `orden` (n_listas + 1)
+            huella: Identificador del corpus con el que se construyó
+        """
+        self.matriz = matriz
+        self.centroides = centroides
+        self.orden = orden
+        self.offsets = offsets
+        self.huella = huella
+
+    @property
+    def n_listas(self) -> int:
+        return len(self.centroides)
+
+    @classmethod
+    def construir(cls, matriz: np.ndarray, n_listas: Optional[int] = None, iteraciones: int = 10,
+                  max_entrenamiento: int = 100000, semilla: int = 0, huella: str = "") -> "IndiceIVF":
+        """
+        Construye el índice agrupando la matriz con k-means esférico
+
+        Args:
+            matriz: Matriz de embeddings normalizados
+            n_listas: Número de listas (por defecto ~4·sqrt(n))
+            iteraciones: Iteraciones de k-means
+            max_entrenamiento: Máximo de filas usadas para entrenar los centroides
+            semilla: Semilla aleatoria
+            huella: Identificador del corpus
+
+        Returns:
+            Índice construido
+        """
+        n = len(matriz)
+        if n_listas is None:
+            n_listas = int(4 * np.sqrt(n))
+        n_listas = max(1, min(n_listas, n))
+        rng = np.random.default_rng(semilla)
+
+        inicio = time.time()
+        if n > max_entrenamiento:
+            entrenamiento = np.asarray(matriz[np.sort(rng.choice(n, max_entrenamiento, replace=False))],
+                                       dtype=np.float32)
+        else:
+            entrenamiento = np.asarray(matriz, dtype=np.float32)
+
+        centroides = entrenamiento[rng.choice(len(entrenamiento), n_listas, replace=False)].copy()
+        for _ in range(iteraciones):
+            asignaciones = cls._asignar(entrenamiento, centroides)
+            sumas = np.zeros_like(centroides)
+            conteos = np.bincount(asignaciones, minlength=n_listas)
+            no_vacias = conteos > 0
+            inicios = (np.cumsum(conteos) - conteos)[no_vacias]
+            orden = np.argsort(asignaciones, kind='stable')
+            sumas[no_vacias] = np.add.reduceat(entrenamiento[orden], inicios, axis=0)
+            normas = np.linalg.norm(sumas, axis=1)
+            vacias = normas == 0
+            if vacias.any():
+                # Reiniciar las listas vacías con filas aleatorias
+                sumas[vacias] = entrenamiento[rng.choice(len(entrenamiento), int(vacias.sum()))]
+                normas[vacias] = np.linalg.norm(sumas[vacias], axis=1)
+            normas[normas == 0] = 1.0
+            centroides = (sumas / normas[:, None]).astype(np.float32)
+
+        asignaciones = cls._asignar(matriz, centroides)
+        orden = np.argsort(asignaciones, kind='stable')
+        offsets = np.searchsorted(asignaciones[orden], np.arange(n_listas + 1))
+
+        logging.info(f"Índice IVF construido: {n} vectores, {n_listas} listas "
+                     f"en {time.time() - inicio:.1f}s")
+        return cls(matriz, centroides, orden, offsets, huella)
+
+    @staticmethod
+    def _asignar(matriz: np.ndarray, centroides: np.ndarray, bloque: int = 8192) -> np.ndarray:
+        """Asigna cada fila al centroide más similar, procesando por bloques"""
+        asignaciones = np.empty(len(matriz), dtype=np.int64)
+        for i in range(0, len(matriz), bloque):
+            asignaciones[i:i + bloque] = np.argmax(np.asarray(matriz[i:i + bloque]) @ centroides.T, axis=1)
+        return asignaciones
+
+    def guardar(self, ruta: str):
+        """Guarda las estructuras del índice (no la matriz) en un fichero .npz"""
+        np.savez(ruta, centroides=self.centroides, orden=self.orden, offsets=self.offsets,
+                 huella=np.array(self.huella))
+        logging.info(f"Índice IVF guardado en {ruta}")
+
+    @classmethod
+    def cargar(cls, ruta: str, matriz: np.ndarray, huella: str = "") -> Optional["IndiceIVF"]:
+        """
+        Carga un índice guardado si corresponde al corpus actual
+
+        Args:
+            ruta: Ruta del fichero .npz
+            matriz: Matriz de embeddings normalizados del corpus
+            huella: Identificador del corpus actual
+
+        Returns:
+            Índice cargado, o None si no existe o está desactualizado
+        """
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with np.load(ruta) as datos:
+                if str(datos["huella"]) != huella or len(datos["orden"]) != len(matriz):
+                    logging.info("El índice IVF guardado no corresponde al corpus actual")
+                    return None
+                return cls(matriz, datos["centroides"], datos["orden"], datos["offsets"], huella)
+        except Exception as e:
+            logging.error(f"Error al cargar índice IVF: {e}")
+            return None
+
+    @classmethod
+    def cargar_o_construir(cls, ruta: str, matriz: np.ndarray, huella: str = "", **kwargs) -> "IndiceIVF":
+        """Carga el índice de disco o lo construye y lo guarda si no es válido"""
+        indice = cls.cargar(ruta, matriz, huella)
+        if indice is None:
+            indice = cls.construir(matriz, huella=huella, **kwargs)
+            try:
+                indice.guardar(ruta)
+            except Exception as e:
+                logging.error(f"Error al guardar índice IVF: {e}")
+        return indice
+
+    def buscar(self, consulta: np.ndarray, k: int, nprobe: int = NPROBE_POR_DEFECTO,
+               filas: Optional[np.ndarray] = None, **parametros) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Busca las k filas más similares a la consulta de forma aproximada
+
+        Args:
+            consulta: Vector normalizado de la consulta
+            k: Número de resultados
+            nprobe: Número de listas a explorar (más listas = más recall y más latencia)
+            filas: Filas a las que restringir la búsqueda (por defecto todas)
+
+        Returns:
+            Tupla (filas, similitudes) ordenada por similitud descendente
+        """
+        nprobe = max(1, min(int(nprobe), self.n_listas))
+        if filas is None:
+            listas = top_k(self.centroides @ consulta, nprobe)
+            candidatos = np.sort(np.concatenate(
+                [self.orden[self.offsets[l]:self.offsets[l + 1]] for l in listas]))
+        else:
+            candidatos = self._candidatos_filtrados(consulta, k, nprobe, filas)
+        similitudes = puntuar(self.matriz, consulta, candidatos)
+        posiciones = top_k(similitudes, k)
+        return candidatos[posiciones], similitudes[posiciones]
+
+    def _candidatos_filtrados(self, consulta: np.ndarray, k: int, nprobe: int,
+                              filas: np.ndarray) -> np.ndarray:
+        """
+        Candidatos de una búsqueda restringida a `filas`
+
+        Se exploran al menos `nprobe` listas y, si entre ellas no hay k filas
+        del subconjunto, se siguen explorando las listas siguientes por orden
+        de cercanía hasta reunirlas (o agotar el subconjunto). Así una
+        partición pequeña, repartida por listas que la consulta no visitaría,
+        devuelve igualmente min(k, len(filas)) resultados.
+
+        Returns:
+            Filas candidatas ordenadas
+        """
+        objetivo = min(k, len(filas))
+        listas = np.argsort(-(self.centroides @ consulta))
+        partes = []
+        encontrados = 0
+        for i, lista in enumerate(listas):
+            miembros = self.orden[self.offsets[lista]:self.offsets[lista + 1]]
+            miembros = miembros[np.isin(miembros, filas)]
+            partes.append(miembros)
+            encontrados += len(miembros)
+            if i + 1 >= nprobe and encontrados >= objetivo:
+                break
+        if not partes:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(partes))
+
+    def buscar_lote(self, consultas: np.ndarray, k: int, nprobe: int = NPROBE_POR_DEFECTO,
+                    filas: Optional[np.ndarray] = None, **parametros) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Busca de forma aproximada las k filas más similares a cada consulta de un lote
+
+        Args:
+            consultas: Matriz de consultas normalizadas (n_consultas x dimension)
+            k: Número de resultados por consulta
+            nprobe: Número de listas a explorar por consulta
+            filas: Filas a las que restringir la búsqueda (por defecto todas)
+
+        Returns:
+            Lista de tuplas (filas, similitudes), una por consulta
+        """
+        return [self.buscar(consulta, k, nprobe=nprobe, filas=filas) for consulta in consultas]
+
+
+def evaluar_recall(matriz: np.ndarray, indice, consultas: np.ndarray, k: int = 10,
+                   valores_nprobe: Sequence[int] = (1, 2, 4, 8, 16, 32)) -> List[Dict]:
+    """
+    Mide el recall@k y la latencia de un índice aproximado frente a la búsqueda exacta
+
+    Args:
+        matriz: Matriz de embeddings normalizados del corpus
+        indice: Índice aproximado a evaluar
+        consultas: Matriz de consultas normalizadas
+        k: Número de vecinos a comparar
+        valores_nprobe: Valores de nprobe a probar
+
+    Returns:
+        Lista de diccionarios con nprobe, recall y latencia media por consulta (ms)
+    """
+    exacto = IndiceExacto(matriz)
+    inicio = time.time()
+    referencia = [set(exacto.buscar(q, k)[0].tolist()) for q in consultas]
+    latencia_exacta = (time.time() - inicio) / max(1, len(consultas)) * 1000
+    logging.info(f"Búsqueda exacta: {latencia_exacta:.2f} ms/consulta")
+
+    informe = []
+    for nprobe in valores_nprobe:
+        inicio = time.time()
+        aciertos = 0
+        for q, esperados in zip(consultas, referencia):
+            filas, _ = indice.buscar(q, k, nprobe=nprobe)
+            aciertos += len(esperados.intersection(filas.tolist()))
+        latencia = (time.time() - inicio) / max(1, len(consultas)) * 1000
+        recall = aciertos / max(1, sum(len(r) for r in referencia))
+        informe.append({
+            "nprobe": nprobe,
+            "recall": round(recall, 4),
+            "latencia_ms": round(latencia, 3),
+            "latencia_exacta_ms": round(latencia_exacta, 3)
+        })
+        logging.info(f"nprobe={nprobe}: recall@{k}={recall:.4f}, {latencia:.2f} ms/consulta")
+    return informe
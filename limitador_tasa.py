@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Limitador de tasa para las llamadas a la API de OpenAI
+
+Cubeta de fichas (token bucket) doble: peticiones por minuto y tokens por
+minuto, compartida por todos los hilos del proceso. Sustituye a las pausas
+fijas entre llamadas: cada hilo reserva capacidad antes de llamar y solo
+espera lo necesario.
+
+Ante un error 429 el limitador se adapta: pausa todas las llamadas (el tiempo
+indicado por Retry-After o un backoff exponencial) y reduce la tasa a la
+mitad; cada llamada correcta la recupera poco a poco hasta la configurada.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+# Configuración (ajustable por variables de entorno según el nivel de la cuenta)
+PETICIONES_POR_MINUTO = float(os.environ.get("OPENAI_RPM", 500))
+TOKENS_POR_MINUTO = float(os.environ.get("OPENAI_TPM", 60000))
+BACKOFF_INICIAL = 1.0  # Segundos de pausa tras el primer 429 seguido
+BACKOFF_MAXIMO = 60.0  # Pausa máxima tras varios 429 seguidos
+FACTOR_TASA_MINIMO = 0.1  # La tasa nunca baja de este porcentaje de la configurada
+RECUPERACION_POR_EXITO = 0.05  # Fracción de la tasa configurada que recupera cada llamada correcta
+
+
+class LimitadorTasa:
+    """Limitador de peticiones y tokens por minuto, seguro entre hilos"""
+
+    def __init__(self, peticiones_por_minuto: float = PETICIONES_POR_MINUTO,
+                 tokens_por_minuto: float = TOKENS_POR_MINUTO,
+                 reloj: Callable[[], float] = time.monotonic,
+                 dormir: Callable[[float], None] = time.sleep):
+        """Inicializa el limitador
+
+        Args:
+            peticiones_por_minuto: Peticiones permitidas por minuto
+            tokens_por_minuto: Tokens (entrada + salida) permitidos por minuto
+            reloj: Función que devuelve el instante actual en segundos
+            dormir: Función que espera los segundos indicados
+        """
+        self.peticiones_por_minuto = peticiones_por_minuto
+        self.tokens_por_minuto = tokens_por_minuto
+        self.reloj = reloj
+        self.dormir = dormir
+        self.factor_tasa = 1.0  # Se reduce tras cada 429 y se recupera con las llamadas correctas
+
+        # Las cubetas empiezan llenas: se permite una ráfaga de hasta un minuto de capacidad
+        self._peticiones = peticiones_por_minuto
+        self._tokens = tokens_por_minuto
+        self._ultima_recarga = reloj()
+        self._pausa_hasta = 0.0
+        self._limites_seguidos = 0
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora: float):
+        """Añade a las cubetas la capacidad acumulada desde la última recarga"""
+        transcurrido = ahora - self._ultima_recarga
+        self._ultima_recarga = ahora
+        self._peticiones = min(self.peticiones_por_minuto,
+                               self._peticiones + transcurrido * self.peticiones_por_minuto * self.factor_tasa / 60)
+        self._tokens = min(self.tokens_por_minuto,
+                           self._tokens + transcurrido * self.tokens_por_minuto * self.factor_tasa / 60)
+
+    def adquirir(self, tokens: float = 0):
+        """
+        Espera hasta poder hacer una petición de `tokens` tokens y la reserva
+
+        Args:
+            tokens: Tokens estimados de la petición (entrada + salida máxima)
+        """
+        tokens = min(tokens, self.tokens_por_minuto)  # Una petición enorme no puede bloquear para siempre
+        while True:
+            with self._lock:
+                ahora = self.reloj()
+                self._recargar(ahora)
+                if ahora >= self._pausa_hasta and self._peticiones >= 1 and self._tokens >= tokens:
+                    self._peticiones -= 1
+                    self._tokens -= tokens
+                    return
+                # Tiempo hasta que haya capacidad suficiente en ambas cubetas
+                tasa_peticiones = self.peticiones_por_minuto * self.factor_tasa / 60
+                tasa_tokens = self.tokens_por_minuto * self.factor_tasa / 60
+                espera = max(self._pausa_hasta - ahora,
+                             (1 - self._peticiones) / tasa_peticiones,
+                             (tokens - self._tokens) / tasa_tokens,
+                             0.01)
+            self.dormir(espera)
+
+    def registrar_exito(self):
+        """Registra una llamada correcta y recupera parte de la tasa perdida"""
+        with self._lock:
+            self._limites_seguidos = 0
+            self.factor_tasa = min(1.0, self.factor_tasa + RECUPERACION_POR_EXITO)
+
+    def registrar_limite(self, retry_after: Optional[float] = None) -> float:
+        """
+        Registra un error 429: pausa las llamadas de todos los hilos y reduce la tasa
+
+        Args:
+            retry_after: Segundos indicados por la API en la cabecera Retry-After
+
+        Returns:
+            Segundos de pausa aplicados
+        """
+        with self._lock:
+            ahora = self.reloj()
+            if ahora < self._pausa_hasta:
+                # Otro hilo ya registró este límite: las llamadas que estaban en
+                # vuelo no vuelven a reducir la tasa
+                return self._pausa_hasta - ahora
+            self._limites_seguidos += 1
+            pausa = retry_after if retry_after else min(BACKOFF_MAXIMO,
+                                                        BACKOFF_INICIAL * 2 ** (self._limites_seguidos - 1))
+            self._pausa_hasta = ahora + pausa
+            self.factor_tasa = max(FACTOR_TASA_MINIMO, self.factor_tasa / 2)
+            logging.warning(f"Límite de tasa de la API alcanzado: pausa de {pausa:.1f}s, "
+                            f"tasa reducida al {self.factor_tasa * 100:.0f}%")
+            return pausa
+
+
+def es_error_limite(error: Exception) -> bool:
+    """Indica si una excepción del cliente de OpenAI es un 429 (límite de tasa)"""
+    return getattr(error, "status_code", None) == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Segundos de la cabecera Retry-After de un error de la API, si los indica"""
+    respuesta = getattr(error, "response", None)
+    try:
+        return float(respuesta.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación rápida de tokens de un texto (unos 4 caracteres por token)"""
+    return len(texto) // 4 + 1
+
+
+# Un limitador por modelo, compartido por todas las instancias del proceso
+_LIMITADORES: Dict[str, LimitadorTasa] = {}
+_LOCK_LIMITADORES = threading.Lock()
+
+
+def limitador_para(modelo: str) -> LimitadorTasa:
+    """
+    Devuelve el limitador compartido de un modelo (los límites de OpenAI son por modelo)
+
+    Args:
+        modelo: Nombre del modelo
+
+    Returns:
+        Limitador del modelo
+    """
+    with _LOCK_LIMITADORES:
+        if modelo not in _LIMITADORES:
+            _LIMITADORES[modelo] = LimitadorTasa()
+        return _LIMITADORES[modelo]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pool de textos generados de antemano
+
+Para cada combinación (categoria, estilo, tema, modelo) pedida se mantienen
+en la caché SQLite unos cuantos textos nuevos que todavía no se han servido.
+Una petición saca uno del pool (una transacción local, sin ida y vuelta a
+OpenAI) y nunca recibe un texto ya servido; cuando quedan pocos, unos hilos
+en segundo plano vuelven a llenarlo pidiendo varios textos por llamada
+(parámetro `n` de la API).
+
+Si el pool de una clave está vacío (la primera petición, o más demanda de la
+que da tiempo a reponer), el generador llama a la API como siempre. Solo se
+reponen las claves precalentadas y las que se han pedido más de una vez: un
+tema de texto libre pedido una sola vez no genera llamadas de reposición. Las
+claves pedidas bajo demanda se olvidan en orden LRU al superar MAX_CLAVES_POOL.
+"""
+
+import os
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+TAMANO_POOL = int(os.environ.get("TAMANO_POOL_GENERACION", 10))  # Textos sin servir que se mantienen por clave (0 = sin pool)
+PRECALENTAR_POOL = os.environ.get("PRECALENTAR_POOL_GENERACION", "1") != "0"  # Llenar los pools de las categorías al arrancar
+NIVEL_MINIMO_POOL = 3  # Por debajo de este número de textos disponibles se repone el pool
+TEXTOS_POR_LLAMADA_POOL = 5  # Textos pedidos en cada llamada de reposición
+HILOS_POOL = 2  # Hilos que reponen pools en segundo plano
+PETICIONES_MINIMAS_POOL = 2  # Peticiones de una clave no precalentada a partir de las cuales se repone
+MAX_CLAVES_POOL = int(os.environ.get("MAX_CLAVES_POOL_GENERACION", 256))  # Claves bajo demanda recordadas
+
+
+class PoolGeneracion:
+    """Pool de textos sin servir por clave, repuesto en segundo plano"""
+
+    def __init__(self, generador, tamano: int = TAMANO_POOL, nivel_minimo: int = NIVEL_MINIMO_POOL,
+                 textos_por_llamada: int = TEXTOS_POR_LLAMADA_POOL, hilos: int = HILOS_POOL,
+                 max_claves: int = MAX_CLAVES_POOL):
+        """Inicializa el pool y arranca los hilos de reposición
+
+        Args:
+            generador: GeneradorTextos cuyo corpus, cliente y caché se usan
+            tamano: Textos sin servir que se mantienen por clave
+            nivel_minimo: Número de textos disponibles por debajo del cual se repone
+            textos_por_llamada: Textos pedidos en cada llamada a la API
+            hilos: Hilos de reposición
+            max_claves: Claves bajo demanda que se recuerdan (las más antiguas se olvidan)
+        """
+        self.generador = generador
+        self.tamano = tamano
+        self.nivel_minimo = min(nivel_minimo, tamano)
+        self.textos_por_llamada = textos_por_llamada
+        self.max_claves = max_claves
+
+        # Clave -> (categoria, estilo, tema, temperatura, modelo)
+        self._precalentadas: Dict[str, Tuple] = {}
+        # Claves pedidas bajo demanda, en orden LRU: clave -> (parámetros, número de peticiones)
+        self._bajo_demanda: "OrderedDict[str, Tuple[Tuple, int]]" = OrderedDict()
+        self._pendientes = set()  # Claves en cola o reponiéndose
+        self._cola: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._detenido = threading.Event()
+        self._hilos = [threading.Thread(target=self._reponer_pendientes, name=f"pool-generacion-{i}", daemon=True)
+                       for i in range(hilos)]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def obtener(self, categoria: Optional[str] = None, estilo: Optional[str] = None, tema: Optional[str] = None,
+                temperatura: float = 0.7, modelo: str = "gpt-3.5-turbo") -> Optional[str]:
+        """
+        Saca un texto sin servir del pool y pide reponerlo si quedan pocos
+
+        Args:
+            categoria: Categoría de textos a usar como ejemplos
+            estilo: Estilo deseado para el texto
+            tema: Tema específico para el texto
+            temperatura: Temperatura con la que se repone el pool de esta clave
+            modelo: Modelo de OpenAI a usar
+
+        Returns:
+            Texto generado de antemano o None si el pool de esta clave está vacío
+        """
+        clave = self.generador._clave_cache(categoria, estilo, tema, modelo)
+        with self._lock:
+            if clave in self._precalentadas:
+                reponible = True
+            else:
+                _, peticiones = self._bajo_demanda.pop(clave, (None, 0))
+                self._bajo_demanda[clave] = ((categoria, estilo, tema, temperatura, modelo), peticiones + 1)
+                reponible = peticiones + 1 >= PETICIONES_MINIMAS_POOL
+                while len(self._bajo_demanda) > self.max_claves:
+                    self._bajo_demanda.popitem(last=False)
+
+        texto = self.generador.cache.consumir(clave)
+        if reponible and self.generador.cache.disponibles(clave) < self.nivel_minimo:
+            self.solicitar_reposicion(clave)
+        return texto
+
+    def precalentar(self, categorias: List[Optional[str]], temperatura: float = 0.7,
+                    modelo: str = "gpt-3.5-turbo"):
+        """
+        Llena en segundo plano los pools de varias categorías sin estilo ni tema
+
+        Solo se reponen las claves sin ningún texto disponible en la caché
+        compartida: si otro worker ya las llenó (o siguen llenas del arranque
+        anterior), arrancar no cuesta llamadas a la API.
+
+        Args:
+            categorias: Categorías a precalentar (None = sin categoría)
+            temperatura: Temperatura de generación
+            modelo: Modelo de OpenAI a usar
+        """
+        for categoria in categorias:
+            clave = self.generador._clave_cache(categoria, None, None, modelo)
+            with self._lock:
+                self._precalentadas.setdefault(clave, (categoria, None, None, temperatura, modelo))
+                self._bajo_demanda.pop(clave, None)
+            if self.generador.cache.disponibles(clave) == 0:
+                self.solicitar_reposicion(clave)
+
+    def solicitar_reposicion(self, clave: str):
+        """Encola la reposición de una clave si no está ya en cola"""
+        with self._lock:
+            if clave in self._pendientes or self._detenido.is_set() or \
+                    (clave not in self._precalentadas and clave not in self._bajo_demanda):
+                return
+            self._pendientes.add(clave)
+        self._cola.put(clave)
+
+    def _reponer_pendientes(self):
+        """Bucle de los hilos de reposición"""
+        while True:
+            clave = self._cola.get()
+            if clave is None:
+                return
+            try:
+                self._reponer(clave)
+            except Exception as e:
+                logging.error(f"Error al reponer el pool de generación '{clave}': {e}")
+            finally:
+                with self._lock:
+                    self._pendientes.discard(clave)
+
+    def _reponer(self, clave: str):
+        """Genera textos para una clave hasta llenar su pool"""
+        with self._lock:
+            if clave in self._precalentadas:
+                parametros = self._precalentadas[clave]
+            elif clave in self._bajo_demanda:
+                parametros = self._bajo_demanda[clave][0]
+            else:
+                return  # Olvidada mientras esperaba en la cola
+        categoria, estilo, tema, temperatura, modelo = parametros
+        while not self._detenido.is_set():
+            faltan = self.tamano - self.generador.cache.disponibles(clave)
+            if faltan <= 0:
+                return
+            # Cada llamada usa ejemplos nuevos del corpus para no repetir el mismo prompt
+            prompt = self.generador._construir_prompt(categoria, estilo, tema)
+            textos = self.generador._completar(prompt, temperatura=temperatura, modelo=modelo,
+                                               n=min(self.textos_por_llamada, faltan))
+            if not textos:
+                logging.warning(f"No se pudo reponer el pool de generación '{clave}'")
+                return
+            self.generador.cache.agregar_varios(clave, textos, consumido=False)
+            logging.info(f"Pool de generación '{clave}': {len(textos)} textos nuevos")
+
+    def detener(self):
+        """Detiene los hilos de reposición (las llamadas en curso terminan)"""
+        self._detenido.set()
+        for _ in self._hilos:
+            self._cola.put(None)
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Servidor local compatible con la API de OpenAI para pruebas sin conexión
+
+Implementa el subconjunto de la API que usan el clasificador y el generador:
+chat completions (con `n`), subida y descarga de ficheros y la Batch API. Las
+respuestas son deterministas y no cuestan nada: los textos se clasifican por
+palabras clave y los textos generados son marcadores numerados. Permite
+simular errores 429 en las llamadas interactivas y peticiones fallidas en
+los trabajos por lotes, para probar el pipeline completo de envío, sondeo y
+fusión con volúmenes reales.
+
+Uso:
+    python servidor_openai_falso.py --puerto 8089 --tasa-fallos 0.05 --retardo 5
+    python clasificador_textos_ai.py --batch-api --base-url http://127.0.0.1:8089/v1 --intervalo-sondeo 1
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from flask import Flask, Response, jsonify, request
+from typing import Any, Dict, List
+
+from clasificador_palabras_clave import CATEGORIAS_AI, ClasificadorPalabrasClave
+
+PUERTO = 8089
+PATRON_TEXTO = re.compile(r'^Texto: "(.*)"$', re.MULTILINE | re.DOTALL)
+PATRON_GRUPO = re.compile(r"\(objeto JSON de identificador a texto\):\n(.*?)\n\nResponde", re.DOTALL)
+
+app = Flask(__name__)
+
+# Estado en memoria del servidor
+configuracion = {"tasa_fallos": 0.0, "tasa_429": 0.0, "retardo": 1.0}
+ficheros: Dict[str, Dict[str, Any]] = {}  # id -> metadatos + contenido
+trabajos: Dict[str, Dict[str, Any]] = {}  # id -> objeto batch
+_lock = threading.Lock()
+_clasificador = ClasificadorPalabrasClave()
+_contador_generados = 0
+
+
+def _id(prefijo: str) -> str:
+    """Identificador con el formato de OpenAI"""
+    return f"{prefijo}_{uuid.uuid4().hex[:24]}"
+
+
+def _tokens(texto: str) -> int:
+    """Tokens aproximados de un texto"""
+    return len(texto) // 4 + 1
+
+
+def _categoria(texto: str) -> str:
+    """Categoría del clasificador para un texto, por palabras clave ("otro" si no hay equivalente)"""
+    categoria = _clasificador.clasificar(texto)
+    return CATEGORIAS_AI.get(categoria) or "otro"
+
+
+def _responder(prompt: str) -> str:
+    """Contenido de la respuesta a un prompt del clasificador o del generador"""
+    global _contador_generados
+    grupo = PATRON_GRUPO.search(prompt)
+    if grupo:
+        textos = json.loads(grupo.group(1))
+        return json.dumps({i: _categoria(texto) for i, texto in textos.items()}, ensure_ascii=False)
+    texto = PATRON_TEXTO.search(prompt)
+    if texto:
+        return _categoria(texto.group(1))
+    with _lock:
+        _contador_generados += 1
+        return f"Texto generado {_contador_generados}"
+
+
+def _completar(cuerpo: Dict[str, Any]) -> Dict[str, Any]:
+    """Cuerpo de respuesta de /v1/chat/completions para una petición"""
+    prompt = "\n".join(m.get("content", "") for m in cuerpo.get("messages", []))
+    contenidos = [_responder(prompt) for _ in range(cuerpo.get("n", 1))]
+    return {
+        "id": _id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": cuerpo.get("model", "gpt-3.5-turbo"),
+        "choices": [{"index": i, "message": {"role": "assistant", "content": contenido}, "finish_reason": "stop"}
+                    for i, contenido in enumerate(contenidos)],
+        "usage": {
+            "prompt_tokens": _tokens(prompt),
+            "completion_tokens": sum(_tokens(c) for c in contenidos),
+            "total_tokens": _tokens(prompt) + sum(_tokens(c) for c in contenidos)
+        }
+    }
+
+
+def _guardar_fichero(contenido: bytes, nombre: str, proposito: str) -> Dict[str, Any]:
+    """Guarda un fichero en memoria y devuelve sus metadatos"""
+    fichero = {
+        "id": _id("file"),
+        "object": "file",
+        "bytes": len(contenido),
+        "created_at": int(time.time()),
+        "filename": nombre,
+        "purpose": proposito,
+        "status": "processed"
+    }
+    with _lock:
+        ficheros[fichero["id"]] = {**fichero, "contenido": contenido}
+    return fichero
+
+
+def _procesar_trabajo(batch_id: str):
+    """Ejecuta un trabajo por lotes en segundo plano"""
+    with _lock:
+        trabajo = trabajos[batch_id]
+        lineas = ficheros[trabajo["input_file_id"]]["contenido"].decode("utf-8").splitlines()
+    peticiones: List[Dict[str, Any]] = [json.loads(linea) for linea in lineas if linea.strip()]
+
+    with _lock:
+        trabajo.update(status="in_progress", in_progress_at=int(time.time()),
+                       request_counts={"total": len(peticiones), "completed": 0, "failed": 0})
+    time.sleep(configuracion["retardo"])
+
+    salida, errores = [], []
+    for peticion in peticiones:
+        resultado = {"id": _id("batch_req"), "custom_id": peticion["custom_id"]}
+        if random.random() < configuracion["tasa_fallos"]:
+            resultado["response"] = {"status_code": 500, "request_id": _id("req"),
+                                     "body": {"error": {"message": "Error simulado", "type": "server_error"}}}
+            resultado["error"] = None
+            errores.append(resultado)
+        else:
+            resultado["response"] = {"status_code": 200, "request_id": _id("req"),
+                                     "body": _completar(peticion["body"])}
+            resultado["error"] = None
+            salida.append(resultado)
+
+    with _lock:
+        trabajo.update(status="finalizing", finalizing_at=int(time.time()))
+    ficheros_resultado = {}
+    for clave, resultados in (("output_file_id", salida), ("error_file_id", errores)):
+        if resultados:
+            contenido = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resultados).encode("utf-8")
+            ficheros_resultado[clave] = _guardar_fichero(contenido, f"{batch_id}_{clave}.jsonl", "batch_output")["id"]
+    with _lock:
+        trabajo.update(status="completed", completed_at=int(time.time()),
+                       request_counts={"total": len(peticiones), "completed": len(salida), "failed": len(errores)},
+                       **ficheros_resultado)
+    logging.info(f"Trabajo {batch_id} completado: {len(salida)} correctas, {len(errores)} fallidas")
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    """Chat completions (con errores 429 simulados)"""
+    if random.random() < configuracion["tasa_429"]:
+        respuesta = jsonify({"error": {"message": "Rate limit simulado", "type": "rate_limit_error"}})
+        respuesta.status_code = 429
+        respuesta.headers["retry-after"] = "1"
+        return respuesta
+    return jsonify(_completar(request.get_json()))
+
+
+@app.route('/v1/files', methods=['POST'])
+def subir_fichero():
+    """Subida de un fichero (multipart, como el cliente de OpenAI)"""
+    fichero = request.files["file"]
+    return jsonify(_guardar_fichero(fichero.read(), fichero.filename or "fichero.jsonl",
+                                    request.form.get("purpose", "batch")))
+
+
+@app.route('/v1/files/<fichero_id>', methods=['GET'])
+def obtener_fichero(fichero_id):
+    """Metadatos de un fichero"""
+    with _lock:
+        fichero = ficheros.get(fichero_id)
+    if fichero is None:
+        return jsonify({"error": {"message": "Fichero no encontrado"}}), 404
+    return jsonify({k: v for k, v in fichero.items() if k != "contenido"})
+
+
+@app.route('/v1/files/<fichero_id>/content', methods=['GET'])
+def contenido_fichero(fichero_id):
+    """Contenido de un fichero"""
+    with _lock:
+        fichero = ficheros.get(fichero_id)
+    if fichero is None:
+        return jsonify({"error": {"message": "Fichero no encontrado"}}), 404
+    return Response(fichero["contenido"], mimetype="application/jsonl")
+
+
+@app.route('/v1/batches', methods=['POST'])
+def crear_trabajo():
+    """Crea un trabajo por lotes y lo ejecuta en segundo plano"""
+    datos = request.get_json()
+    with _lock:
+        if datos.get("input_file_id") not in ficheros:
+            return jsonify({"error": {"message": "Fichero de entrada no encontrado"}}), 400
+    trabajo = {
+        "id": _id("batch"),
+        "object": "batch",
+        "endpoint": datos.get("endpoint", "/v1/chat/completions"),
+        "input_file_id": datos["input_file_id"],
+        "completion_window": datos.get("completion_window", "24h"),
+        "status": "validating",
+        "created_at": int(time.time()),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        "metadata": datos.get("metadata")
+    }
+    with _lock:
+        trabajos[trabajo["id"]] = trabajo
+    threading.Thread(target=_procesar_trabajo, args=(trabajo["id"],), daemon=True).start()
+    return jsonify(trabajo)
+
+
+@app.route('/v1/batches/<batch_id>', methods=['GET'])
+def obtener_trabajo(batch_id):
+    """Estado de un trabajo por lotes"""
+    with _lock:
+        trabajo = trabajos.get(batch_id)
+        if trabajo is None:
+            return jsonify({"error": {"message": "Trabajo no encontrado"}}), 404
+        return jsonify(dict(trabajo))
+
+
+def main():
+    """Función principal"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Servidor local compatible con la API de OpenAI para pruebas")
+    parser.add_argument("--puerto", type=int, default=PUERTO,
+                        help="Puerto en el que escuchar")
+    parser.add_argument("--tasa-fallos", type=float, default=0.0,
+                        help="Fracción de peticiones de los trabajos por lotes que fallan")
+    parser.add_argument("--tasa-429", type=float, default=0.0,
+                        help="Fracción de llamadas interactivas que devuelven un 429")
+    parser.add_argument("--retardo", type=float, default=1.0,
+                        help="Segundos que tarda en procesarse cada trabajo por lotes")
+    parser.add_argument("--semilla", type=int, default=None,
+                        help="Semilla de los fallos simulados")
+
+    args = parser.parse_args()
+
+    random.seed(args.semilla)
+    configuracion.update(tasa_fallos=args.tasa_fallos, tasa_429=args.tasa_429, retardo=args.retardo)
+    print(f"Servidor compatible con OpenAI en http://127.0.0.1:{args.puerto}/v1")
+    app.run(host="127.0.0.1", port=args.puerto, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -500,14 +500,20 @@ async function inicializarBuscador() {
     loadingElement.innerHTML = '<div class="spinner-border text-primary" role="status"></div><p>Inicializando buscador de textos similares por primera vez...</p><p class="text-muted">Esto puede tardar unos momentos pero solo ocurre una vez.</p>';
     
     try {
-        // Enviar solicitud al servidor
-        const response = await fetch('/inicializar_buscador');
+        // El buscador se construye en segundo plano: consultar hasta que esté listo
+        let response = await fetch('/inicializar_buscador');
+        while (response.status === 202) {
+            const espera = parseInt(response.headers.get('Retry-After') || '5', 10);
+            await new Promise(resolve => setTimeout(resolve, espera * 1000));
+            response = await fetch('/inicializar_buscador');
+        }
         
+        const data = await response.json();
         if (!response.ok) {
-            throw new Error('Error al inicializar el buscador');
+            // Cualquier respuesta distinta de 202 termina la espera (p. ej. 503 si la construcción falló)
+            throw new Error(data.error || 'Error al inicializar el buscador');
         }
         
-        const data = await response.json();
         buscadorInicializado = true;
         
         // Mostrar notificación de éxito
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del almacén binario de embeddings: finales incompletos, reanudación y varios procesos"""
+
+import os
+
+import numpy as np
+
+from almacen_embeddings import TAMANO_HASH, AlmacenEmbeddings
+
+DIMENSION = 8
+
+
+def _vectores(n: int, inicio: int = 0) -> np.ndarray:
+    return np.arange(inicio * DIMENSION, (inicio + n) * DIMENSION, dtype=np.float32).reshape(n, DIMENSION)
+
+
+def test_final_incompleto_se_ignora_y_se_descarta_al_escribir(tmp_path):
+    base = str(tmp_path / "almacen")
+    almacen = AlmacenEmbeddings(base)
+    almacen.agregar(["a", "b", "c"], _vectores(3))
+
+    # Escritura interrumpida: media fila de vectores y un hash a medias
+    with open(almacen.ruta_matriz, 'ab') as f:
+        f.write(b"\x00" * (DIMENSION * 4 // 2))
+    with open(almacen.ruta_indice, 'ab') as f:
+        f.write(b"\x01" * (TAMANO_HASH - 3))
+
+    reabierto = AlmacenEmbeddings(base)
+    assert len(reabierto) == 3
+    np.testing.assert_array_equal(reabierto.obtener("c"), _vectores(1, 2)[0])
+
+    assert reabierto.agregar(["d"], _vectores(1, 3)) == 1
+    assert os.path.getsize(reabierto.ruta_matriz) == 4 * DIMENSION * 4
+    assert os.path.getsize(reabierto.ruta_indice) == 4 * TAMANO_HASH
+    np.testing.assert_array_equal(AlmacenEmbeddings(base).matriz, _vectores(4))
+
+
+def test_vectores_sin_hash_no_son_visibles_y_se_reescriben(tmp_path):
+    base = str(tmp_path / "almacen")
+    almacen = AlmacenEmbeddings(base)
+    almacen.agregar(["a"], _vectores(1))
+    # El proceso murió después de escribir los vectores y antes de escribir su hash
+    with open(almacen.ruta_matriz, 'ab') as f:
+        f.write(np.full(DIMENSION, -1, dtype=np.float32).tobytes())
+
+    reabierto = AlmacenEmbeddings(base)
+    assert len(reabierto) == 1
+    assert "b" not in reabierto
+    reabierto.agregar(["b"], _vectores(1, 1))
+    np.testing.assert_array_equal(AlmacenEmbeddings(base).obtener("b"), _vectores(1, 1)[0])
+
+
+def test_reanudar_no_duplica_filas(tmp_path):
+    base = str(tmp_path / "almacen")
+    AlmacenEmbeddings(base).agregar(["a", "b"], _vectores(2))
+
+    reabierto = AlmacenEmbeddings(base)
+    assert reabierto.agregar(["a", "b", "c"], _vectores(3)) == 1
+    assert reabierto.obtener_filas(["c", "a", "x"]).tolist() == [2, 0, -1]
+
+
+def test_ve_las_filas_que_anade_otro_proceso(tmp_path):
+    base = str(tmp_path / "almacen")
+    worker_1 = AlmacenEmbeddings(base)
+    worker_2 = AlmacenEmbeddings(base)  # Abierto antes de que exista ninguna fila
+
+    worker_1.agregar(["a", "b"], _vectores(2))
+
+    assert "a" in worker_2
+    assert worker_2.obtener_filas(["b"]).tolist() == [1]
+    assert worker_2.agregar(["a", "b"], _vectores(2)) == 0
+    assert os.path.getsize(worker_2.ruta_indice) == 2 * TAMANO_HASH
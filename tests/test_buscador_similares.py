@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas de la caché de consultas y del precálculo de embeddings del buscador de textos similares"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import buscador_similares
+from buscador_similares import BuscadorTextosSimilares, CacheLRU
+
+DIMENSION = 8
+
+
+class Reloj:
+    """Reloj manual para controlar la caducidad"""
+
+    def __init__(self):
+        self.ahora = 0.0
+
+    def __call__(self) -> float:
+        return self.ahora
+
+
+def test_cache_lru_descarta_la_entrada_menos_usada():
+    cache = CacheLRU(tamano_maximo=2, ttl=0)
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    assert cache.obtener("a") == 1  # "b" pasa a ser la menos usada
+
+    cache.guardar("c", 3)
+    assert cache.obtener("b") is None
+    assert (cache.obtener("a"), cache.obtener("c")) == (1, 3)
+
+    # Reescribir una clave también la marca como usada
+    cache.guardar("a", 10)
+    cache.guardar("d", 4)
+    assert cache.obtener("c") is None
+    assert (cache.obtener("a"), cache.obtener("d"), len(cache)) == (10, 4, 2)
+
+
+def test_cache_lru_caduca_las_entradas():
+    reloj = Reloj()
+    cache = CacheLRU(tamano_maximo=10, ttl=60, reloj=reloj)
+    cache.guardar("a", 1)
+    reloj.ahora = 30
+    cache.guardar("b", 2)
+
+    reloj.ahora = 60
+    assert cache.obtener("a") == 1
+    reloj.ahora = 61
+    assert cache.obtener("a") is None
+    assert len(cache) == 1  # La entrada caducada se elimina al leerla
+    assert cache.obtener("b") == 2
+    reloj.ahora = 91
+    assert cache.obtener("b") is None
+
+
+def test_cache_lru_desactivada():
+    cache = CacheLRU(tamano_maximo=0)
+    cache.guardar("a", 1)
+    assert cache.obtener("a") is None
+    assert len(cache) == 0
+
+
+class ModeloFalso:
+    """Modelo determinista que cuenta los textos codificados y puede fallar tras varios lotes"""
+
+    fallar_tras = None  # Llamadas a encode antes de lanzar una excepción (None = nunca)
+
+    def __init__(self, nombre: str):
+        self.codificados = []
+
+    def encode(self, textos, batch_size=32, normalize_embeddings=False):
+        if self.fallar_tras is not None and len(self.codificados) >= self.fallar_tras:
+            raise RuntimeError("Proceso interrumpido")
+        self.codificados.append(list(textos))
+        vectores = np.array([[hash((t, i)) % 1000 + 1 for i in range(DIMENSION)] for t in textos], dtype=np.float32)
+        return vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """CSV de 20 textos y ruta del caché de embeddings, con el modelo sustituido por ModeloFalso"""
+    monkeypatch.setattr(buscador_similares, "SentenceTransformer", ModeloFalso)
+    csv_path = tmp_path / "textos.csv"
+    pd.DataFrame({"texto": [f"texto {i}" for i in range(20)], "categoria": "otro"}).to_csv(csv_path, index=False)
+    return str(csv_path), str(tmp_path / "embeddings.json")
+
+
+def _buscador(corpus) -> BuscadorTextosSimilares:
+    csv_path, cache_file = corpus
+    buscador = BuscadorTextosSimilares(csv_path=csv_path, cache_file=cache_file)
+    buscador.cargar_datos(precalcular_embeddings=False)
+    return buscador
+
+
+def test_precalculo_interrumpido_se_reanuda_desde_el_ultimo_segmento(corpus, monkeypatch):
+    monkeypatch.setattr(ModeloFalso, "fallar_tras", 2)
+    interrumpido = _buscador(corpus)
+    with pytest.raises(RuntimeError):
+        interrumpido.precalcular_embeddings(tamano_segmento=6)
+    assert len(interrumpido.almacen) == 12  # Dos segmentos completos
+
+    monkeypatch.setattr(ModeloFalso, "fallar_tras", None)
+    reanudado = _buscador(corpus)
+    reanudado.precalcular_embeddings(tamano_segmento=6)
+
+    codificados = [t for lote in reanudado.model.codificados for t in lote]
+    assert sorted(codificados) == sorted(f"texto {i}" for i in range(12, 20))
+    assert len(reanudado.almacen) == 20
+    assert (reanudado.almacen.obtener_filas(reanudado.df["texto"].tolist()) >= 0).all()
+
+    # Con todo precalculado no se vuelve a codificar nada
+    completo = _buscador(corpus)
+    completo.precalcular_embeddings(tamano_segmento=6)
+    assert completo.model.codificados == []
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas de la caché SQLite de textos generados, de su pool de textos sin servir y de la migración del JSON"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_generacion import CacheGeneracion, abrir_cache
+
+
+def _cache(tmp_path) -> CacheGeneracion:
+    return CacheGeneracion(str(tmp_path / "cache.sqlite3"), compactar_cada=0)
+
+
+def test_consumir_sirve_cada_texto_una_vez(tmp_path):
+    cache = _cache(tmp_path)
+    cache.agregar_varios("clave", ["a", "b"], consumido=False)
+
+    assert [cache.consumir("clave"), cache.consumir("clave"), cache.consumir("clave")] == ["a", "b", None]
+    assert cache.disponibles("clave") == 0
+
+
+def test_texto_servido_y_regenerado_no_se_vuelve_a_servir(tmp_path):
+    cache = _cache(tmp_path)
+    cache.agregar("clave", "repetido", consumido=False)
+    assert cache.consumir("clave") == "repetido"
+
+    # El pool genera otra vez el mismo texto: no debe quedar disponible
+    cache.agregar_varios("clave", ["repetido", "nuevo"], consumido=False)
+    assert cache.disponibles("clave") == 1
+
+    cache.compactar()
+    assert cache.obtener("clave") == ["repetido", "nuevo"]
+    assert cache.consumir("clave") == "nuevo"
+    assert cache.consumir("clave") is None
+
+
+def test_compactar_conserva_la_fila_servida(tmp_path):
+    cache = _cache(tmp_path)
+    # Duplicado sin servir más antiguo que el servido (p. ej. una base escrita por una versión anterior)
+    with cache._conexion() as conexion:
+        conexion.executemany("INSERT INTO textos (clave, texto, creado, consumido) VALUES (?, ?, 0, ?)",
+                             [("clave", "repetido", 0), ("clave", "repetido", 1)])
+
+    assert cache.compactar() == 1
+    assert cache.disponibles("clave") == 0
+    assert cache.consumir("clave") is None
+
+
+def test_importar_json_solo_una_vez(tmp_path):
+    ruta_json = tmp_path / "cache_generador.json"
+    ruta_json.write_text(json.dumps({"amor": ["a", "b", ""], "humor": ["c"]}), encoding="utf-8")
+
+    # Varios workers arrancan a la vez con la base vacía
+    caches = [CacheGeneracion(str(tmp_path / "cache_generador.sqlite3"), compactar_cada=0) for _ in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        importados = list(executor.map(lambda cache: cache.importar_json(str(ruta_json)), caches))
+
+    assert sorted(importados) == [0, 0, 0, 3]
+    assert len(caches[0]) == 3
+    assert caches[0].obtener("amor") == ["a", "b"]
+    # Los textos importados ya se sirvieron: no forman parte del pool
+    assert caches[0].disponibles("amor") == 0
+
+    # Reabrir la caché no vuelve a importar el JSON
+    assert len(abrir_cache(str(ruta_json))) == 3
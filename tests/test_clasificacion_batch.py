@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del modo Batch API del clasificador contra servidor_openai_falso.py (envío, sondeo y fusión)"""
+
+import os
+import json
+import random
+import threading
+
+import pandas as pd
+import pytest
+from werkzeug.serving import make_server
+
+import servidor_openai_falso
+from clasificador_textos_ai import ClasificadorTextos
+
+NUM_TEXTOS = 60
+
+
+@pytest.fixture
+def servidor():
+    """Servidor falso en un hilo; devuelve su URL base"""
+    servidor_openai_falso.configuracion.update(tasa_fallos=0.0, tasa_429=0.0, retardo=0.0)
+    random.seed(0)
+    http = make_server("127.0.0.1", 0, servidor_openai_falso.app, threaded=True)
+    hilo = threading.Thread(target=http.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{http.server_port}/v1"
+    http.shutdown()
+    hilo.join()
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    """Corpus de prueba y ficheros de salida del clasificador"""
+    csv_path = tmp_path / "textos.csv"
+    pd.DataFrame({
+        "ruta": [f"img_{i}.jpg" for i in range(NUM_TEXTOS)],
+        "carpeta": "cuenta",
+        "texto": [f"Texto de prueba número {i} sobre el amor y la vida" for i in range(NUM_TEXTOS)],
+    }).to_csv(csv_path, index=False)
+    return {
+        "csv_path": str(csv_path),
+        "output_csv": str(tmp_path / "categorizado.csv"),
+        "cache_file": str(tmp_path / "cache.json"),
+        "estado_file": str(tmp_path / "clasificacion_batch.json"),
+        "ruta_jsonl": str(tmp_path / "clasificacion_batch.jsonl"),
+    }
+
+
+def _clasificador(servidor: str, rutas) -> ClasificadorTextos:
+    clasificador = ClasificadorTextos(api_key="x", csv_path=rutas["csv_path"], output_csv=rutas["output_csv"],
+                                      cache_file=rutas["cache_file"], base_url=servidor)
+    clasificador.cargar_datos()
+    return clasificador
+
+
+def _procesar(clasificador: ClasificadorTextos, rutas):
+    return clasificador.procesar_batch(intervalo=0.05, estado_file=rutas["estado_file"],
+                                       ruta_jsonl=rutas["ruta_jsonl"])
+
+
+def test_fallos_parciales_quedan_pendientes_y_solo_ellos_se_reenvian(servidor, rutas):
+    servidor_openai_falso.configuracion["tasa_fallos"] = 0.3
+    resumen = _procesar(_clasificador(servidor, rutas), rutas)
+
+    assert resumen["fallidas"] > 0
+    assert resumen["asignados"] + resumen["fallidas"] == NUM_TEXTOS
+    guardado = pd.read_csv(rutas["output_csv"])
+    assert guardado["categoria"].isna().sum() == resumen["fallidas"]
+    assert set(guardado["origen_categoria"].dropna()) == {"batch"}
+
+    # Una segunda ejecución solo envía los textos que fallaron
+    servidor_openai_falso.configuracion["tasa_fallos"] = 0.0
+    clasificador = _clasificador(servidor, rutas)
+    pendientes = set(guardado.loc[guardado["categoria"].isna(), "texto"])
+    assert clasificador.crear_lote_batch(rutas["ruta_jsonl"]) == resumen["fallidas"]
+    with open(rutas["ruta_jsonl"], encoding="utf-8") as f:
+        prompts = [json.loads(linea)["body"]["messages"][0]["content"] for linea in f]
+    enviados = {servidor_openai_falso.PATRON_TEXTO.search(prompt).group(1) for prompt in prompts}
+    assert enviados == pendientes
+
+    segundo = _procesar(clasificador, rutas)
+    assert segundo == {"asignados": resumen["fallidas"], "fallidas": 0}
+    assert pd.read_csv(rutas["output_csv"])["categoria"].notna().all()
+
+
+def test_ejecucion_interrumpida_reanuda_el_sondeo_del_mismo_trabajo(servidor, rutas):
+    # Primera ejecución: envía el trabajo y se interrumpe antes de sondear
+    clasificador = _clasificador(servidor, rutas)
+    clasificador.crear_lote_batch(rutas["ruta_jsonl"])
+    batch_id = clasificador.enviar_lote_batch(rutas["ruta_jsonl"], rutas["estado_file"])
+    with open(rutas["estado_file"], encoding="utf-8") as f:
+        assert json.load(f)["batch_id"] == batch_id
+    trabajos = len(servidor_openai_falso.trabajos)
+
+    # Segunda ejecución: no crea otro trabajo, sondea y fusiona el guardado
+    resumen = _procesar(_clasificador(servidor, rutas), rutas)
+
+    assert len(servidor_openai_falso.trabajos) == trabajos
+    assert resumen == {"asignados": NUM_TEXTOS, "fallidas": 0}
+    assert pd.read_csv(rutas["output_csv"])["categoria"].notna().all()
+    assert not os.path.exists(rutas["estado_file"])
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del entrenamiento del clasificador local de embeddings"""
+
+import numpy as np
+import pandas as pd
+
+from clasificador_textos_ai import ClasificadorTextos, particion_validacion
+
+
+def _clasificador(tmp_path, df: pd.DataFrame) -> ClasificadorTextos:
+    clasificador = ClasificadorTextos(api_key="x", csv_path=str(tmp_path / "textos.csv"),
+                                      output_csv=str(tmp_path / "categorizado.csv"),
+                                      cache_file=str(tmp_path / "cache.json"))
+    clasificador.df = df
+    return clasificador
+
+
+def test_particion_mantiene_cada_cluster_en_un_lado():
+    clusters = [0, 0, 0, 1, 1, 2, 2, 2, 2] + [np.nan] * 40
+    etiquetados = pd.DataFrame({"texto": [f"t{i}" for i in range(len(clusters))], "cluster_id": clusters})
+
+    for semilla in range(20):
+        validacion = particion_validacion(etiquetados, 0.3, semilla)
+        for cluster in (0, 1, 2):
+            lado = validacion[etiquetados["cluster_id"].to_numpy() == cluster]
+            assert lado.all() or not lado.any()
+        # Los textos sin cluster no forman un único grupo
+        sin_cluster = validacion[etiquetados["cluster_id"].isna().to_numpy()]
+        assert 0 < sin_cluster.sum() < len(sin_cluster)
+
+
+def test_particion_sin_columna_de_clusters_reparte_por_texto():
+    etiquetados = pd.DataFrame({"texto": [f"t{i}" for i in range(100)]})
+    assert particion_validacion(etiquetados, 0.2, 0).sum() == 20
+
+
+def test_sin_etiquetas_de_la_api_no_clasifica_en_local(tmp_path):
+    # Etiquetas de dos categorías, pero solo las de palabras clave y las locales no sirven para entrenar
+    df = pd.DataFrame({
+        "texto": ["te quiero", "jaja", "hoy llueve", "nuevo texto"],
+        "categoria": ["amor_relaciones", "humor_entretenimiento", "vida_cotidiana", None],
+        "origen_categoria": ["api", "palabras_clave", "local", None],
+    }, dtype=object)
+    clasificador = _clasificador(tmp_path, df)
+
+    assert clasificador.clasificar_local() == 0
+    assert clasificador.clasificador_local is None
+    assert clasificador.df["categoria"].isna().sum() == 1
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del clasificador por palabras clave y de su uso como preclasificador"""
+
+from clasificador_palabras_clave import CATEGORIAS, ClasificadorPalabrasClave
+
+
+def test_cada_palabra_clave_pertenece_a_una_sola_categoria():
+    clasificador = ClasificadorPalabrasClave()
+    repetidas = {p: c for p, c in clasificador.categorias_palabra.items() if len(c) > 1}
+    assert repetidas == {}
+
+
+def test_limites_de_palabra():
+    clasificador = ClasificadorPalabrasClave()
+    assert clasificador.clasificar("I lost my glove") is None
+    assert clasificador.clasificar("Lovely day") is None
+    assert clasificador.clasificar("All you need is LOVE.") == "amor"
+    assert clasificador.clasificar_inequivoco("love, love, love") == "amor"
+
+
+def test_textos_ambiguos_no_se_preclasifican():
+    clasificador = ClasificadorPalabrasClave()
+    texto = "Self love is the first love"  # autoestima y amor
+    assert clasificador.clasificar(texto) == "amor"
+    assert clasificador.clasificar_inequivoco(texto) is None
+    assert clasificador.clasificar_corpus([texto], solo_inequivocos=True).tolist() == [-1]
+
+
+def test_palabras_de_la_plataforma_no_bastan_para_preclasificar():
+    clasificador = ClasificadorPalabrasClave()
+    critica = list(CATEGORIAS).index("crítica_social")
+    textos = ["Follow me on Instagram", "social media", "Instagram is fake"]
+
+    assert [clasificador.clasificar(t) for t in textos] == ["crítica_social"] * 3
+    assert [clasificador.clasificar_inequivoco(t) for t in textos] == [None, None, "crítica_social"]
+    assert clasificador.clasificar_corpus(textos, solo_inequivocos=True).tolist() == [-1, -1, critica]
+    # Una palabra de la plataforma no hace ambiguo un texto por lo demás claro
+    assert clasificador.clasificar_inequivoco("My heart on instagram") == "amor"
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del diario de resultados de la clasificación y de su materialización en el CSV"""
+
+import json
+
+import pandas as pd
+
+from almacen_embeddings import hash_texto
+from clasificador_textos_ai import ClasificadorTextos
+from diario_resultados import DiarioResultados, ruta_diario
+
+
+def test_linea_final_incompleta_se_descarta_y_el_siguiente_anexado_empieza_en_otra_linea(tmp_path):
+    ruta = str(tmp_path / "resultados.diario.jsonl")
+    diario = DiarioResultados(ruta)
+    diario.agregar({"uno": "amor_relaciones"}, "api")
+    assert diario.sincronizar() == 1
+
+    # El proceso murió a mitad de una escritura
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write('{"hash": "abc", "texto": "dos", "categ')
+    assert [a["texto"] for a in DiarioResultados(ruta).leer().values()] == ["uno"]
+
+    diario.agregar({"tres": "otro"}, "batch")
+    diario.sincronizar()
+    anotaciones = DiarioResultados(ruta).leer()
+    assert {a["texto"]: a["origen"] for a in anotaciones.values()} == {"uno": "api", "tres": "batch"}
+    assert hash_texto("tres").hex() in anotaciones
+    with open(ruta, encoding='utf-8') as f:
+        lineas = f.read().splitlines()
+    assert json.loads(lineas[-1])["texto"] == "tres"
+
+
+def test_ultima_anotacion_de_un_texto_gana_y_vaciar_conserva_las_pendientes(tmp_path):
+    diario = DiarioResultados(str(tmp_path / "diario.jsonl"))
+    diario.agregar({"uno": "otro"}, "api")
+    diario.sincronizar()
+    diario.agregar({"uno": "amor_relaciones"}, "api")
+    diario.sincronizar()
+    assert [a["categoria"] for a in diario.leer().values()] == ["amor_relaciones"]
+
+    diario.agregar({"dos": "otro"}, "api")
+    diario.vaciar()
+    assert diario.leer() == {}
+    assert diario.sincronizar() == 1
+    assert [a["texto"] for a in diario.leer().values()] == ["dos"]
+
+
+def _clasificador(tmp_path) -> ClasificadorTextos:
+    clasificador = ClasificadorTextos(api_key="x", csv_path=str(tmp_path / "textos.csv"),
+                                      output_csv=str(tmp_path / "categorizado.csv"),
+                                      cache_file=str(tmp_path / "cache.json"))
+    clasificador.cargar_datos()
+    return clasificador
+
+
+def test_materializar_y_recargar_es_idempotente(tmp_path):
+    pd.DataFrame({"ruta": ["a.jpg", "b.jpg", "c.jpg"], "carpeta": "cuenta",
+                  "texto": ["te quiero", "jaja", "hoy llueve"]}).to_csv(tmp_path / "textos.csv", index=False)
+
+    clasificador = _clasificador(tmp_path)
+    clasificador._registrar({"te quiero": "amor_relaciones"})
+    clasificador._asignar_desde_cache()
+    clasificador.diario.agregar({"jaja": "humor_entretenimiento"}, "palabras_clave")
+    clasificador.diario.sincronizar()
+
+    # Interrupción entre la escritura del CSV y el vaciado del diario: al recargar se vuelve a aplicar
+    clasificador.guardar_resultados()
+    recargado = _clasificador(tmp_path)
+    pd.testing.assert_frame_equal(recargado.df, _clasificador(tmp_path).df)
+    recargado.materializar()
+    primero = pd.read_csv(tmp_path / "categorizado.csv")
+    assert primero["categoria"].tolist()[:2] == ["amor_relaciones", "humor_entretenimiento"]
+    assert primero["origen_categoria"].tolist()[:2] == ["api", "palabras_clave"]
+    assert DiarioResultados(ruta_diario(str(tmp_path / "categorizado.csv"))).leer() == {}
+
+    # Materializar otra vez tras recargar no cambia nada
+    _clasificador(tmp_path).materializar()
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "categorizado.csv"), primero)
+    with open(tmp_path / "cache.json", encoding='utf-8') as f:
+        assert json.load(f) == {"te quiero": "amor_relaciones"}
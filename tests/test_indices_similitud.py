@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas de las búsquedas restringidas a un subconjunto de filas en IndiceIVF"""
+
+import numpy as np
+
+from indices_similitud import IndiceExacto, IndiceIVF
+
+
+def _matriz(n: int = 2000, dimension: int = 32, semilla: int = 0) -> np.ndarray:
+    matriz = np.random.default_rng(semilla).normal(size=(n, dimension)).astype(np.float32)
+    return matriz / np.linalg.norm(matriz, axis=1, keepdims=True)
+
+
+def test_busqueda_filtrada_devuelve_min_k_resultados():
+    matriz = _matriz()
+    indice = IndiceIVF.construir(matriz, n_listas=64)
+    # Partición pequeña repartida por todo el corpus, como una categoría poco frecuente
+    filas = np.sort(np.random.default_rng(1).choice(len(matriz), 5, replace=False))
+
+    for consulta in matriz[:20]:
+        for k in (3, 5, 10):
+            resultado, similitudes = indice.buscar(consulta, k, nprobe=1, filas=filas)
+            assert len(resultado) == min(k, len(filas))
+            assert np.isin(resultado, filas).all()
+            assert np.all(np.diff(similitudes) <= 0)
+
+
+def test_busqueda_filtrada_lote_recorre_toda_la_particion_si_k_la_cubre():
+    matriz = _matriz()
+    indice = IndiceIVF.construir(matriz, n_listas=64)
+    exacto = IndiceExacto(matriz)
+    filas = np.arange(0, len(matriz), 400)
+    k = len(filas) + 2
+
+    for (resultado, similitudes), (esperado, esperadas) in zip(
+            indice.buscar_lote(matriz[:10], k, nprobe=2, filas=filas),
+            exacto.buscar_lote(matriz[:10], k, filas=filas)):
+        np.testing.assert_array_equal(resultado, esperado)
+        np.testing.assert_allclose(similitudes, esperadas, rtol=1e-5)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Pruebas del limitador de tasa de la API con un reloj simulado"""
+
+import pytest
+
+from limitador_tasa import BACKOFF_INICIAL, RECUPERACION_POR_EXITO, LimitadorTasa
+
+
+class Reloj:
+    """Reloj simulado: dormir() avanza el tiempo y registra las esperas"""
+
+    def __init__(self):
+        self.ahora = 0.0
+        self.esperas = []
+
+    def __call__(self) -> float:
+        return self.ahora
+
+    def dormir(self, segundos: float):
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+
+def _limitador(reloj: Reloj, rpm: float = 60, tpm: float = 600) -> LimitadorTasa:
+    return LimitadorTasa(peticiones_por_minuto=rpm, tokens_por_minuto=tpm, reloj=reloj, dormir=reloj.dormir)
+
+
+def test_reservas_consumen_la_rafaga_y_despues_esperan_la_recarga():
+    reloj = Reloj()
+    limitador = _limitador(reloj)  # 1 petición/s y 10 tokens/s
+
+    for _ in range(6):
+        limitador.adquirir(100)
+    assert reloj.esperas == []  # La ráfaga inicial cubre 600 tokens
+
+    limitador.adquirir(50)
+    assert reloj.ahora == pytest.approx(5.0)  # 50 tokens a 10 tokens/s
+
+    # Con tokens de sobra, el límite lo marcan las peticiones
+    limitador = _limitador(reloj, rpm=2, tpm=1e6)
+    inicio = reloj.ahora
+    for _ in range(3):
+        limitador.adquirir()
+    assert reloj.ahora - inicio == pytest.approx(30.0)  # La tercera espera una recarga de 2/min
+
+
+def test_peticion_mayor_que_la_capacidad_no_bloquea_para_siempre():
+    reloj = Reloj()
+    limitador = _limitador(reloj, tpm=600)
+    limitador.adquirir(10_000)
+    limitador.adquirir(600)
+    assert reloj.ahora == pytest.approx(60.0)
+
+
+def test_limite_pausa_y_reduce_la_tasa_a_la_mitad():
+    reloj = Reloj()
+    limitador = _limitador(reloj)
+
+    assert limitador.registrar_limite() == BACKOFF_INICIAL
+    assert limitador.factor_tasa == 0.5
+    # Las llamadas que estaban en vuelo durante la pausa no vuelven a reducir la tasa
+    assert limitador.registrar_limite() == pytest.approx(BACKOFF_INICIAL)
+    assert limitador.factor_tasa == 0.5
+
+    limitador.adquirir()
+    assert reloj.ahora == pytest.approx(BACKOFF_INICIAL)
+
+    # Un segundo 429 seguido duplica la pausa; Retry-After tiene prioridad
+    assert limitador.registrar_limite() == 2 * BACKOFF_INICIAL
+    assert limitador.factor_tasa == 0.25
+    reloj.ahora += 10
+    assert limitador.registrar_limite(retry_after=7) == 7
+    assert limitador.factor_tasa == 0.125
+
+
+def test_tasa_reducida_recarga_mas_despacio_y_se_recupera_con_exitos():
+    reloj = Reloj()
+    limitador = _limitador(reloj, rpm=60, tpm=1e6)
+    for _ in range(60):
+        limitador.adquirir()
+    limitador.registrar_limite(retry_after=0.001)
+
+    limitador.adquirir()
+    assert reloj.ahora == pytest.approx(2.0)  # 0.5 peticiones/s en lugar de 1
+
+    limitador.registrar_exito()
+    assert limitador.factor_tasa == pytest.approx(0.5 + RECUPERACION_POR_EXITO)
+    for _ in range(20):
+        limitador.registrar_exito()
+    assert limitador.factor_tasa == 1.0